@@ -128,7 +128,7 @@ def main():
             if len(args) != 1:
                 print("Expected project ID",file=sys.stderr)
                 sys.exit(2)
-            data = client.get(args[0])
+            data = client.get(args[0], include=('status',) if command == 'status' else None)
         elif command == 'create':
             if len(args) != 1:
                 print("Expected project ID",file=sys.stderr)
@@ -159,7 +159,7 @@ def main():
                 print("Expected: project inputtemplate file ",file=sys.stderr)
                 sys.exit(2)
             project = args[0]
-            data = client.get(project)
+            data = client.get(project, include=('profiles',))
             try:
                 inputtemplate = data.inputtemplate(args[1])
             except:
@@ -24,26 +24,672 @@ import subprocess
 import time
 import signal
 import shutil
+import importlib
+import select
+import fcntl
+import resource
+import socket
+import json
+import shlex
 
 VERSION = '2.1'
 
 sys.path.append(sys.path[0] + '/..')
 
 import clam.common.data #pylint: disable=wrong-import-position
+import clam.common.jobqueue #pylint: disable=wrong-import-position
+import clam.common.incremental #pylint: disable=wrong-import-position
+import clam.common.accounting #pylint: disable=wrong-import-position
+import clam.common.runcache #pylint: disable=wrong-import-position
+import clam.common.statestore #pylint: disable=wrong-import-position
+import clam.common.projectindex #pylint: disable=wrong-import-position
+import clam.common.diskusage #pylint: disable=wrong-import-position
+import clam.common.status #pylint: disable=wrong-import-position
+import clam.clamworkerpool #pylint: disable=wrong-import-position
+
+
+def groupstats(pgid):
+    """Yields (pid, fields) tuples, where fields are the fields of /proc/[pid]/stat (starting at the state field), for all processes in the given process group"""
+    for pid in os.listdir('/proc'):
+        if pid.isdigit():
+            try:
+                with open('/proc/' + pid + '/stat','rb') as f:
+                    fields = f.read().rsplit(b')',1)[1].split() #the command name may contain spaces, skip past it
+            except (IOError, OSError): #process ended in the meantime
+                continue
+            if int(fields[2]) == pgid:
+                yield int(pid), fields
+
+def mem(pgid):
+    """Returns the total resident memory (in kB) of all processes in the given process group, i.e. the whole process tree of a job"""
+    if not os.path.isdir('/proc/self'):
+        #no procfs (not Linux?), fall back to ps
+        return sum( int(line) for line in os.popen('ps -g %d -o rss=' % pgid).read().split() )
+    pagesize = os.sysconf('SC_PAGE_SIZE') // 1024
+    return sum( int(fields[21]) * pagesize for _, fields in groupstats(pgid) )
+
+def cputimes(pgid):
+    """Returns the user and system CPU time (in seconds) of all processes currently in the given process group, as a tuple"""
+    if not os.path.isdir('/proc/self'):
+        return 0, 0
+    ticks = float(os.sysconf('SC_CLK_TCK'))
+    usertime = systemtime = 0
+    for _, fields in groupstats(pgid):
+        usertime += int(fields[11]) / ticks
+        systemtime += int(fields[12]) / ticks
+    return usertime, systemtime
+
+def cputime(pgid):
+    """Returns the CPU time (user+system, in seconds) of all processes currently in the given process group"""
+    return sum(cputimes(pgid))
+
+def iobytes(pid):
+    """Returns the bytes read from and written to storage by a process, as a tuple"""
+    values = {}
+    try:
+        with open('/proc/' + str(pid) + '/io','r') as f:
+            for line in f:
+                key, value = line.split(':')
+                values[key] = int(value)
+    except (IOError, OSError, ValueError): #no procfs or not permitted
+        pass
+    return values.get('read_bytes',0), values.get('write_bytes',0)
+
+
+class CGroup(object):
+    """A cgroup (v2) for a single job. The kernel enforces the memory limit on the entire process tree and accounts CPU time for it"""
+
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def parentdir(configured=None):
+        """Returns the cgroup directory under which job cgroups are created, or None if cgroup v2 is not available"""
+        if configured is False:
+            return None
+        elif configured:
+            parent = configured
+        else:
+            #default: our own cgroup, only on systems with a unified (v2) hierarchy
+            if not os.path.exists('/sys/fs/cgroup/cgroup.controllers') or not os.path.exists('/proc/self/cgroup'):
+                return None
+            parent = None
+            with open('/proc/self/cgroup','r') as f:
+                for line in f:
+                    if line.startswith('0::'):
+                        parent = '/sys/fs/cgroup' + line[3:].strip()
+            if parent is None:
+                return None
+        if os.path.isdir(parent) and os.access(parent, os.W_OK):
+            return parent
+        return None
+
+    @staticmethod
+    def create(parent, name, maxmem=0):
+        """Create a cgroup, with an optional memory limit (in MB). Returns None if this is not possible"""
+        #enable the controllers for child groups (may fail if they are already enabled or not delegated to us)
+        for controller in ('+memory','+cpu','+pids'):
+            try:
+                with open(os.path.join(parent, 'cgroup.subtree_control'),'w') as f:
+                    f.write(controller)
+            except (IOError, OSError):
+                pass
+        cgroup = CGroup(os.path.join(parent, name))
+        try:
+            os.mkdir(cgroup.path)
+            if maxmem:
+                cgroup.write('memory.max', str(maxmem * 1024 * 1024))
+                cgroup.write('memory.swap.max', '0')
+                cgroup.write('memory.oom.group', '1') #on OOM, kill the entire job rather than a single process
+        except (IOError, OSError) as e:
+            print("[CLAM Dispatcher] Unable to set up cgroup " + cgroup.path + ": " + str(e), file=sys.stderr)
+            cgroup.remove()
+            return None
+        return cgroup
+
+    def write(self, filename, value):
+        with open(os.path.join(self.path, filename),'w') as f:
+            f.write(value)
+
+    def read(self, filename):
+        """Read a flat-keyed cgroup file into a dictionary"""
+        values = {}
+        try:
+            with open(os.path.join(self.path, filename),'r') as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) == 2:
+                        values[fields[0]] = int(fields[1])
+        except (IOError, OSError, ValueError):
+            pass
+        return values
+
+    def join(self):
+        """Move the calling process into the cgroup"""
+        self.write('cgroup.procs', '0')
+
+    def oomkilled(self):
+        return self.read('memory.events').get('oom_kill',0) > 0
+
+    def cputime(self):
+        """CPU time (user+system) consumed by the whole group, in seconds"""
+        return self.read('cpu.stat').get('usage_usec',0) / 1000000.0
+
+    def resources(self):
+        """Resources used by the whole group: a dictionary with the CPU times, peak memory (Linux >= 5.19) and I/O"""
+        resources = {}
+        cpustat = self.read('cpu.stat')
+        if 'user_usec' in cpustat:
+            resources['usertime'] = cpustat['user_usec'] / 1000000.0
+            resources['systemtime'] = cpustat['system_usec'] / 1000000.0
+        try:
+            with open(os.path.join(self.path, 'memory.peak'),'r') as f:
+                resources['maxrss'] = int(f.read().strip()) // 1024
+        except (IOError, OSError, ValueError):
+            pass
+        try:
+            with open(os.path.join(self.path, 'pids.peak'),'r') as f: #Linux >= 6.1
+                resources['processes'] = int(f.read().strip())
+        except (IOError, OSError, ValueError):
+            pass
+        try:
+            with open(os.path.join(self.path, 'io.stat'),'r') as f:
+                readbytes = writebytes = 0
+                for line in f: #one line per device
+                    for field in line.split()[1:]:
+                        key, value = field.split('=')
+                        if key == 'rbytes':
+                            readbytes += int(value)
+                        elif key == 'wbytes':
+                            writebytes += int(value)
+                resources['readbytes'] = readbytes
+                resources['writebytes'] = writebytes
+        except (IOError, OSError, ValueError):
+            pass
+        return resources
 
+    def pids(self):
+        try:
+            with open(os.path.join(self.path, 'cgroup.procs'),'r') as f:
+                return [ int(pid) for pid in f.read().split() ]
+        except (IOError, OSError, ValueError):
+            return []
+
+    def kill(self):
+        """Kill all processes in the group, including those that escaped the process group"""
+        if os.path.exists(os.path.join(self.path, 'cgroup.kill')): #Linux >= 5.14
+            try:
+                self.write('cgroup.kill', '1')
+                return
+            except (IOError, OSError):
+                pass
+        for pid in self.pids():
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+    def remove(self):
+        if os.path.isdir(self.path):
+            for _ in range(0,10): #the group has to be empty, killed processes may take a moment to go
+                try:
+                    os.rmdir(self.path)
+                    return
+                except OSError:
+                    time.sleep(0.1)
+            print("[CLAM Dispatcher] Unable to remove cgroup " + self.path, file=sys.stderr)
+
+
+def limitsetup(cgroup=None, maxcputime=0, maxvirtmem=0):
+    """Returns a function to be run in the child process prior to executing the command: it starts a new session (and process group) so the whole process tree can be signalled at once, joins the cgroup, and sets resource limits that are inherited by all descendants"""
+    def setup():
+        os.setsid()
+        if cgroup is not None:
+            cgroup.join()
+        if maxcputime:
+            #soft limit yields SIGXCPU, the hard limit a SIGKILL shortly after
+            resource.setrlimit(resource.RLIMIT_CPU, (maxcputime, maxcputime + 5))
+        if maxvirtmem:
+            resource.setrlimit(resource.RLIMIT_AS, (maxvirtmem * 1024 * 1024, maxvirtmem * 1024 * 1024))
+    return setup
+
+def cpulimitexceeded(status):
+    """Checks whether a wait status indicates the CPU time limit was hit (directly, or as reported by the shell)"""
+    if os.WIFSIGNALED(status):
+        return os.WTERMSIG(status) == signal.SIGXCPU
+    elif os.WIFEXITED(status):
+        return os.WEXITSTATUS(status) == 128 + signal.SIGXCPU
+    return False
+
+class Accounting(object):
+    """Measures the resources used by a job. Without a cgroup, the process tree is sampled on the poll timer (DISPATCHER_POLLINTERVAL) to count its processes; the rest comes from the exit status of the process (rusage) or from its cgroup, which also counts the processes."""
+
+    def __init__(self):
+        self.pids = set()
+        self.peakrss = 0
+
+    def sample(self, pgid):
+        """Samples the process tree, returns its total resident memory (in kB), or None if it can not be sampled"""
+        if not pgid or not os.path.isdir('/proc/self'):
+            return None
+        pagesize = os.sysconf('SC_PAGE_SIZE') // 1024
+        rss = 0
+        for pid, fields in groupstats(pgid):
+            self.pids.add(pid)
+            rss += int(fields[21]) * pagesize
+        self.peakrss = max(self.peakrss, rss)
+        return rss
+
+    def resources(self, walltime, watcher, cgroup=None):
+        """Returns the resources used by the job (see clam.common.accounting), once it has ended"""
+        resources = {'walltime': round(walltime,3), 'usertime': 0, 'systemtime': 0, 'maxrss': 0, 'readbytes': 0, 'writebytes': 0}
+        rusage = getattr(watcher, 'rusage', None)
+        if rusage is not None:
+            #covers the process and all descendants it waited for
+            resources['usertime'] = rusage.ru_utime
+            resources['systemtime'] = rusage.ru_stime
+            resources['maxrss'] = rusage.ru_maxrss // 1024 if sys.platform == 'darwin' else rusage.ru_maxrss #bytes on macOS, kB elsewhere
+            resources['readbytes'] = rusage.ru_inblock * 512
+            resources['writebytes'] = rusage.ru_oublock * 512
+        elif isinstance(watcher, PoolJob):
+            resources.update(watcher.resources())
+        if cgroup:
+            resources.update(cgroup.resources())
+        resources['maxrss'] = max(resources['maxrss'], self.peakrss)
+        resources['processes'] = max(1, resources.get('processes',0), len(self.pids))
+        for key in ('usertime','systemtime'):
+            resources[key] = round(resources[key],3)
+        return resources
 
-def mem(pid, size="rss"):
-    """memory sizes: rss, rsz, vsz."""
-    return int(os.popen('ps -p %d -o %s | tail -1' % (pid, size)).read())
 
 def total_seconds(delta):
     return delta.days * 86400 + delta.seconds + (delta.microseconds / 1000000.0)
 
+
+#Interval (in seconds) at which the dispatcher checks for .abort files, aborts are normally signalled instantly over the control channel
+ABORTCHECKINTERVAL = 10
+
+#Grace period (in seconds) for a process to terminate after SIGTERM, after which it is killed
+KILLTIMEOUT = 30
+
+
+class ChildWatcher(object):
+    """Provides a file descriptor that becomes readable when the child process ends, so the dispatcher can block on it.
+    Uses a pidfd where available (Linux >= 5.3, Python >= 3.9), otherwise a self-pipe that is woken by SIGCHLD."""
+
+    def __init__(self):
+        self.pid = None
+        self.pidfd = None
+        self.pipe = None
+        self.rusage = None #resource usage of the process and its descendants, once it ended
+        if not hasattr(os, 'pidfd_open'):
+            #the signal handler has to be installed before the child is spawned, so no SIGCHLD gets lost
+            self.usesignal()
+
+    def usesignal(self):
+        self.pipe = os.pipe()
+        for fd in self.pipe:
+            setnonblocking(fd)
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None) #the default disposition would discard the signal
+        signal.set_wakeup_fd(self.pipe[1])
+
+    def watch(self, pid):
+        self.pid = pid
+        if self.pipe is None:
+            try:
+                self.pidfd = os.pidfd_open(pid) #pylint: disable=no-member
+            except OSError: #kernel does not support it, the poll() that follows covers a SIGCHLD we may have missed
+                self.usesignal()
+
+    def fileno(self):
+        if self.pidfd is not None:
+            return self.pidfd
+        return self.pipe[0]
+
+    def poll(self):
+        """Returns a tuple (exited, status); status is None if the process was lost"""
+        if self.pipe is not None:
+            try:
+                while os.read(self.pipe[0], 512):
+                    pass
+            except OSError:
+                pass
+        try:
+            returnedpid, status, rusage = os.wait4(self.pid, os.WNOHANG)
+        except OSError: #no such process
+            return True, None
+        if returnedpid != 0:
+            self.rusage = rusage
+            return True, status
+        return False, None
+
+    def wait(self, timeout=None):
+        """Wait for the process to end, with an optional timeout. Returns the same as poll()"""
+        begintime = time.time()
+        while True:
+            exited, status = self.poll()
+            if exited:
+                return exited, status
+            if timeout is not None:
+                remaining = begintime + timeout - time.time()
+                if remaining <= 0:
+                    return False, None
+            else:
+                remaining = None
+            waitfor([self], remaining)
+
+    def sendsignal(self, signum):
+        """Send a signal to the entire process group of the (running) process"""
+        try:
+            os.killpg(self.pid, signum)
+        except OSError:
+            try: #not a process group leader?
+                os.kill(self.pid, signum)
+            except OSError:
+                pass
+
+    def terminate(self):
+        """Terminate the process and its process group, it will be killed if it doesn't comply within KILLTIMEOUT seconds"""
+        self.sendsignal(signal.SIGTERM)
+        exited, _ = self.wait(KILLTIMEOUT)
+        if not exited:
+            print("[CLAM Dispatcher] Process does not respond to SIGTERM, killing it", file=sys.stderr)
+            self.sendsignal(signal.SIGKILL)
+            self.wait()
+
+    def cleanup(self):
+        """Kill whatever is left of the process group after the process ended, no process of the job may outlive it"""
+        try:
+            os.killpg(self.pid, signal.SIGKILL)
+        except OSError: #no processes left in the group
+            pass
+
+    def close(self):
+        if self.pidfd is not None:
+            os.close(self.pidfd)
+            self.pidfd = None
+        if self.pipe is not None:
+            signal.set_wakeup_fd(-1)
+            for fd in self.pipe:
+                os.close(fd)
+            self.pipe = None
+
+
+class PoolJob(object):
+    """A job that runs in a worker of the worker pool (see clamworkerpool) rather than as a child process.
+    Offers the same interface as ChildWatcher, the connection to the pool becomes readable when the job ends."""
+
+    def __init__(self, socketpath, projectdir):
+        self.projectdir = projectdir
+        self.pid = None #pid of the worker, known once a worker is assigned
+        self.cpubase = (0, 0)
+        self.iobase = (0, 0)
+        self.buffer = b""
+        self.status = None
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(socketpath)
+            #our error output is passed along so the job writes to it just like a command would
+            clam.clamworkerpool.send(self.sock, {'projectdir': projectdir, 'fd': True}, sys.stderr.fileno())
+        except socket.error:
+            self.sock.close()
+            raise
+
+    def fileno(self):
+        return self.sock.fileno() if self.sock is not None else None
+
+    def poll(self):
+        """Returns a tuple (exited, status); status is None if the job was lost"""
+        if self.sock is None:
+            return True, self.status
+        while True:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+            if not readable:
+                return False, None
+            try:
+                data = self.sock.recv(4096)
+            except socket.error:
+                data = b""
+            if not data: #pool went away
+                self.close()
+                return True, None
+            self.buffer += data
+            while b"\n" in self.buffer:
+                line, self.buffer = self.buffer.split(b"\n",1)
+                message = json.loads(line.decode('utf-8'))
+                if 'pid' in message:
+                    self.pid = message['pid']
+                    self.cpubase = cputimes(self.pid)
+                    self.iobase = iobytes(self.pid)
+                    print("[CLAM Dispatcher] Running in worker with pid " + str(self.pid), file=sys.stderr)
+                    with open(self.projectdir + '.pid','w') as f:
+                        f.write(str(self.pid))
+                elif 'status' in message:
+                    self.status = message['status']
+                    self.close()
+                    return True, self.status
+
+    def cputime(self):
+        """CPU time consumed by the job so far (the worker itself lives longer)"""
+        return cputime(self.pid) - sum(self.cpubase) if self.pid else 0
+
+    def resources(self):
+        """CPU time and I/O of the job, measured on the worker"""
+        if not self.pid:
+            return {}
+        usertime, systemtime = cputimes(self.pid)
+        readbytes, writebytes = iobytes(self.pid)
+        return {'usertime': max(0, usertime - self.cpubase[0]), 'systemtime': max(0, systemtime - self.cpubase[1]), 'readbytes': max(0, readbytes - self.iobase[0]), 'writebytes': max(0, writebytes - self.iobase[1])}
+
+    def wait(self, timeout=None):
+        begintime = time.time()
+        while True:
+            exited, status = self.poll()
+            if exited:
+                return exited, status
+            remaining = None
+            if timeout is not None:
+                remaining = begintime + timeout - time.time()
+                if remaining <= 0:
+                    return False, None
+            waitfor([self], remaining)
+
+    def sendsignal(self, signum):
+        if self.pid:
+            try:
+                os.killpg(self.pid, signum)
+            except OSError:
+                pass
+
+    def terminate(self):
+        """Terminate the job by terminating the worker, the pool replaces it"""
+        if not self.pid:
+            #still waiting for a worker, disconnecting withdraws the job
+            self.close()
+            return
+        self.sendsignal(signal.SIGTERM)
+        exited, _ = self.wait(KILLTIMEOUT)
+        if not exited:
+            print("[CLAM Dispatcher] Worker does not respond to SIGTERM, killing it", file=sys.stderr)
+            self.sendsignal(signal.SIGKILL)
+            self.wait()
+
+    def cleanup(self):
+        pass #the worker stays alive for the next job
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class ControlChannel(object):
+    """A named pipe in the project directory through which the webservice can signal the dispatcher (e.g. to abort).
+    The dispatcher keeps a writer open itself so it never sees end-of-file when a client disconnects."""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = self.writefd = None
+        try:
+            if os.path.exists(path):
+                os.unlink(path)
+            os.mkfifo(path, 0o622)
+            self.fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+            self.writefd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+        except (OSError, AttributeError) as e:
+            print("[CLAM Dispatcher] Unable to create control channel, falling back to .abort files only: " + str(e), file=sys.stderr)
+            self.close()
+
+    def fileno(self):
+        return self.fd
+
+    def read(self):
+        """Reads pending commands, returns True if an abort was requested"""
+        abort = False
+        try:
+            while True:
+                data = os.read(self.fd, 512)
+                if not data:
+                    break
+                if b'abort' in data:
+                    abort = True
+        except OSError: #EAGAIN, nothing more to read
+            pass
+        return abort
+
+    def close(self):
+        for fd in (self.fd, self.writefd):
+            if fd is not None:
+                os.close(fd)
+        self.fd = self.writefd = None
+        if os.path.exists(self.path):
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def setnonblocking(fd):
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+def waitfor(objects, timeout=None):
+    """Block until one of the objects (with fileno()) becomes readable or the timeout (in seconds) expires. Returns the readable objects."""
+    objects = [ o for o in objects if o is not None and o.fileno() is not None ]
+    try:
+        readable, _, _ = select.select(objects, [], [], timeout)
+    except (select.error, OSError):
+        return [] #interrupted by a signal (Python 2)
+    return readable
+
+def parseprojectdir(projectdir):
+    """Interprets the project directory argument, returns a (projectdir, tmpdir) tuple"""
+    if projectdir == 'NONE': #Actions
+        return None, None
+    elif projectdir.startswith('tmp://'): #Used for actions with a temporary dir
+        return None, projectdir[6:]
+    else:
+        if projectdir[-1] != '/':
+            projectdir += '/'
+        return projectdir, os.path.join(projectdir,'tmp')
+
+def buildcommand(args):
+    """Builds the command to run from the command line arguments passed to the dispatcher"""
+    cmd = args[0]
+    cmd = clam.common.data.unescapeshelloperators(cmd) #shell operators like pipes and redirects were passed in an escaped form
+    if sys.version[0] == '2' and isinstance(cmd,str):
+        cmd = unicode(cmd,'utf-8') #pylint: disable=undefined-variable
+    for arg in args[1:]:
+        arg_u = clam.common.data.unescapeshelloperators(arg)
+        if arg_u != arg:
+            cmd += " " + arg_u #shell operator (pipe or something)
+        else:
+            cmd += " " + clam.common.data.shellsafe(arg,'"')
+    return cmd
+
+#Characters that require the command to be run through a shell
+SHELLCHARACTERS = set('|&;<>()$`\\*?[]{}~!#\n')
+
+def needsshell(cmd):
+    """Does the command need a shell (operators, variables, globs), or can it be executed directly?"""
+    if any( c in SHELLCHARACTERS for c in cmd ):
+        return True
+    try:
+        args = shlex.split(cmd)
+    except ValueError:
+        return True
+    return not args or '=' in args[0] #no words or a variable assignment
+
+def loadsettings(settingsmodule):
+    """Imports the settings module and sets the defaults the dispatcher relies on, raises ImportError if the module can't be imported"""
+    settings = importlib.import_module(settingsmodule) #__import__ would return the top-level package for dotted module names
+    try:
+        if settings.CUSTOM_FORMATS:
+            clam.common.data.CUSTOM_FORMATS = settings.CUSTOM_FORMATS
+            print("[CLAM Dispatcher] Dependency injection for custom formats succeeded", file=sys.stderr)
+    except AttributeError:
+        pass
+
+    settingkeys = dir(settings)
+    if not 'DISPATCHER_POLLINTERVAL' in settingkeys:
+        settings.DISPATCHER_POLLINTERVAL = 30
+    if not 'DISPATCHER_MAXRESMEM' in settingkeys:
+        settings.DISPATCHER_MAXRESMEM = 0
+    if not 'DISPATCHER_MAXTIME' in settingkeys:
+        settings.DISPATCHER_MAXTIME = 0
+    if not 'DISPATCHER_MAXCPUTIME' in settingkeys:
+        settings.DISPATCHER_MAXCPUTIME = 0
+    if not 'DISPATCHER_MAXVIRTMEM' in settingkeys:
+        settings.DISPATCHER_MAXVIRTMEM = 0
+    if not 'DISPATCHER_CGROUP' in settingkeys:
+        settings.DISPATCHER_CGROUP = None
+    if not 'WORKER_ENTRYPOINT' in settingkeys:
+        settings.WORKER_ENTRYPOINT = None
+    if not 'WORKER_SOCKET' in settingkeys:
+        settings.WORKER_SOCKET = os.path.join(settings.ROOT, 'workers.sock')
+    if not 'QUEUEDIR' in settingkeys:
+        settings.QUEUEDIR = os.path.join(settings.ROOT, 'queue') + '/'
+    if not 'LAUNCHER' in settingkeys:
+        settings.LAUNCHER = True
+    if not 'RUNCACHE' in settingkeys:
+        settings.RUNCACHE = False
+    if not 'RUNCACHEDIR' in settingkeys:
+        settings.RUNCACHEDIR = os.path.join(settings.ROOT, 'runcache') + '/'
+    if not 'RUNCACHE_MAXSIZE' in settingkeys:
+        settings.RUNCACHE_MAXSIZE = 1024
+    if not 'LAUNCHER_SOCKET' in settingkeys:
+        settings.LAUNCHER_SOCKET = os.path.join(settings.ROOT, 'launcher.sock')
+    if not 'RESOURCELOG' in settingkeys:
+        settings.RESOURCELOG = os.path.join(settings.ROOT, 'resources.log')
+    if not 'STATEDB' in settingkeys or getattr(settings, 'REMOTEHOST', None): #the state store is local to the webservice
+        settings.STATEDB = None
+    for key in ('MAXJOBS','MAXCORES','MAXMEMORY'):
+        if not key in settingkeys:
+            setattr(settings, key, 0)
+    return settings
+
+STATESTORE = None
+
+def statestore(settings):
+    """Returns the project state store, or None if it is not enabled"""
+    global STATESTORE #pylint: disable=global-statement
+    if settings.STATEDB and STATESTORE is None:
+        STATESTORE = clam.common.statestore.StateStore(settings.STATEDB)
+    return STATESTORE
+
+def setstate(settings, projectdir, **fields):
+    """Update the state of the project in the state store, if enabled"""
+    location = clam.common.statestore.locate(projectdir)
+    if location is not None and settings.STATEDB:
+        try:
+            statestore(settings).set(location[0], location[1], **fields)
+        except Exception as e: #pylint: disable=broad-except
+            print("[CLAM Dispatcher] Unable to update the state store: " + str(e), file=sys.stderr)
+
 def main():
     if len(sys.argv) < 4:
         print("[CLAM Dispatcher] ERROR: Invalid syntax, use clamdispatcher.py [pythonpath] settingsmodule projectdir cmd arg1 arg2 ... got: " + " ".join(sys.argv[1:]), file=sys.stderr)
-        with open('.done','w') as f:
-            f.write(str(1))
+        clam.common.status.writedone('', 1)
         if os.path.exists('.pid'): os.unlink('.pid')
         return 1
 
@@ -56,75 +702,38 @@ def main():
         offset = 1
 
     settingsmodule = sys.argv[1+offset]
-    projectdir = sys.argv[2+offset]
-    if projectdir == 'NONE': #Actions
-        tmpdir = None
-        projectdir = None
-    elif projectdir.startswith('tmp://'): #Used for actions with a temporary dir
-        tmpdir = projectdir[6:]
-        projectdir = None
-    else:
-        if projectdir[-1] != '/':
-            projectdir += '/'
-        tmpdir = os.path.join(projectdir,'tmp')
+    projectdir, tmpdir = parseprojectdir(sys.argv[2+offset])
 
     print("[CLAM Dispatcher] Started CLAM Dispatcher v" + str(VERSION) + " with " + settingsmodule + " (" + datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S') + ")", file=sys.stderr)
 
-    cmd = sys.argv[3+offset]
-    cmd = clam.common.data.unescapeshelloperators(cmd) #shell operators like pipes and redirects were passed in an escaped form
-    if sys.version[0] == '2' and isinstance(cmd,str):
-        cmd = unicode(cmd,'utf-8') #pylint: disable=undefined-variable
-    for arg in sys.argv[4+offset:]:
-        arg_u = clam.common.data.unescapeshelloperators(arg)
-        if arg_u != arg:
-            cmd += " " + arg_u #shell operator (pipe or something)
-        else:
-            cmd += " " + clam.common.data.shellsafe(arg,'"')
+    try:
+        settings = loadsettings(settingsmodule)
+    except ImportError as e:
+        print("[CLAM Dispatcher] FATAL ERROR: Unable to import settings module, settingsmodule is " + settingsmodule + ", error: " + str(e), file=sys.stderr)
+        print("[CLAM Dispatcher]      hint: If you're using the development server, check you pass the path your service configuration file is in using the -P flag. For Apache integration, verify you add this path to your PYTHONPATH (can be done from the WSGI script)", file=sys.stderr)
+        if projectdir:
+            clam.common.status.writedone(projectdir, 1)
+        return 1
+
+    return dispatch(settings, projectdir, tmpdir, buildcommand(sys.argv[3+offset:]))
 
+def dispatch(settings, projectdir, tmpdir, cmd):
+    """Runs and supervises the command, does the bookkeeping in the project directory and returns the exit code.
+    Called by main(), and by the launcher (see clamlauncher) in a process forked for the job."""
 
     if not cmd:
         print("[CLAM Dispatcher] FATAL ERROR: No command specified!", file=sys.stderr)
         if projectdir:
-            f = open(projectdir + '.done','w')
-            f.write(str(1))
-            f.close()
+            clam.common.status.writedone(projectdir, 1)
             if os.path.exists(projectdir + '.pid'): os.unlink(projectdir + '.pid')
+            setstate(settings, projectdir, state=clam.common.statestore.DONE, exitcode=1, pid=0, finished=time.time())
         return 1
     elif projectdir and not os.path.isdir(projectdir):
         print("[CLAM Dispatcher] FATAL ERROR: Project directory "+ projectdir + " does not exist", file=sys.stderr)
-        f = open(projectdir + '.done','w')
-        f.write(str(1))
-        f.close()
+        clam.common.status.writedone(projectdir, 1)
         if os.path.exists(projectdir + '.pid'): os.unlink(projectdir + '.pid')
         return 1
 
-    try:
-        #exec("import " + settingsmodule + " as settings")
-        settings = __import__(settingsmodule , globals(), locals(),0)
-        try:
-            if settings.CUSTOM_FORMATS:
-                clam.common.data.CUSTOM_FORMATS = settings.CUSTOM_FORMATS
-                print("[CLAM Dispatcher] Dependency injection for custom formats succeeded", file=sys.stderr)
-        except AttributeError:
-            pass
-    except ImportError as e:
-        print("[CLAM Dispatcher] FATAL ERROR: Unable to import settings module, settingsmodule is " + settingsmodule + ", error: " + str(e), file=sys.stderr)
-        print("[CLAM Dispatcher]      hint: If you're using the development server, check you pass the path your service configuration file is in using the -P flag. For Apache integration, verify you add this path to your PYTHONPATH (can be done from the WSGI script)", file=sys.stderr)
-        if projectdir:
-            f = open(projectdir + '.done','w')
-            f.write(str(1))
-            f.close()
-        return 1
-
-    settingkeys = dir(settings)
-    if not 'DISPATCHER_POLLINTERVAL' in settingkeys:
-        settings.DISPATCHER_POLLINTERVAL = 30
-    if not 'DISPATCHER_MAXRESMEM' in settingkeys:
-        settings.DISPATCHER_MAXRESMEM = 0
-    if not 'DISPATCHER_MAXTIME' in settingkeys:
-        settings.DISPATCHER_MAXTIME = 0
-
-
     try:
         print("[CLAM Dispatcher] Running " + cmd, file=sys.stderr)
     except (UnicodeDecodeError, UnicodeError, UnicodeEncodeError):
@@ -133,97 +742,207 @@ def main():
     if sys.version[0] == '2' and isinstance(cmd,unicode): #pylint: disable=undefined-variable
         cmd = cmd.encode('utf-8')
     if projectdir:
-        process = subprocess.Popen(cmd,cwd=projectdir, shell=True, stderr=sys.stderr)
+        control = ControlChannel(projectdir + '.control')
     else:
-        process = subprocess.Popen(cmd, shell=True, stderr=sys.stderr)
+        control = None
+
+    #Each job runs in its own process group and, if available, its own cgroup, so limits apply to the whole process tree
+    cgroup = None
+    if settings.DISPATCHER_MAXRESMEM > 0 or settings.DISPATCHER_MAXCPUTIME > 0:
+        cgroupparent = CGroup.parentdir(settings.DISPATCHER_CGROUP)
+        if cgroupparent:
+            cgroup = CGroup.create(cgroupparent, 'clam-' + str(os.getpid()), settings.DISPATCHER_MAXRESMEM)
+    if cgroup:
+        print("[CLAM Dispatcher] Enforcing limits through cgroup " + cgroup.path, file=sys.stderr)
+    setup = limitsetup(cgroup, settings.DISPATCHER_MAXCPUTIME, settings.DISPATCHER_MAXVIRTMEM)
+
+    watcher = None
+    process = None
+    if projectdir and settings.WORKER_ENTRYPOINT:
+        #run the project in a warm worker of the worker pool
+        try:
+            watcher = PoolJob(settings.WORKER_SOCKET, projectdir)
+            print("[CLAM Dispatcher] Submitted to worker pool " + settings.WORKER_SOCKET, file=sys.stderr)
+            if cgroup:
+                cgroup.remove() #not applicable to workers, limits are checked by polling instead
+                cgroup = None
+        except socket.error as e:
+            print("[CLAM Dispatcher] Worker pool not available (" + str(e) + "), running command instead", file=sys.stderr)
     begintime = datetime.datetime.now()
-    if process:
-        pid = process.pid
-        print("[CLAM Dispatcher] Running with pid " + str(pid) + " (" + begintime.strftime('%Y-%m-%d %H:%M:%S') + ")", file=sys.stderr)
-        sys.stderr.flush()
-        if projectdir:
-            with open(projectdir + '.pid','w') as f:
-                f.write(str(pid))
-    else:
+    if watcher is None:
+        watcher = ChildWatcher()
+        #the command is executed directly unless it relies on the shell, saving a shell process
+        shell = needsshell(cmd)
+        try:
+            process = subprocess.Popen(cmd if shell else shlex.split(cmd), cwd=projectdir, shell=shell, stderr=sys.stderr, preexec_fn=setup)
+        except OSError as e:
+            print("[CLAM Dispatcher] Unable to execute command: " + str(e), file=sys.stderr)
+        if process:
+            watcher.watch(process.pid)
+            print("[CLAM Dispatcher] Running with pid " + str(process.pid) + " (" + begintime.strftime('%Y-%m-%d %H:%M:%S') + ")", file=sys.stderr)
+            sys.stderr.flush()
+            if projectdir:
+                with open(projectdir + '.pid','w') as f:
+                    f.write(str(process.pid))
+                setstate(settings, projectdir, pid=process.pid)
+    if isinstance(watcher, ChildWatcher) and not watcher.pid:
         print("[CLAM Dispatcher] Unable to launch process", file=sys.stderr)
         sys.stderr.flush()
         if projectdir:
-            with open(projectdir + '.done','w') as f:
-                f.write(str(1))
+            clam.common.status.writedone(projectdir, 1)
+            setstate(settings, projectdir, state=clam.common.statestore.DONE, exitcode=1, pid=0, finished=time.time())
+        if control: control.close()
+        if cgroup: cgroup.remove()
         return 1
 
-    #intervalf = lambda s: min(s/10.0, 15)
+    #The loop blocks until the process ends, an abort is requested over the control channel, or a timer expires
+    #timers: resource polling (DISPATCHER_POLLINTERVAL), maximum duration (DISPATCHER_MAXTIME), and a check
+    #for .abort files (for aborts that can't reach the control channel, e.g. when running on a remote host)
     abort = False
     idle = 0
-    done = False
-    lastpolltime = datetime.datetime.now()
-    lastabortchecktime = datetime.datetime.now()
-
-    while not done:
-        d = total_seconds(datetime.datetime.now() - begintime)
-        try:
-            returnedpid, statuscode = os.waitpid(pid, os.WNOHANG)
-            if returnedpid != 0:
-                print("[CLAM Dispatcher] Process ended (" + datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S') + ", " + str(d)+"s) ", file=sys.stderr)
-                done = True
-        except OSError: #no such process
-            print("[CLAM Dispatcher] Process lost! (" + datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S') + ", " + str(d)+"s)", file=sys.stderr)
-            statuscode = 1
-            done = True
-
-        if done:
+    statuscode = 0
+    starttime = time.time()
+    #memory is enforced by the kernel if we have a cgroup, the whole-tree CPU time is checked on the poll timer
+    #without a cgroup, the process tree is sampled on the poll timer as well, to count its processes
+    if (settings.DISPATCHER_MAXRESMEM > 0 and not cgroup) or (settings.DISPATCHER_MAXCPUTIME > 0 and (cgroup or isinstance(watcher, PoolJob))) or (projectdir and not cgroup):
+        nextpoll = starttime + settings.DISPATCHER_POLLINTERVAL
+    else:
+        nextpoll = None
+    deadline = starttime + settings.DISPATCHER_MAXTIME if settings.DISPATCHER_MAXTIME > 0 else None
+    nextabortcheck = starttime + ABORTCHECKINTERVAL if projectdir else None
+    accounting = Accounting()
+
+    while True:
+        exited, status = watcher.poll()
+        if exited:
+            if status is None:
+                print("[CLAM Dispatcher] Process lost! (" + datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S') + ", " + str(time.time() - starttime)+"s)", file=sys.stderr)
+                statuscode = 1
+            else:
+                print("[CLAM Dispatcher] Process ended (" + datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S') + ", " + str(time.time() - starttime)+"s) ", file=sys.stderr)
+                statuscode = status
+                if cgroup and cgroup.oomkilled():
+                    print("[CLAM Dispatcher] PROCESS EXCEEDED MAXIMUM MEMORY USAGE (" + str(settings.DISPATCHER_MAXRESMEM) + " MB) AND WAS KILLED", file=sys.stderr)
+                    statuscode = 2
+                elif settings.DISPATCHER_MAXCPUTIME > 0 and cpulimitexceeded(status):
+                    print("[CLAM Dispatcher] PROCESS EXCEEDED MAXIMUM CPU TIME (" + str(settings.DISPATCHER_MAXCPUTIME) + "s) AND WAS KILLED", file=sys.stderr)
+                    statuscode = 3
             break
 
-        if total_seconds(datetime.datetime.now() - lastabortchecktime) >= min(10, d* 0.5):  #every 10 seconds, faster at beginning
-            if projectdir and os.path.exists(projectdir + '.abort'):
-                abort = True
-            if abort:
-                print("[CLAM Dispatcher] ABORTING PROCESS ON SIGNAL! (" + str(d)+"s)", file=sys.stderr)
-                os.system("sleep 30 && kill -9 " + str(pid) + " &") #deathtrap in case the process doesn't listen within 30 seconds
-                os.kill(pid, signal.SIGTERM)
-                os.waitpid(pid, 0)
-                if projectdir:
+        if abort:
+            if statuscode == 0:
+                print("[CLAM Dispatcher] ABORTING PROCESS ON SIGNAL! (" + str(time.time() - starttime)+"s)", file=sys.stderr)
+            watcher.terminate()
+            if projectdir:
+                if os.path.exists(projectdir + '.abort'):
                     os.unlink(projectdir + '.abort')
-                    open(projectdir + '.aborted','w')
-                    f.close()
-                done = True
-                break
-            lastabortchecktime = datetime.datetime.now()
-
-
-        if d <= 1:
-            idle += 0.05
-            time.sleep(0.05)
-        elif d <= 2:
-            idle += 0.2
-            time.sleep(0.2)
-        elif d <= 10:
-            idle += 0.5
-            time.sleep(0.5)
-        else:
-            idle += 1
-            time.sleep(1)
+                with open(projectdir + '.aborted','w'):
+                    pass
+            break
+
+        timers = [ t for t in (nextpoll, deadline, nextabortcheck) if t is not None ]
+        timeout = max(0, min(timers) - time.time()) if timers else None
+        waitbegin = time.time()
+        readable = waitfor([watcher, control], timeout)
+        idle += time.time() - waitbegin
 
-        if settings.DISPATCHER_MAXRESMEM > 0 and total_seconds(datetime.datetime.now() - lastpolltime) >= settings.DISPATCHER_POLLINTERVAL:
-            resmem = mem(pid)
-            if resmem > settings.DISPATCHER_MAXRESMEM * 1024:
-                print("[CLAM Dispatcher] PROCESS EXCEEDS MAXIMUM RESIDENT MEMORY USAGE (" + str(resmem) + ' >= ' + str(settings.DISPATCHER_MAXRESMEM) + ')... ABORTING', file=sys.stderr)
+        if control in readable and control.read():
+            abort = True
+            continue
+
+        t = time.time()
+        if nextabortcheck is not None and t >= nextabortcheck:
+            if os.path.exists(projectdir + '.abort'):
                 abort = True
-                statuscode = 2
-            lastpolltime = datetime.datetime.now()
-        elif settings.DISPATCHER_MAXTIME > 0 and d > settings.DISPATCHER_MAXTIME:
-            print("[CLAM Dispatcher] PROCESS TIMED OUT.. NO COMPLETION WITHIN " + str(d) + " SECONDS ... ABORTING", file=sys.stderr)
+            nextabortcheck = t + ABORTCHECKINTERVAL
+        if nextpoll is not None and t >= nextpoll:
+            resmem = accounting.sample(watcher.pid) if projectdir and not cgroup else None
+            if settings.DISPATCHER_MAXCPUTIME > 0 and (cgroup or isinstance(watcher, PoolJob)):
+                usedcputime = cgroup.cputime() if cgroup else watcher.cputime()
+                if usedcputime > settings.DISPATCHER_MAXCPUTIME:
+                    print("[CLAM Dispatcher] PROCESS EXCEEDS MAXIMUM CPU TIME (" + str(usedcputime) + ' >= ' + str(settings.DISPATCHER_MAXCPUTIME) + ')... ABORTING', file=sys.stderr)
+                    abort = True
+                    statuscode = 3
+            if settings.DISPATCHER_MAXRESMEM > 0 and not cgroup and watcher.pid and not abort:
+                if resmem is None:
+                    resmem = mem(watcher.pid)
+                if resmem > settings.DISPATCHER_MAXRESMEM * 1024:
+                    print("[CLAM Dispatcher] PROCESS EXCEEDS MAXIMUM RESIDENT MEMORY USAGE (" + str(resmem) + ' >= ' + str(settings.DISPATCHER_MAXRESMEM) + ')... ABORTING', file=sys.stderr)
+                    abort = True
+                    statuscode = 2
+            nextpoll = t + settings.DISPATCHER_POLLINTERVAL
+        if deadline is not None and t >= deadline and not abort:
+            print("[CLAM Dispatcher] PROCESS TIMED OUT.. NO COMPLETION WITHIN " + str(t - starttime) + " SECONDS ... ABORTING", file=sys.stderr)
             abort = True
             statuscode = 3
+            deadline = None
+
+    resources = accounting.resources(time.time() - starttime, watcher, cgroup) if projectdir else None
+    watcher.cleanup()
+    if cgroup:
+        cgroup.kill()
+        cgroup.remove()
+    watcher.close()
+    if control: control.close()
 
     if projectdir:
-        with open(projectdir + '.done','w') as f:
-            f.write(str(statuscode))
+        #a successful run becomes the base for incremental re-runs, a failed one can't be relied upon
+        if os.path.exists(projectdir + clam.common.incremental.PENDINGMANIFEST):
+            if statuscode == 0 and not abort:
+                os.rename(projectdir + clam.common.incremental.PENDINGMANIFEST, projectdir + clam.common.incremental.MANIFEST)
+            else:
+                os.unlink(projectdir + clam.common.incremental.PENDINGMANIFEST)
+                if os.path.exists(projectdir + clam.common.incremental.MANIFEST):
+                    os.unlink(projectdir + clam.common.incremental.MANIFEST)
+
+        #resources used by the run, stored with the project and logged for the whole service
+        try:
+            clam.common.accounting.save(projectdir + clam.common.accounting.RESOURCEFILE, resources)
+            if settings.RESOURCELOG:
+                clam.common.accounting.log(settings.RESOURCELOG, dict(resources, user=os.path.basename(os.path.dirname(projectdir[:-1])), project=os.path.basename(projectdir[:-1]), time=int(time.time()), exitcode=statuscode))
+        except (IOError, OSError) as e:
+            print("[CLAM Dispatcher] Unable to record resources: " + str(e), file=sys.stderr)
+        print("[CLAM Dispatcher] Resources: " + ", ".join( key + "=" + str(resources[key]) for key in clam.common.accounting.KEYS ), file=sys.stderr)
+
+        clam.common.status.writedone(projectdir, statuscode)
         if os.path.exists(projectdir + '.pid'): os.unlink(projectdir + '.pid')
+        #the run added and changed files all over the project, determine its size anew (once, rather than on every listing)
+        location = clam.common.statestore.locate(projectdir)
+        size = None
+        if location is not None:
+            try:
+                _, size = clam.common.diskusage.reconcile(projectdir)
+            except (IOError, OSError) as e:
+                print("[CLAM Dispatcher] Unable to determine disk usage: " + str(e), file=sys.stderr)
+        setstate(settings, projectdir, state=clam.common.statestore.DONE, exitcode=statuscode, aborted=int(abort), pid=0, finished=time.time(), size=size)
+
+        #update the row of the project in the project index
+        if location is not None:
+            try:
+                clam.common.projectindex.ProjectIndex(os.path.dirname(projectdir.rstrip('/'))).update(location[1], size=size, status=clam.common.status.DONE)
+            except (IOError, OSError, ValueError) as e:
+                print("[CLAM Dispatcher] Unable to update the project index: " + str(e), file=sys.stderr)
 
-        #remove project index cache (has to be recomputed next time because this project now has a different size)
-        if os.path.exists(os.path.join(projectdir,'..','.index')):
-            os.unlink(os.path.join(projectdir,'..','.index'))
+        #a slot has been freed, launch the next job(s) from the queue
+        if os.path.isdir(settings.QUEUEDIR):
+            try:
+                for job in clam.common.jobqueue.JobQueue(settings.QUEUEDIR, settings.LAUNCHER_SOCKET if settings.LAUNCHER else None, statestore(settings)).schedule(settings.MAXJOBS, settings.MAXCORES, settings.MAXMEMORY):
+                    print("[CLAM Dispatcher] Launched queued job for " + job['projectdir'], file=sys.stderr)
+            except (IOError, OSError) as e:
+                print("[CLAM Dispatcher] Unable to schedule queued jobs: " + str(e), file=sys.stderr)
+
+        #store the results of a successful run in the run cache, identical runs will be served from it
+        keyfile = projectdir + clam.common.runcache.KEYFILE
+        if os.path.exists(keyfile):
+            if settings.RUNCACHE and statuscode == 0 and not abort:
+                with open(keyfile,'r') as f:
+                    runkey = f.read().strip()
+                try:
+                    if clam.common.runcache.RunCache(settings.RUNCACHEDIR, settings.RUNCACHE_MAXSIZE).store(runkey, projectdir):
+                        print("[CLAM Dispatcher] Stored results in the run cache", file=sys.stderr)
+                except (IOError, OSError, shutil.Error) as e:
+                    print("[CLAM Dispatcher] Unable to store results in the run cache: " + str(e), file=sys.stderr)
+            os.unlink(keyfile)
 
 
     if tmpdir and os.path.exists(tmpdir):
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- CLAM Fan-out runner --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""Runs a project that was split into sub-jobs (see the ``fanout`` option of profiles).
+
+The webservice writes a plan to ``.fanout/plan.json`` in the project directory and runs this module as the command, so it is supervised by the dispatcher like any other command (aborts and limits apply to all sub-jobs). The plan lists the sub-jobs, each calling the system with its own restricted ``clam.xml`` and status file, the number of sub-jobs to run in parallel, and an optional reduce job that runs once all sub-jobs are done. Progress of the sub-jobs is aggregated into the status file of the project."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import sys
+import os
+import io
+import json
+import signal
+import select
+import fcntl
+import subprocess
+
+sys.path.append(sys.path[0] + '/..')
+
+import clam.common.status #pylint: disable=wrong-import-position
+
+#Interval (in seconds) at which the progress of the sub-jobs is aggregated
+STATUSINTERVAL = 2
+
+def log(msg):
+    print("[CLAM Fan-out] " + msg, file=sys.stderr)
+    sys.stderr.flush()
+
+def completion(statusfile):
+    """Returns the latest completion percentage from a status file"""
+    completion = 0
+    try:
+        with io.open(statusfile,'r',encoding='utf-8') as f:
+            for line in f:
+                field = line.split("\t")[0]
+                if field[-1:] == '%' and field[:-1].isdigit() and int(field[:-1]) > 0:
+                    completion = int(field[:-1])
+    except (IOError, OSError):
+        pass
+    return completion
+
+
+class FanOut(object):
+    def __init__(self, plan):
+        self.jobs = plan['jobs']
+        self.reduce = plan.get('reduce')
+        self.width = max(1, plan.get('width',1))
+        self.statusfile = plan['statusfile']
+        self.cwd = plan['cwd']
+        self.pending = list(range(0,len(self.jobs)))
+        self.running = {} #pid -> (job index, Popen)
+        self.done = set()
+        self.lastcompletion = None
+
+    def start(self, job):
+        if 'tmpdir' in job and not os.path.isdir(job['tmpdir']):
+            os.makedirs(job['tmpdir'])
+        return subprocess.Popen(job['cmd'], cwd=self.cwd, shell=True)
+
+    def report(self):
+        """Aggregate the progress of all jobs into the status file of the project"""
+        total = len(self.jobs) + (1 if self.reduce else 0)
+        progress = sum( 100 if i in self.done else completion(self.jobs[i]['statusfile']) for i in range(0,len(self.jobs)) )
+        overall = int(progress / total)
+        if overall != self.lastcompletion:
+            clam.common.status.write(self.statusfile, "Processed " + str(len(self.done)) + " of " + str(len(self.jobs)) + " parts (" + str(len(self.running)) + " running)", overall)
+            self.lastcompletion = overall
+
+    def run(self):
+        """Runs all jobs, returns the exit code"""
+        #woken up by SIGCHLD when a sub-job ends
+        wakeup_r, wakeup_w = os.pipe()
+        for fd in (wakeup_r, wakeup_w):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        signal.set_wakeup_fd(wakeup_w)
+
+        log("Running " + str(len(self.jobs)) + " parts, " + str(self.width) + " at a time")
+        exitcode = 0
+        while self.pending or self.running:
+            while self.pending and len(self.running) < self.width and not exitcode:
+                i = self.pending.pop(0)
+                process = self.start(self.jobs[i])
+                self.running[process.pid] = (i, process)
+            if not self.running:
+                break
+            self.report()
+            try:
+                select.select([wakeup_r], [], [], STATUSINTERVAL)
+            except (select.error, OSError): #interrupted (Python 2)
+                pass
+            try:
+                while os.read(wakeup_r, 512):
+                    pass
+            except OSError:
+                pass
+            for pid, (i, process) in list(self.running.items()):
+                if process.poll() is not None:
+                    del self.running[pid]
+                    if process.returncode != 0:
+                        log("Part " + str(i+1) + " failed with exit code " + str(process.returncode))
+                        if not exitcode:
+                            exitcode = process.returncode if process.returncode > 0 else 1
+                            self.pending = []
+                            for _, other in self.running.values():
+                                other.terminate()
+                    else:
+                        self.done.add(i)
+            self.report()
+
+        if exitcode:
+            clam.common.status.write(self.statusfile, "Failed", self.lastcompletion)
+            return exitcode
+
+        if self.reduce:
+            log("Running reduce step")
+            clam.common.status.write(self.statusfile, "Processed all parts, producing final output", int(100 * len(self.jobs) / (len(self.jobs) + 1)))
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            process = self.start(self.reduce)
+            process.wait()
+            if process.returncode != 0:
+                log("Reduce step failed with exit code " + str(process.returncode))
+                return process.returncode if process.returncode > 0 else 1
+        clam.common.status.write(self.statusfile, "Done", 100)
+        return 0
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Syntax: clamfanout plan.json", file=sys.stderr)
+        return 1
+    with io.open(sys.argv[1],'r',encoding='utf-8') as f:
+        plan = json.load(f)
+    return FanOut(plan).run()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- CLAM Launcher --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""A resident process that launches jobs on behalf of the webservice.
+
+Without the launcher, every project start spawns a shell that starts a new Python interpreter for the dispatcher, which has to import the settings module before it can run the actual command. The launcher imports the settings module once and listens on a unix socket (``LAUNCHER_SOCKET``); for each job it receives it forks a process that does the work of the dispatcher (see ``clamdispatcher.dispatch()``), so a job starts within milliseconds.
+
+The webservice starts the launcher at boot, replacing a launcher that may still be running from an earlier instance so settings are always current. Jobs keep running if the launcher goes away, and the webservice falls back to running the dispatcher command if no launcher can be reached."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import sys
+import os
+import io
+import time
+import datetime
+import socket
+import signal
+import fcntl
+import traceback
+
+sys.path.append(sys.path[0] + '/..')
+
+import clam.clamdispatcher #pylint: disable=wrong-import-position
+from clam.clamworkerpool import LineReader, send #pylint: disable=wrong-import-position
+
+
+def log(msg):
+    print("[CLAM Launcher] " + msg + " (" + datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S') + ")", file=sys.stderr)
+    sys.stderr.flush()
+
+def reap(signum=None, frame=None): #pylint: disable=unused-argument
+    """Collect the exit status of all finished job processes"""
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except OSError: #no children
+            return
+        if pid == 0:
+            return
+
+
+class Launcher(object):
+    def __init__(self, socketpath, settings, lockfile):
+        self.socketpath = socketpath
+        self.settings = settings
+        self.lockfile = lockfile
+        if os.path.exists(socketpath):
+            os.unlink(socketpath)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(socketpath)
+        os.chmod(socketpath, 0o660)
+        self.listener.listen(64)
+
+    def launch(self, job, clientsock):
+        """Fork a process for the job, returns its pid. The process runs the dispatcher with the error output going to the error log of the project."""
+        projectdir, tmpdir = clam.clamdispatcher.parseprojectdir(job['projectdir'])
+        cmd = clam.clamdispatcher.buildcommand(job['args'])
+        errorlog = os.open(job['errorlog'], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        ready_r, ready_w = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            exitcode = 1
+            try:
+                #detach from the launcher, the job must survive it
+                os.setsid()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                #the job must not hold on to the launcher's socket and lock
+                self.listener.close()
+                self.lockfile.close()
+                clientsock.close()
+                os.close(ready_w)
+                os.dup2(errorlog, 2)
+                os.close(errorlog)
+                os.chdir(job['cwd'])
+                os.read(ready_r, 1) #wait until the launcher has registered our pid
+                os.close(ready_r)
+                print("[CLAM Dispatcher] Started by CLAM Launcher (" + datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S') + ")", file=sys.stderr)
+                exitcode = clam.clamdispatcher.dispatch(self.settings, projectdir, tmpdir, cmd)
+            except Exception: #pylint: disable=broad-except
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(exitcode) #pylint: disable=protected-access
+        os.close(errorlog)
+        os.close(ready_r)
+        try:
+            if projectdir:
+                #written before the job proceeds, the dispatcher overwrites it with the pid of the command
+                with open(projectdir + '.pid','w') as f:
+                    f.write(str(pid))
+        finally:
+            os.write(ready_w, b"1")
+            os.close(ready_w)
+        return pid
+
+    def serve(self):
+        log("Listening on " + self.socketpath)
+        while True:
+            try:
+                clientsock, _ = self.listener.accept()
+            except socket.error: #interrupted by SIGCHLD (Python 2)
+                continue
+            try:
+                clientsock.settimeout(10)
+                message = LineReader(clientsock).readmessage()
+                if message is None:
+                    continue
+                if message.get('quit'):
+                    log("Replaced by a new launcher")
+                    send(clientsock, {'quit': True})
+                    return
+                try:
+                    pid = self.launch(message, clientsock)
+                    log("Launched job for " + message['projectdir'] + " with pid " + str(pid))
+                    send(clientsock, {'pid': pid})
+                except (OSError, IOError, KeyError, ValueError) as e:
+                    log("Unable to launch job: " + str(e))
+                    send(clientsock, {'error': str(e)})
+            except (socket.error, ValueError) as e:
+                log("Communication error: " + str(e))
+            finally:
+                clientsock.close()
+
+    def close(self):
+        self.listener.close()
+        if os.path.exists(self.socketpath):
+            os.unlink(self.socketpath)
+
+
+def stop(socketpath):
+    """Ask a running launcher to exit, returns True if there was one"""
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(5)
+    try:
+        s.connect(socketpath)
+        send(s, {'quit': True})
+        return LineReader(s).readmessage() is not None
+    except socket.error:
+        return False
+    finally:
+        s.close()
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("[CLAM Launcher] ERROR: Invalid syntax, use clamlauncher [pythonpath] settingsmodule", file=sys.stderr)
+        return 1
+
+    offset = 0
+    if '/' in sys.argv[1]:
+        for path in sys.argv[1].split(':'):
+            sys.path.append(path)
+        offset = 1
+    settingsmodule = sys.argv[1+offset]
+
+    try:
+        settings = clam.clamdispatcher.loadsettings(settingsmodule)
+    except ImportError as e:
+        print("[CLAM Launcher] FATAL ERROR: Unable to import settings module, settingsmodule is " + settingsmodule + ", error: " + str(e), file=sys.stderr)
+        return 1
+
+    #only one launcher per socket, an earlier one is asked to make way
+    socketpath = settings.LAUNCHER_SOCKET
+    lockfile = io.open(socketpath + '.lock','a')
+    begintime = time.time()
+    while True:
+        try:
+            fcntl.flock(lockfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except IOError:
+            if time.time() - begintime > 10:
+                print("[CLAM Launcher] Another launcher is still running for " + socketpath, file=sys.stderr)
+                return 1
+            stop(socketpath)
+            time.sleep(0.1)
+
+    def shutdown(signum, frame): #pylint: disable=unused-argument
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGCHLD, reap)
+
+    launcher = Launcher(socketpath, settings, lockfile)
+    try:
+        launcher.serve()
+    except (KeyboardInterrupt, SystemExit):
+        log("Shutting down")
+    finally:
+        launcher.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
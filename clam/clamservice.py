@@ -34,6 +34,12 @@ import argparse
 import time
 import socket
 import json
+import shlex
+import multiprocessing
+import multiprocessing.pool
+import threading
+import collections
+import copy
 import mimetypes
 import flask
 import werkzeug
@@ -45,6 +51,21 @@ import clam.common.formats
 import clam.common.auth
 import clam.common.oauth
 import clam.common.data
+import clam.common.jobqueue
+import clam.common.runcache
+import clam.common.incremental
+import clam.common.accounting
+import clam.common.statestore
+import clam.common.projectindex
+import clam.common.diskusage
+import clam.common.listing
+import clam.common.fragments
+import clam.common.statuslog
+import clam.common.statuswatch
+import clam.common.batching
+import clam.common.actionpool
+import clam.common.actioncache
+import clam.common.directexec
 from clam.common.util import globsymlinks, setdebug, setlog, setlogfile, printlog, printdebug, xmlescape, withheaders, computediskusage
 import clam.config.defaults as settings #will be overridden by real settings later
 settings.STANDALONEURLPREFIX = ''
@@ -75,10 +96,21 @@ VERSION = clam.common.data.VERSION
 
 DEBUG = False
 
-DATEMATCH = re.compile(r'^[\d\.\-\s:]*$')
-
 settingsmodule = None #will be overwritten later
 
+ACTIONPOOL = None #process pool for function actions, created on first use
+STATESTORE = None #project state store, if enabled (STATEDB)
+ACTIONCACHES = {} #action id => result cache, for actions with cache=True
+ACTIONARGV = {} #action id => command split into arguments (None if it needs a shell), for direct execution
+TMPDIRPOOL = None #temporary directories for actions, created on first use
+STATUSLOGS = collections.OrderedDict() #status file => parsed status log, the most recently used last
+STATUSLOGS_MAX = 1000 #number of status logs kept parsed
+STATUSLOGS_LOCK = threading.Lock()
+STATUSWATCHER = None #notifies requests waiting for the status of projects to change, created on first use
+SERVICETAG = None #identifies the service and its configuration in entity tags, computed on first use
+FRAGMENTS = None #parts of responses that only depend on the configuration, rendered at startup
+DISKUSAGE_RECONCILER = None #process id of the process whose thread periodically reconciles disk usage (DISKUSAGE_RECONCILE)
+
 setlog(sys.stderr)
 
 HOST = PORT = None
@@ -318,35 +350,64 @@ def entryshortcut(credentials = None, fromstart=False): #pylint: disable=too-man
     return None
 
 def getprojects(user):
+    diskusagereconciler()
     projects = []
     totalsize = 0.0
     path = settings.ROOT + "projects/" + user
-    if os.path.exists(os.path.join(path,'.index')):
-        with io.open(os.path.join(path,'.index'),'r',encoding='utf-8') as f:
-            try:
-                data = json.load(f)
-            except ValueError:
-                printlog("Invalid json in .index")
-                os.unlink(os.path.join(path,'.index'))
-                return getprojects(user)
-            totalsize = float(data['totalsize'])
-            projects = data['projects']
-    else:
-        for f in glob.glob(path + '/*'):
-            if os.path.isdir(f):
-                d = datetime.datetime.fromtimestamp(os.stat(f)[8])
-                project = os.path.basename(f)
-                projectsize = Project.getdiskusage(user,project )
-                totalsize += projectsize
-                projects.append( ( project , d.strftime("%Y-%m-%d %H:%M:%S"), round(projectsize,2), Project.simplestatus(project,user)  ) )
-            with io.open(os.path.join(path,'.index'),'w',encoding='utf-8') as f:
-                if sys.version < '3':
-                    data = json.dumps({'totalsize': totalsize, 'projects': projects}, ensure_ascii=False)
-                    f.write(data)
-                else:
-                    json.dump({'totalsize': totalsize, 'projects': projects},f, ensure_ascii=False)
+    if statestore() is not None:
+        for state in statestore().projects(user):
+            if state['size'] is None:
+                state['size'] = Project.getdiskusage(user, state['project'])
+            totalsize += state['size']
+            d = datetime.datetime.fromtimestamp(state['modified'])
+            projects.append( ( state['project'], d.strftime("%Y-%m-%d %H:%M:%S"), round(state['size'],2), Project.simplestatus(state['project'], user, state) ) )
+    elif os.path.isdir(path):
+        #the index is only built by scanning all projects once, after that it is kept up to date project by project (Project.changed)
+        def scan():
+            for f in glob.glob(path + '/*'):
+                if os.path.isdir(f):
+                    project = os.path.basename(f)
+                    yield [project, clam.common.projectindex.formatdate(os.stat(f).st_mtime), round(Project.getdiskusage(user, project),2), Project.simplestatus(project, user)]
+        projectindex = clam.common.projectindex.ProjectIndex(path)
+        for project, date, projectsize, status in projectindex.build(scan)['projects']:
+            if projectsize is None: #changed since, compute it again
+                projectsize = round(Project.getdiskusage(user, project),2)
+                projectindex.update(project, date=date, size=projectsize)
+            totalsize += projectsize
+            projects.append( (project, date, projectsize, status) )
     return projects, round(totalsize)
 
+#columns listings can be sorted on (clam.common.listing), the first is the default
+PROJECTSORTKEYS = ('name','date','size','status')
+FILESORTKEYS = ('name','template')
+#filters that can be applied to listings
+PROJECTFILTERKEYS = ('filter','status')
+FILEFILTERKEYS = ('filter','template')
+
+def getlisting(sortkeys, filterkeys):
+    """Returns the part of a listing requested (clam.common.listing), or None for all of it. Raises ValueError on invalid parameters."""
+    return clam.common.listing.Listing.fromrequest(flask.request.values, sortkeys, filterkeys, settings.LISTLIMIT)
+
+#sections of a project response that can be selected with the include parameter, all are included by default
+SECTIONS = ('status','profiles','parameters','program','input','output')
+
+def getinclude():
+    """Returns the sections of the project response requested with the include parameter (a comma-separated list), all sections if it is not given. Raises ValueError on unknown sections."""
+    value = flask.request.values.get('include')
+    if not value:
+        return SECTIONS
+    for section in value.split(','):
+        if section not in SECTIONS:
+            raise ValueError("No such section: " + section + ", only " + ", ".join(SECTIONS))
+    return tuple( section for section in SECTIONS if section in value.split(',') )
+
+def listingresponse(listing, items, **extra):
+    """JSON response holding a page of a listing, as the web interface requests it"""
+    data = listing.attributes()
+    data.update(extra)
+    data['items'] = items
+    return withheaders(flask.make_response(json.dumps(data)), 'application/json', {'allow_origin': settings.ALLOW_ORIGIN})
+
 def index(credentials = None):
     """Get list of projects or shortcut to other functionality"""
 
@@ -358,8 +419,19 @@ def index(credentials = None):
     projects = []
     user, oauth_access_token = parsecredentials(credentials)
     totalsize = 0.0
+    try:
+        listing = getlisting(PROJECTSORTKEYS, PROJECTFILTERKEYS)
+    except ValueError as e:
+        return withheaders(flask.make_response(str(e),400),headers={'allow_origin': settings.ALLOW_ORIGIN})
+    if listing is None and flask.request.values.get('list') == 'projects':
+        listing = clam.common.listing.Listing()
     if settings.LISTPROJECTS:
         projects, totalsize = getprojects(user)
+    if listing is not None:
+        projects = [ (row['name'], row['date'], row['size'], row['status']) for row in listing.apply([ {'name': p, 'date': date, 'size': size, 'status': status} for p, date, size, status in projects ]) ]
+    if flask.request.values.get('list') == 'projects':
+        #a page of the listing only, for the web interface
+        return listingresponse(listing, [ {'name': p, 'url': getrooturl() + '/' + p, 'date': date, 'size': size, 'status': status} for p, date, size, status in projects ], totalsize=totalsize)
 
     errors = "no"
     errormsg = ""
@@ -384,12 +456,14 @@ def index(credentials = None):
             errors=errors,
             errormsg=errormsg,
             parameterdata=settings.PARAMETERS,
+            fragments=fragments(),
             inputsources=corpora,
             outputpaths=None,
             inputpaths=None,
             profiles=settings.PROFILES,
             datafile=None,
             projects=projects,
+            projectlisting=listing,
             totalsize=totalsize,
             actions=settings.ACTIONS,
             disableinterface=not settings.ENABLEWEBAPP,
@@ -435,6 +509,7 @@ def info(credentials=None):
             errors=errors,
             errormsg=errormsg,
             parameterdata=settings.PARAMETERS,
+            fragments=fragments(),
             inputsources=corpora,
             outputpaths=None,
             inputpaths=None,
@@ -479,6 +554,9 @@ class Admin:
                 url=getrooturl(),
                 usersprojects = sorted(usersprojects.items()),
                 totalsize=totalsize,
+                runcache=runcache().stats() if settings.RUNCACHE else None,
+                actioncaches=[ (action, actioncache(action).stats()) for action in settings.ACTIONS if action.cache ],
+                resources=clam.common.accounting.aggregate(clam.common.accounting.readlog(settings.RESOURCELOG, settings.RESOURCELOG_WINDOW)) if settings.RESOURCELOG else None,
                 allow_origin=settings.ALLOW_ORIGIN,
                 oauth_access_token=oauth_encrypt(oauth_access_token)
         )), "text/html; charset=UTF-8", {'allow_origin':settings.ALLOW_ORIGIN}) #pylint: disable=bad-continuation
@@ -595,9 +673,26 @@ def getbinarydata(path, buffersize=16*1024):
                 break
             else:
                 yield data
+def signalabort(path):
+    """Ask the dispatcher of a project (or action job) in the given directory to abort"""
+    f = open(path + ".abort", 'w')
+    f.close()
+    os.chmod(path + ".abort", 0o777)
+    #wake up the dispatcher through its control channel, if it's not reachable it will notice the .abort file later
+    try:
+        fd = os.open(path + ".control", os.O_WRONLY | os.O_NONBLOCK)
+        try:
+            os.write(fd, b"abort\n")
+        finally:
+            os.close(fd)
+    except OSError:
+        printdebug("Control channel of dispatcher not available, relying on .abort file")
+
 class Project:
     """This class simply groups project methods, is not instantiated and does not offer any kind of persistence, all methods are static"""
 
+    STATUSEVENTINTERVAL = 15 #seconds after which a request waiting for the status to change checks it anyway (and a keep-alive is sent to event streams)
+
     @staticmethod
     def validate(project):
         return re.match(r'^\w+$',project, re.UNICODE)
@@ -608,17 +703,32 @@ class Project:
         user, oauth_access_token = parsecredentials(credentials) #pylint: disable=unused-variable
         return settings.ROOT + "projects/" + user + '/' + project + "/"
 
+    @staticmethod
+    def changed(project, user, delta=None, reconcile=False, **fields):
+        """Records a change of the project in the index of projects of the user (clam.common.projectindex), ``fields`` are the columns to set (e.g. status). ``delta`` is the number of bytes added to the project (negative if removed) and adjusts its size (clam.common.diskusage); ``reconcile`` determines the size anew by walking the project directory instead."""
+        path = Project.path(project, user)
+        if reconcile:
+            _, fields['size'] = clam.common.diskusage.reconcile(path)
+        elif delta is not None:
+            fields['size'] = clam.common.diskusage.adjust(path, delta)
+        if 'size' in fields and statestore() is not None:
+            statestore().set(user, project, size=fields['size'])
+        clam.common.projectindex.ProjectIndex(settings.ROOT + "projects/" + user).update(project, **fields)
+
     @staticmethod
     def getdiskusage(user, project):
         path = settings.ROOT + "projects/" + user + '/' + project + "/"
-        if os.path.exists(os.path.join(path,'.du')):
-            with open(os.path.join(path,'.du'),'r') as f:
-                return float(f.read().strip())
-        else:
-            size = computediskusage(path)
-            with open(os.path.join(path,'.du'),'w') as f:
-                f.write(str(size))
+        if statestore() is not None:
+            state = Project.state(project, user)
+            if state is not None and state['size'] is not None:
+                return state['size']
+            _, size = clam.common.diskusage.reconcile(path)
+            statestore().set(user, project, size=size)
             return size
+        size = clam.common.diskusage.get(path)
+        if size is None:
+            _, size = clam.common.diskusage.reconcile(path)
+        return size
 
     @staticmethod
     def create(project, credentials): #pylint: disable=too-many-return-statements
@@ -650,10 +760,12 @@ class Project:
         if not os.path.isdir(settings.ROOT + "projects/" + user + '/' + project):
             printlog("Creating project '" + project + "'")
             os.makedirs(settings.ROOT + "projects/" + user + '/' + project)
-
-        #project index will need to be regenerated, remove cache
-        if os.path.exists(os.path.join(settings.ROOT + "projects/" + user,'.index')):
-            os.unlink(os.path.join(settings.ROOT + "projects/" + user,'.index'))
+            if statestore() is not None:
+                statestore().set(user, project, state=clam.common.statestore.READY, created=time.time(), size=None)
+            clam.common.diskusage.set(Project.path(project, user), 0.0)
+            Project.changed(project, user, 0, status=clam.common.status.READY)
+        else:
+            Project.changed(project, user) #input is being added
 
         if not os.path.isdir(settings.ROOT + "projects/" + user + '/' + project + '/input/'):
             os.makedirs(settings.ROOT + "projects/" + user + '/' + project + "/input")
@@ -670,8 +782,22 @@ class Project:
 
         return None #checks rely on this
 
+    @staticmethod
+    def state(project, user):
+        """Returns the state of the project from the state store (see clam.common.statestore), or None if the state store is not enabled or the project does not exist. Projects that are not in the store yet are imported."""
+        if statestore() is None:
+            return None
+        state = statestore().get(user, project)
+        if state is None and os.path.isdir(Project.path(project, user)):
+            statestore().importproject(user, project, Project.path(project, user))
+            state = statestore().get(user, project)
+        return state
+
     @staticmethod
     def pid(project, user):
+        if statestore() is not None:
+            state = Project.state(project, user)
+            return state['pid'] if state is not None and state['state'] == clam.common.statestore.RUNNING else 0
         pidfile = Project.path(project, user) + '.pid'
         if os.path.isfile(pidfile):
             f = open(pidfile,'r')
@@ -682,7 +808,34 @@ class Project:
             return 0
 
     @staticmethod
-    def running(project, user):
+    def queued(project, user, state=None):
+        if statestore() is not None:
+            state = state or Project.state(project, user)
+            return state is not None and state['state'] == clam.common.statestore.QUEUED
+        return os.path.isfile(Project.path(project, user) + ".queued")
+
+    @staticmethod
+    def queueposition(project, user):
+        """Returns a (position, total) tuple, position is 0 if the project is not queued"""
+        return jobqueue().position(Project.path(project, user))
+
+    @staticmethod
+    def running(project, user, state=None):
+        if statestore() is not None:
+            state = state or Project.state(project, user)
+            if state is None or state['state'] != clam.common.statestore.RUNNING:
+                return False
+            try:
+                if state['pid']: os.kill(state['pid'], 0) #raises error if pid doesn't exist
+                return True
+            except OSError:
+                #the dispatcher is gone without finishing the project
+                clam.common.status.writedone(Project.path(project, user), 1)
+                if os.path.exists(Project.path(project, user) + '.pid'):
+                    os.unlink(Project.path(project, user) + '.pid')
+                statestore().set(user, project, state=clam.common.statestore.DONE, exitcode=1, pid=0, finished=time.time())
+                Project.changed(project, user, reconcile=True, status=clam.common.status.DONE) #the dispatcher did not get to account for the output
+                return False
         pidfile = Project.path(project, user) + '.pid'
         if os.path.isfile(pidfile) and not os.path.isfile(Project.path(project, user) + ".done"):
             f = open(pidfile,'r')
@@ -692,10 +845,9 @@ class Project:
                 os.kill(pid, 0) #raises error if pid doesn't exist
                 return True
             except:
-                f = open(Project.path(project, user) + ".done", 'w')
-                f.write(str(1) )
-                f.close()
+                clam.common.status.writedone(Project.path(project, user), 1)
                 os.unlink(pidfile)
+                Project.changed(project, user, reconcile=True, status=clam.common.status.DONE) #the dispatcher did not get to account for the output
                 return False
         else:
             return False
@@ -703,32 +855,53 @@ class Project:
 
     @staticmethod
     def abort(project, user):
+        if Project.queued(project, user) and jobqueue().remove(Project.path(project, user)):
+            printlog("Removing project '" + project + "' from the queue" )
+            open(Project.path(project,user) + ".aborted", 'w').close()
+            clam.common.status.writedone(Project.path(project,user), 1)
+            if statestore() is not None:
+                statestore().set(user, project, state=clam.common.statestore.DONE, exitcode=1, aborted=1, finished=time.time())
+            Project.changed(project, user, status=clam.common.status.DONE)
+            return True
         if Project.pid(project, user) == 0:
             return False
         printlog("Aborting process of project '" + project + "'" )
-        f = open(Project.path(project,user) + ".abort", 'w')
-        f.close()
-        os.chmod( Project.path(project,user) + ".abort", 0o777)
+        signalabort(Project.path(project,user))
+        printdebug("Waiting for process to die")
         while not os.path.exists(Project.path(project, user) + ".done"):
-            printdebug("Waiting for process to die")
-            time.sleep(1)
+            time.sleep(0.1)
         return True
 
     @staticmethod
-    def done(project,user):
+    def done(project, user, state=None):
+        if statestore() is not None:
+            state = state or Project.state(project, user)
+            return state is not None and state['state'] == clam.common.statestore.DONE
         return os.path.isfile(Project.path(project, user) + ".done")
 
     @staticmethod
-    def aborted(project,user):
+    def aborted(project, user, state=None):
+        if statestore() is not None:
+            state = state or Project.state(project, user)
+            return state is not None and bool(state['aborted'])
         return os.path.isfile(Project.path(project, user) + ".aborted")
 
 
     @staticmethod
     def exitstatus(project, user):
-        f = open(Project.path(project, user) + ".done")
-        status = int(f.read(1024))
-        f.close()
-        return status
+        if statestore() is not None:
+            state = Project.state(project, user)
+            return state['exitcode'] if state is not None and state['exitcode'] is not None else 1
+        try:
+            with open(Project.path(project, user) + ".done") as f:
+                return int(f.read(1024).strip() or 1)
+        except (IOError, OSError, ValueError):
+            return 1
+
+    @staticmethod
+    def resources(project, user):
+        """Returns the resources used by the last run of the project (see clam.common.accounting), or None"""
+        return clam.common.accounting.load(Project.path(project, user) + clam.common.accounting.RESOURCEFILE)
 
     @staticmethod
     def exists(project, credentials):
@@ -739,52 +912,27 @@ class Project:
 
     @staticmethod
     def statuslog(project, user):
-        statuslog = []
-        statusfile = Project.path(project,user) + ".status"
-        totalcompletion = 0
-        if os.path.isfile(statusfile): #pylint: disable=too-many-nested-blocks
-            prevmsg = None
-            with open(statusfile) as f:
-                for line in f: #pylint: disable=too-many-nested-blocks
-                    line = line.strip()
-                    if line:
-                        message = ""
-                        completion = 0
-                        timestamp = ""
-                        for field in line.split("\t"):
-                            if field:
-                                if field[-1] == '%' and field[:-1].isdigit():
-                                    completion = int(field[:-1])
-                                    if completion > 0:
-                                        totalcompletion = completion
-                                elif DATEMATCH.match(field):
-                                    if field.isdigit():
-                                        try:
-                                            d = datetime.datetime.fromtimestamp(float(field))
-                                            timestamp = d.strftime("%d/%b/%Y %H:%M:%S")
-                                        except ValueError:
-                                            pass
-                                else:
-                                    message += " " + field
-
-                        if message and (message != prevmsg):
-                            #print "STATUSLOG: t=",timestamp,"c=",completion,"msg=" + message.strip()
-                            statuslog.append( (message.strip(), timestamp, completion) )
-                            prevmsg = message
-            statuslog.reverse()
-        return statuslog, totalcompletion
+        """Returns a (statuslog, completion) tuple for the project, the status log being a list of (message, timestamp, completion) tuples with the most recent message first"""
+        return statuslog(Project.path(project, user) + ".status").read()
 
     @staticmethod
     def status(project, user):
-        if Project.running(project, user):
+        state = Project.state(project, user)
+        if Project.queued(project, user, state):
+            schedule() #we may be next
+            position, total = Project.queueposition(project, user)
+            if position:
+                return (clam.common.status.RUNNING, "Queued, waiting for execution (position " + str(position) + " of " + str(total) + ")", [], 0)
+            state = Project.state(project, user) #launched in the meantime
+        if Project.running(project, user, state):
             statuslog, completion = Project.statuslog(project, user)
             if statuslog:
                 return (clam.common.status.RUNNING, statuslog[0][0],statuslog, completion)
             else:
                 return (clam.common.status.RUNNING, "The system is running",  [], 0) #running
-        elif Project.done(project, user):
+        elif Project.done(project, user, state):
             statuslog, completion = Project.statuslog(project, user)
-            if Project.aborted(project,user):
+            if Project.aborted(project, user, state):
                 if not statuslog:
                     completion = 100
                 return (clam.common.status.DONE, "Aborted! Output may be partial or unavailable", statuslog, completion)
@@ -797,16 +945,19 @@ class Project:
             return (clam.common.status.READY, "Accepting new input files and selection of parameters", [], 0)
 
     @staticmethod
-    def simplestatus(project, user):
-        if Project.done(project, user):
+    def simplestatus(project, user, state=None):
+        if statestore() is not None and state is None:
+            state = Project.state(project, user)
+        if Project.done(project, user, state):
             return clam.common.status.DONE
-        elif Project.running(project, user):
+        elif Project.queued(project, user, state) or Project.running(project, user, state):
             return clam.common.status.RUNNING
         else:
             return clam.common.status.READY
 
     @staticmethod
-    def status_json(project, credentials=None):
+    def statususer(project):
+        """Returns a (user, error) tuple for a request on the JSON status of a project, which is authenticated by an access token (as passed to the web interface) rather than a login"""
         postdata = flask.request.values
         if 'user' in postdata:
             user = flask.request.values['user']
@@ -815,14 +966,86 @@ class Project:
         if 'accesstoken' in postdata:
             accesstoken = flask.request.values['accesstoken']
         else:
-            return "{success: false, error: 'No accesstoken given'}"
+            return user, "{success: false, error: 'No accesstoken given'}"
         if accesstoken != Project.getaccesstoken(user,project):
-            return "{success: false, error: 'Invalid accesstoken given'}"
+            return user, "{success: false, error: 'Invalid accesstoken given'}"
         if not os.path.exists(Project.path(project, user)):
-            return "{success: false, error: 'Destination does not exist'}"
+            return user, "{success: false, error: 'Destination does not exist'}"
+        return user, None
+
+    @staticmethod
+    def statusversion(statuscode, statusmsg, statuslog, completion, queueposition):
+        """Returns a short identifier of the status that changes whenever anything in it does"""
+        return hashlib.md5(json.dumps([statuscode, statusmsg, statuslog, completion, queueposition]).encode('utf-8')).hexdigest()[:16]
 
+    @staticmethod
+    def statusdata(project, user):
+        """Returns the status of the project as a dictionary, as served in JSON"""
         statuscode, statusmsg, statuslog, completion = Project.status(project,user)
-        return json.dumps({'success':True, 'statuscode':statuscode,'statusmsg':statusmsg, 'statuslog': statuslog, 'completion': completion})
+        queueposition, _ = Project.queueposition(project, user)
+        return {'success':True, 'statuscode':statuscode,'statusmsg':statusmsg, 'statuslog': statuslog, 'completion': completion, 'queueposition': queueposition, 'version': Project.statusversion(statuscode, statusmsg, statuslog, completion, queueposition)}
+
+    @staticmethod
+    def waitstatus(project, user, since, wait):
+        """Holds the request until the status of the project differs from version ``since``, for at most ``wait`` seconds (long-polling). Returns the status data."""
+        deadline = time.time() + wait
+        with statuswatcher().watch(Project.path(project, user)) as watch:
+            while True:
+                token = watch.token() #before determining the status, so no change is missed
+                data = Project.statusdata(project, user)
+                remaining = deadline - time.time()
+                if data['version'] != since or remaining <= 0:
+                    return data
+                watch.wait(token, min(remaining, Project.STATUSEVENTINTERVAL)) #queue positions are not watched, check them now and then
+
+    @staticmethod
+    def statuswait():
+        """Returns the ``since`` and ``wait`` parameters of a long-polling status request, ``since`` is None if the request does not wait"""
+        since = flask.request.values.get('since')
+        try:
+            wait = min(float(flask.request.values.get('wait',settings.STATUS_MAXWAIT)), settings.STATUS_MAXWAIT)
+        except ValueError:
+            wait = settings.STATUS_MAXWAIT
+        return since, wait
+
+    @staticmethod
+    def status_json(project, credentials=None):
+        """Status of the project in JSON, for the web interface. With ``since`` set to the version of the status the client has, the request is held until the status changes (long-polling)"""
+        user, error = Project.statususer(project)
+        if error:
+            return error
+        since, wait = Project.statuswait()
+        if since:
+            Project.waitstatus(project, user, since, wait)
+        etag = Project.etag(project, user, 'status') #before determining the status, so the tag is never newer than the status
+        if flask.request.if_none_match.contains(etag):
+            return Project.notmodified(etag) #304
+        return Project.withetag(flask.make_response(json.dumps(Project.statusdata(project, user))), etag)
+
+    @staticmethod
+    def status_events(project, credentials=None):
+        """Status of the project as server-sent events (text/event-stream): an event ``status`` with the status in JSON (as status_json) is sent whenever the status changes. The stream ends once the project is no longer running."""
+        user, error = Project.statususer(project)
+        if error:
+            return error
+        lastversion = flask.request.headers.get('Last-Event-ID') #set by browsers when reconnecting
+
+        def generate(lastversion):
+            with statuswatcher().watch(Project.path(project, user)) as watch:
+                changed = True
+                while True:
+                    token = watch.token()
+                    data = Project.statusdata(project, user)
+                    if data['version'] != lastversion:
+                        yield "id: " + data['version'] + "\nevent: status\ndata: " + json.dumps(data) + "\n\n"
+                        lastversion = data['version']
+                    elif not changed:
+                        yield ": keepalive\n\n" #also detects clients that went away
+                    if data['statuscode'] != clam.common.status.RUNNING:
+                        break
+                    changed = watch.wait(token, Project.STATUSEVENTINTERVAL)
+
+        return withheaders(flask.Response(generate(lastversion), 200), "text/event-stream", {'allow_origin': settings.ALLOW_ORIGIN, 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
     @staticmethod
     def inputindex(project, user, d = ''):
@@ -880,36 +1103,109 @@ class Project:
 
 
 
+    @staticmethod
+    def page(project, user, listing, basedir='input'):
+        """Returns the input or output files on the page of the listing (clam.common.listing). Files are filtered and sorted on their names (and templates, if needed) first, only the files on the page are loaded."""
+        directory = Project.path(project, user) + basedir
+        rows = [ {'name': filename} for filename in clam.common.listing.files(directory) ]
+        if listing.needs('template'):
+            for row in rows:
+                row['template'] = clam.common.listing.template(directory, row['name'])
+        fileclass = clam.common.data.CLAMInputFile if basedir == 'input' else clam.common.data.CLAMOutputFile
+        files = []
+        for row in listing.apply(rows):
+            file = fileclass(Project.path(project, user), row['name'])
+            file.attachviewers(settings.PROFILES) #attaches converters as well
+            files.append(file)
+        return files
+
+    @staticmethod
+    def listfiles(project, user, basedir, listing):
+        """Returns a page of the input or output files as JSON, as the web interface requests it"""
+        if basedir == 'input':
+            templates = dict( (t.id, t) for profile in settings.PROFILES for t in profile.input )
+            listed = Project.simplestatus(project, user) != clam.common.status.RUNNING
+        else:
+            templates = dict( (t.id, t) for profile in settings.PROFILES for t in profile.outputtemplates() )
+            listed = Project.simplestatus(project, user) == clam.common.status.DONE
+        items = []
+        for file in (Project.page(project, user, listing, basedir) if listed else []):
+            url = getrooturl() + '/' + project + '/' + basedir + '/' + file.filename
+            if file.metadata and basedir == 'input':
+                template = templates.get(file.metadata.inputtemplate)
+            elif file.metadata and file.metadata.provenance:
+                template = templates.get(file.metadata.provenance.outputtemplate_id)
+            else:
+                template = None
+            items.append({
+                'name': file.filename,
+                'url': url,
+                'template': template.id if template else None,
+                'label': template.label if template else "",
+                'format': template.formatclass.__name__ if template else "",
+                'viewers': [ {'id': viewer.id, 'name': viewer.name, 'url': url + '/' + viewer.id} for viewer in file.viewers ],
+                'converters': [ {'id': converter.id, 'label': converter.label, 'url': url + '/' + converter.id} for converter in file.converters ],
+            })
+        return listingresponse(listing, items)
+
     #main view
     @staticmethod
-    def response(user, project, parameters, errormsg = "", datafile = False, oauth_access_token="", matchedprofiles=None, program=None,http_code=200):
+    def response(user, project, parameters, errormsg = "", datafile = False, oauth_access_token="", matchedprofiles=None, program=None,http_code=200, inputfilter=None, listing=None, include=SECTIONS):
         #check if there are invalid parameters:
         if not errormsg:
             errors = "no"
         else:
             errors = "yes"
 
+        #the data file passed to the system always holds all sections, responses may hold only those asked for (include)
+        if datafile:
+            include = SECTIONS
+
         statuscode, statusmsg, statuslog, completion = Project.status(project, user)
+        if statuscode == clam.common.status.RUNNING and 'status' in include:
+            queueposition, queuelength = Project.queueposition(project, user)
+        else:
+            queueposition = queuelength = 0
+        statusversion = Project.statusversion(statuscode, statusmsg, statuslog, completion, queueposition) if 'status' in include else None
 
         customhtml = ""
         if statuscode == clam.common.status.READY:
             customhtml = settings.CUSTOMHTML_PROJECTSTART
 
+        #the data file passed to the system always lists all files, responses may list part of them (clam.common.listing)
+        if datafile:
+            listing = None
+        elif listing is None and settings.LISTLIMIT:
+            listing = clam.common.listing.Listing(limit=settings.LISTLIMIT)
+        inputlisting = outputlisting = None
+
         inputpaths = []
-        if statuscode == clam.common.status.READY or statuscode == clam.common.status.DONE:
-            inputpaths = Project.inputindex(project, user) #pylint: disable=redefined-variable-type
+        if (statuscode == clam.common.status.READY or statuscode == clam.common.status.DONE) and 'input' in include:
+            if inputfilter is not None: #only the specified input files (clam.xml of a sub-job)
+                inputpaths = [ inputfile for inputfile in Project.inputindex(project, user) if inputfile.filename in inputfilter ]
+            elif listing is not None:
+                inputlisting = copy.copy(listing)
+                inputpaths = Project.page(project, user, inputlisting, 'input')
+            else:
+                inputpaths = Project.inputindex(project, user) #pylint: disable=redefined-variable-type
 
 
 
+        resources = None
+        outputpaths = [] #pylint: disable=redefined-variable-type
         if statuscode == clam.common.status.DONE:
-            outputpaths = Project.outputindex(project, user)
+            if 'output' in include and listing is not None:
+                outputlisting = copy.copy(listing)
+                outputpaths = Project.page(project, user, outputlisting, 'output')
+            elif 'output' in include:
+                outputpaths = Project.outputindex(project, user)
+            if 'status' in include:
+                resources = Project.resources(project, user)
             if Project.exitstatus(project, user) != 0: #non-zero codes indicate errors!
                 errors = "yes"
                 errormsg = "An error occurred within the system. Please inspect the error log for details"
                 printlog("Child process failed, exited with non zero-exit code.")
             customhtml = settings.CUSTOMHTML_PROJECTDONE
-        else:
-            outputpaths = [] #pylint: disable=redefined-variable-type
 
 
         for parametergroup, parameterlist in parameters: #pylint: disable=unused-variable
@@ -934,12 +1230,20 @@ class Project:
                 statusmessage=statusmsg,
                 statuslog=statuslog,
                 completion=completion,
+                statusversion=statusversion,
+                resources=resources,
+                queueposition=queueposition,
+                queuelength=queuelength,
                 errors=errors,
                 errormsg=errormsg,
                 parameterdata=parameters,
+                fragments=fragments(),
                 inputsources=settings.INPUTSOURCES,
                 outputpaths=outputpaths,
                 inputpaths=inputpaths,
+                outputlisting=outputlisting,
+                inputlisting=inputlisting,
+                include=include,
                 profiles=settings.PROFILES,
                 matchedprofiles=matchedprofiles, #comma-separated list of indices (str)
                 program=program, #Program instance
@@ -981,16 +1285,62 @@ class Project:
         else:
             #if user and not Project.access(project, user) and not user in settings.ADMINS:
             #    return flask.make_response("Access denied to project " +  project + " for user " + user, 401) #401
+            try:
+                listing = getlisting(FILESORTKEYS, FILEFILTERKEYS)
+                include = getinclude()
+            except ValueError as e:
+                return withheaders(flask.make_response(str(e),400),headers={'allow_origin': settings.ALLOW_ORIGIN})
+            which = flask.request.values.get('list')
+            since, wait = Project.statuswait()
+            if since:
+                #long-polling: hold the request until the status changes
+                Project.waitstatus(project, user, since, wait)
+            etag = Project.etag(project, user, oauth_access_token, which, include, [ flask.request.values.get(key) for key in clam.common.listing.PARAMETERS ])
+            if flask.request.if_none_match.contains(etag):
+                return Project.notmodified(etag) #304
+            if which in ('input','output'):
+                #a page of the input or output files only, for the web interface
+                return Project.withetag(Project.listfiles(project, user, which, listing or clam.common.listing.Listing()), etag)
             datafile = os.path.join(Project.path(project,credentials),'clam.xml')
             statuscode, statusmsg, statuslog, completion = Project.status(project, user) #pylint: disable=unused-variable
-            if statuscode == clam.common.status.DONE and os.path.exists(datafile):
+            if statuscode == clam.common.status.DONE and 'program' in include and os.path.exists(datafile):
                 f = io.open(datafile,'r',encoding='utf-8')
                 xmldata = f.read(os.path.getsize(datafile))
                 f.close()
                 data = clam.common.data.CLAMData(xmldata, None,False, Project.path(project,credentials), loadmetadata=False)
-                return Project.response(user, project, settings.PARAMETERS,"",False,oauth_access_token,','.join([str(x) for x in data.program.matchedprofiles]) if data.program else "", data.program) #200
+                response = Project.response(user, project, settings.PARAMETERS,"",False,oauth_access_token,','.join([str(x) for x in data.program.matchedprofiles]) if data.program else "", data.program, listing=listing, include=include) #200
             else:
-                return Project.response(user, project, settings.PARAMETERS,"",False,oauth_access_token) #200
+                response = Project.response(user, project, settings.PARAMETERS,"",False,oauth_access_token, listing=listing, include=include) #200
+            return Project.withetag(response, etag)
+
+    @staticmethod
+    def etag(project, user, *extra):
+        """Returns an entity tag for responses on the project. It is computed from the service version, the flag and status files and the modification times of the input and output directories only (a handful of stat calls), and changes whenever the state, status, input or output of the project does. Any ``extra`` values the response depends on are included."""
+        queued = Project.queued(project, user)
+        if queued:
+            schedule() #we may be next, as Project.status would do
+        else:
+            Project.running(project, user) #notices processes that ended without finishing the project
+        path = Project.path(project, user)
+        mtimes = []
+        for directory in (path + 'input', path + 'output', settings.QUEUEDIR if queued else None): #the queue position is part of the status
+            try:
+                mtimes.append(os.stat(directory).st_mtime if directory else None)
+            except OSError:
+                mtimes.append(None)
+        return hashlib.md5(json.dumps([servicetag(), user, project, list(extra), clam.common.statuswatch.signature(path), mtimes]).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def withetag(response, etag):
+        """Adds the entity tag to the response. Clients are to revalidate (conditional GET with If-None-Match) rather than use the response without asking."""
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    @staticmethod
+    def notmodified(etag):
+        """Response to a conditional GET when the project did not change (304 Not Modified)"""
+        return Project.withetag(withheaders(flask.make_response("",304),headers={'allow_origin': settings.ALLOW_ORIGIN}), etag)
 
 
     @staticmethod
@@ -1036,10 +1386,6 @@ class Project:
 
         errors, parameters, commandlineparams = clam.common.data.processparameters(postdata, settings.PARAMETERS)
 
-        sufresources, resmsg = sufficientresources()
-        if not sufresources:
-            printlog("*** NOT ENOUGH SYSTEM RESOURCES AVAILABLE: " + resmsg + " ***")
-            return withheaders(flask.make_response("There are not enough system resources available to accommodate your request. " + resmsg + " .Please try again later.",503),headers={'allow_origin': settings.ALLOW_ORIGIN})
         if not errors: #We don't even bother running the profiler if there are errors
             matchedprofiles, program = clam.common.data.profiler(settings.PROFILES, Project.path(project, user), parameters, settings.SYSTEM_ID, settings.SYSTEM_NAME, getrooturl(), printdebug)
             #converted matched profiles to a list of indices
@@ -1057,43 +1403,84 @@ class Project:
             return Project.response(user, project, parameters, "No profiles matching input and parameters, unable to start. Are you sure you added all necessary input files and set all necessary parameters?", False, oauth_access_token,http_code=403)
         else:
             #everything good, write clam.xml output file and start
-            with io.open(Project.path(project, user) + "clam.xml",'wb') as f:
+            projectdir = Project.path(project, user)
+            parametervalues = [ (parameter.id, parameter.value) for parameter in clam.common.data.sanitizeparameters(parameters).values() if parameter.hasvalue ]
+
+            #identical runs are served from the run cache
+            cached = False
+            keyfile = projectdir + clam.common.runcache.KEYFILE
+            if os.path.exists(keyfile):
+                os.unlink(keyfile)
+            if settings.RUNCACHE:
+                runkey = clam.common.runcache.runkey(projectdir, parametervalues, matchedprofiles_byindex, settings.SYSTEM_VERSION)
+                cached = runcache().retrieve(runkey, projectdir)
+                if cached:
+                    printlog("Project '" + project + "' retrieved from the run cache (" + runkey + ")")
+                else:
+                    with open(keyfile,'w') as f:
+                        f.write(runkey) #the dispatcher stores the results under this key
+
+            #in incremental mode, output of the previous run for unchanged input is kept and only the rest is produced
+            uptodate = False
+            if settings.INCREMENTAL:
+                inputs = clam.common.incremental.inputmanifest(projectdir)
+                config = clam.common.incremental.configkey(parametervalues, matchedprofiles_byindex, settings.SYSTEM_VERSION)
+                if not cached:
+                    previous = clam.common.incremental.load(projectdir + clam.common.incremental.MANIFEST)
+                    kept = clam.common.incremental.restore(projectdir, clam.common.incremental.unchanged(previous, inputs, config, program))
+                    if kept:
+                        printlog("Incremental run of project '" + project + "': keeping " + str(len(kept)) + " output file(s), producing " + str(len(program) - len(kept)))
+                        remaining = program.restrict([ outputfilename for outputfilename in program if outputfilename not in kept ])
+                        remaining.incremental = True
+                        uptodate = not remaining
+                    else:
+                        remaining = program
+                clam.common.incremental.discard(projectdir)
+                #the manifest describes the complete program, it becomes valid once the run succeeds
+                clam.common.incremental.write(projectdir + (clam.common.incremental.MANIFEST if cached or uptodate else clam.common.incremental.PENDINGMANIFEST), inputs, config, program)
+                if not cached:
+                    program = remaining
+            elif os.path.isdir(projectdir + clam.common.incremental.PREVIOUSDIR):
+                clam.common.incremental.discard(projectdir)
+
+            with io.open(projectdir + "clam.xml",'wb') as f:
                 f.write(Project.response(user, project, parameters, "",True, oauth_access_token, ",".join([str(x) for x in matchedprofiles_byindex]), program).data)
 
-
+            if cached or uptodate:
+                #nothing to run
+                with io.open(projectdir + "output/error.log",'w',encoding='utf-8') as f:
+                    if cached:
+                        f.write("Output retrieved from the run cache, the system was not run again\n")
+                    else:
+                        f.write("Output is up to date with the input, the system was not run again\n")
+                clam.common.status.writedone(projectdir, 0)
+                if statestore() is not None:
+                    statestore().set(user, project, state=clam.common.statestore.DONE, exitcode=0, aborted=0, pid=0, started=time.time(), finished=time.time(), size=None)
+                Project.changed(project, user, reconcile=True, status=clam.common.status.DONE) #output was restored from the cache
+                if shortcutresponse is True:
+                    if oauth_access_token:
+                        return withheaders(flask.redirect(getrooturl() + '/' + project + '/?oauth_access_token=' + oauth_access_token),headers={'allow_origin': settings.ALLOW_ORIGIN})
+                    else:
+                        return withheaders(flask.redirect(getrooturl() + '/' + project),headers={'allow_origin': settings.ALLOW_ORIGIN})
+                return Project.response(user, project, parameters,"",False,oauth_access_token,",".join([str(x) for x in matchedprofiles_byindex]), program,http_code=202) #returns 202 - Accepted
 
             #Start project with specified parameters
-            cmd = settings.COMMAND
-            cmd = cmd.replace('$PARAMETERS', " ".join(commandlineparams)) #commandlineparams is shell-safe
-            #if 'usecorpus' in postdata and postdata['usecorpus']:
-            #    corpus = postdata['usecorpus'].replace('..','') #security
-            #    #use a preinstalled corpus:
-            #    if os.path.exists(settings.ROOT + "corpora/" + corpus):
-            #        cmd = cmd.replace('$INPUTDIRECTORY', settings.ROOT + "corpora/" + corpus + "/")
-            #    else:
-            #        raise web.webapi.NotFound("Corpus " + corpus + " not found")
-            #else:
-            cmd = cmd.replace('$INPUTDIRECTORY', Project.path(project, user) + 'input/')
-            cmd = cmd.replace('$OUTPUTDIRECTORY',Project.path(project, user) + 'output/')
-            cmd = cmd.replace('$TMPDIRECTORY',Project.path(project, user) + 'tmp/')
-            cmd = cmd.replace('$STATUSFILE',Project.path(project, user) + '.status')
-            cmd = cmd.replace('$DATAFILE',Project.path(project, user) + 'clam.xml')
-            cmd = cmd.replace('$USERNAME',user if user else "anonymous")
-            cmd = cmd.replace('$PROJECT',project) #alphanumberic only, shell-safe
-            cmd = cmd.replace('$OAUTH_ACCESS_TOKEN',oauth_access_token)
+            cmd = Project.command(project, user, commandlineparams, oauth_access_token)
+
+            #profiles may split the run into parallel sub-jobs, the fan-out runner then takes the place of the command
+            fanoutcmd = Project.fanout(project, user, parameters, oauth_access_token, matchedprofiles, ",".join([str(x) for x in matchedprofiles_byindex]), program, commandlineparams)
+            if fanoutcmd:
+                cmd = fanoutcmd
             cmd = clam.common.data.escapeshelloperators(cmd)
             #everything should be shell-safe now
+            #the launcher gets the arguments as the shell would pass them to the dispatcher
+            try:
+                spec = {'projectdir': Project.path(project, user), 'args': shlex.split(cmd), 'errorlog': Project.path(project, user) + "output/error.log"}
+            except ValueError: #unbalanced quotes, leave it to the shell
+                spec = None
             cmd += " 2> " + Project.path(project, user) + "output/error.log" #add error output
 
-            pythonpath = ''
-            try:
-                pythonpath = ':'.join(settings.DISPATCHER_PYTHONPATH)
-            except AttributeError:
-                pass
-            if pythonpath:
-                pythonpath = os.path.dirname(settings.__file__) + ':' + pythonpath
-            else:
-                pythonpath = os.path.dirname(settings.__file__)
+            pythonpath = getpythonpath()
 
             #if settings.DISPATCHER == 'clamdispatcher' and os.path.exists(settings.CLAMDIR + '/' + settings.DISPATCHER + '.py') and stat.S_IXUSR & os.stat(settings.CLAMDIR + '/' + settings.DISPATCHER+'.py')[stat.ST_MODE]:
             #    #backward compatibility for old configurations without setuptools
@@ -1105,25 +1492,97 @@ class Project:
                     cmd = "ssh -o NumberOfPasswordPrompts=0 " + settings.REMOTEUSER + "@" + settings.REMOTEHOST + " " + cmd
                 else:
                     cmd = "ssh -o NumberOfPasswordPrompts=0 " + settings.REMOTEHOST + " " + cmd
-            printlog("Starting dispatcher " +  settings.DISPATCHER + " with " + settings.COMMAND + ": " + repr(cmd) + " ..." )
-            #process = subprocess.Popen(cmd,cwd=Project.path(project), shell=True)
-            process = subprocess.Popen(cmd,cwd=settings.CLAMDIR, shell=True)
-            if process:
-                pid = process.pid
-                printlog("Started dispatcher with pid " + str(pid) )
-                with open(Project.path(project, user) + '.pid','w') as f: #will be handled by dispatcher!
-                    f.write(str(pid))
-                if shortcutresponse is True:
-                    #redirect to project page to lose parameters in URL
-                    if oauth_access_token:
-                        return withheaders(flask.redirect(getrooturl() + '/' + project + '/?oauth_access_token=' + oauth_access_token),headers={'allow_origin': settings.ALLOW_ORIGIN})
-                    else:
-                        return withheaders(flask.redirect(getrooturl() + '/' + project),headers={'allow_origin': settings.ALLOW_ORIGIN})
+
+            #the resources a job claims are determined by the most demanding matching profile
+            cores = max([ profile.cores for profile in matchedprofiles ])
+            memory = max([ profile.memory for profile in matchedprofiles ])
+
+            #the job is queued, the scheduler launches the dispatcher as soon as limits and resources allow
+            printlog("Queueing dispatcher " +  settings.DISPATCHER + " with " + settings.COMMAND + ": " + repr(cmd) + " ..." )
+            try:
+                position = jobqueue().submit(Project.path(project, user), cmd, settings.CLAMDIR, user, project, cores, memory, spec)
+                Project.changed(project, user, status=clam.common.status.RUNNING)
+                schedule()
+            except (IOError, OSError) as e:
+                printlog("Unable to queue or launch process: " + str(e))
+                return withheaders(flask.make_response("Unable to launch process",500),headers={'allow_origin': settings.ALLOW_ORIGIN})
+            if Project.queued(project, user):
+                printlog("Project '" + project + "' queued at position " + str(position))
+            else:
+                printlog("Started dispatcher with pid " + str(Project.pid(project, user)) )
+            if shortcutresponse is True:
+                #redirect to project page to lose parameters in URL
+                if oauth_access_token:
+                    return withheaders(flask.redirect(getrooturl() + '/' + project + '/?oauth_access_token=' + oauth_access_token),headers={'allow_origin': settings.ALLOW_ORIGIN})
                 else:
-                    #normal response (202)
-                    return Project.response(user, project, parameters,"",False,oauth_access_token,",".join([str(x) for x in matchedprofiles_byindex]), program,http_code=202) #returns 202 - Accepted
+                    return withheaders(flask.redirect(getrooturl() + '/' + project),headers={'allow_origin': settings.ALLOW_ORIGIN})
             else:
-                return withheaders(flask.make_response("Unable to launch process",500),headers={'allow_origin': settings.ALLOW_ORIGIN})
+                #normal response (202)
+                return Project.response(user, project, parameters,"",False,oauth_access_token,",".join([str(x) for x in matchedprofiles_byindex]), program,http_code=202) #returns 202 - Accepted
+
+    @staticmethod
+    def command(project, user, commandlineparams, oauth_access_token, datafile=None, statusfile=None, tmpdir=None):
+        """Returns the command to run the system for the project, with all variables substituted. The data file, status file and temporary directory can be overridden (for sub-jobs)."""
+        cmd = settings.COMMAND
+        cmd = cmd.replace('$PARAMETERS', " ".join(commandlineparams)) #commandlineparams is shell-safe
+        #if 'usecorpus' in postdata and postdata['usecorpus']:
+        #    corpus = postdata['usecorpus'].replace('..','') #security
+        #    #use a preinstalled corpus:
+        #    if os.path.exists(settings.ROOT + "corpora/" + corpus):
+        #        cmd = cmd.replace('$INPUTDIRECTORY', settings.ROOT + "corpora/" + corpus + "/")
+        #    else:
+        #        raise web.webapi.NotFound("Corpus " + corpus + " not found")
+        #else:
+        cmd = cmd.replace('$INPUTDIRECTORY', Project.path(project, user) + 'input/')
+        cmd = cmd.replace('$OUTPUTDIRECTORY',Project.path(project, user) + 'output/')
+        cmd = cmd.replace('$TMPDIRECTORY', tmpdir if tmpdir else Project.path(project, user) + 'tmp/')
+        cmd = cmd.replace('$STATUSFILE', statusfile if statusfile else Project.path(project, user) + '.status')
+        cmd = cmd.replace('$DATAFILE', datafile if datafile else Project.path(project, user) + 'clam.xml')
+        cmd = cmd.replace('$USERNAME',user if user else "anonymous")
+        cmd = cmd.replace('$PROJECT',project) #alphanumberic only, shell-safe
+        cmd = cmd.replace('$OAUTH_ACCESS_TOKEN',oauth_access_token)
+        return cmd
+
+    @staticmethod
+    def fanout(project, user, parameters, oauth_access_token, matchedprofiles, matchedprofiles_byindex, program, commandlineparams):
+        """Splits the run into sub-jobs if any of the matched profiles asks for it (``fanout``): one sub-job per group of input files, each with its own clam.xml restricted to its inputs and outputs, and a reduce job for the remaining (unique) outputs.
+        Writes the plan for the fan-out runner (clamfanout) and returns the command to run it, or None if the run is not split."""
+        fanoutdir = Project.path(project, user) + '.fanout/'
+        if os.path.isdir(fanoutdir):
+            shutil.rmtree(fanoutdir)
+        fanoutprofiles = [ profile for profile in matchedprofiles if profile.fanout ]
+        if not fanoutprofiles:
+            return None
+        fanouttemplates = set( outputtemplate.id for profile in fanoutprofiles for outputtemplate in profile.outputtemplates() if outputtemplate and outputtemplate.parent )
+        parts, remainder = program.partition(fanouttemplates)
+        if not parts:
+            return None
+        #unique outputs of profiles that don't want a reduce step are left out
+        noreduce = set( outputtemplate.id for profile in fanoutprofiles if not profile.reduce for outputtemplate in profile.outputtemplates() if outputtemplate )
+        remainder = remainder.restrict([ outputfilename for outputfilename, outputtemplate in remainder.outputpairs() if outputtemplate not in noreduce ])
+
+        os.makedirs(fanoutdir)
+        width = min([ settings.FANOUT_WIDTH if profile.fanout is True else int(profile.fanout) for profile in fanoutprofiles ])
+        plan = {'width': width, 'jobs': [], 'reduce': None, 'statusfile': Project.path(project, user) + '.status', 'cwd': Project.path(project, user)}
+        for i, part in enumerate(parts):
+            jobid = str(i+1)
+            plan['jobs'].append(Project.fanoutjob(project, user, parameters, oauth_access_token, matchedprofiles_byindex, part, commandlineparams, jobid, part.inputfilenames()))
+        if remainder:
+            plan['reduce'] = Project.fanoutjob(project, user, parameters, oauth_access_token, matchedprofiles_byindex, remainder, commandlineparams, 'reduce')
+        with io.open(fanoutdir + 'plan.json','w',encoding='utf-8') as f:
+            f.write(json.dumps(plan, indent=1, ensure_ascii=False))
+        printlog("Splitting run of project '" + project + "' into " + str(len(parts)) + " parts, running " + str(width) + " at a time" + (", with a reduce step" if remainder else ""))
+        return sys.executable + " -m clam.clamfanout " + fanoutdir + "plan.json"
+
+    @staticmethod
+    def fanoutjob(project, user, parameters, oauth_access_token, matchedprofiles_byindex, program, commandlineparams, jobid, inputfilter=None):
+        """Writes the clam.xml for a sub-job and returns its description for the fan-out plan"""
+        fanoutdir = Project.path(project, user) + '.fanout/'
+        with io.open(fanoutdir + jobid + '.xml','wb') as f:
+            f.write(Project.response(user, project, parameters, "",True, oauth_access_token, matchedprofiles_byindex, program, inputfilter=inputfilter).data)
+        tmpdir = Project.path(project, user) + 'tmp/' + jobid + '/'
+        cmd = Project.command(project, user, commandlineparams, oauth_access_token, fanoutdir + jobid + '.xml', fanoutdir + jobid + '.status', tmpdir)
+        return {'cmd': cmd, 'statusfile': fanoutdir + jobid + '.status', 'tmpdir': tmpdir}
 
     @staticmethod
     def delete(project, credentials=None):
@@ -1143,10 +1602,13 @@ class Project:
         if not abortonly:
             printlog("Deleting project '" + project + "'" )
             shutil.rmtree(Project.path(project, user))
+            if statestore() is not None:
+                statestore().remove(user, project)
+            with STATUSLOGS_LOCK:
+                STATUSLOGS.pop(Project.path(project, user) + ".status", None)
+            clam.common.projectindex.ProjectIndex(settings.ROOT + "projects/" + user).remove(project)
             msg += " Deleted"
         msg = msg.strip()
-        if os.path.exists(os.path.join(settings.ROOT + "projects/" + user,'.index')):
-            os.unlink(os.path.join(settings.ROOT + "projects/" + user,'.index'))
         return withheaders(flask.make_response(msg),'text/plain',{'Content-Length':len(msg), 'allow_origin': settings.ALLOW_ORIGIN})  #200
 
 
@@ -1266,7 +1728,9 @@ class Project:
             return withheaders(flask.make_response(msg), 'text/plain',{'Content-Length':len(msg), 'allow_origin': settings.ALLOW_ORIGIN}) #200
         elif os.path.isdir(Project.path(project, user) + filename):
             #Deleting specified directory
+            removed = computediskusage(Project.path(project, user) + filename) * clam.common.diskusage.MB
             shutil.rmtree(Project.path(project, user) + filename)
+            Project.changed(project, user, -removed)
             msg = "Deleted"
             return withheaders(flask.make_response(msg), 'text/plain',{'Content-Length':len(msg), 'allow_origin': settings.ALLOW_ORIGIN}) #200
         else:
@@ -1275,10 +1739,12 @@ class Project:
             except:
                 raise flask.abort(404)
 
+            removed = clam.common.diskusage.filesizes(Project.path(project, user) + 'output', file.filename)
             success = file.delete()
             if not success:
                 raise flask.abort(404)
             else:
+                Project.changed(project, user, -removed)
                 msg = "Deleted"
                 return withheaders(flask.make_response(msg), 'text/plain',{'Content-Length':len(msg), 'allow_origin': settings.ALLOW_ORIGIN}) #200
 
@@ -1287,15 +1753,29 @@ class Project:
     def reset(project, user):
         """Reset system, delete all output files and prepare for a new run"""
         d = Project.path(project, user) + "output"
-        if os.path.isdir(d):
+        removed = clam.common.diskusage.filesize(Project.path(project, user) + ".done", Project.path(project, user) + ".status", Project.path(project, user) + clam.common.accounting.RESOURCEFILE) #bytes
+        if not os.path.isdir(d):
+            raise flask.abort(404)
+        elif settings.INCREMENTAL and os.path.exists(Project.path(project, user) + clam.common.incremental.MANIFEST):
+            #keep the output of the last successful run aside, the next run only has to produce what changed (the output set aside before is removed)
+            if os.path.isdir(Project.path(project, user) + clam.common.incremental.PREVIOUSDIR):
+                removed += computediskusage(Project.path(project, user) + clam.common.incremental.PREVIOUSDIR) * clam.common.diskusage.MB
+            clam.common.incremental.setaside(Project.path(project, user))
+        else:
+            removed += computediskusage(d) * clam.common.diskusage.MB
             shutil.rmtree(d)
             os.makedirs(d)
-        else:
-            raise flask.abort(404)
         if os.path.exists(Project.path(project, user) + ".done"):
             os.unlink(Project.path(project, user) + ".done")
         if os.path.exists(Project.path(project, user) + ".status"):
             os.unlink(Project.path(project, user) + ".status")
+        with STATUSLOGS_LOCK: #the inode of the status file may be reused, parse the next one from scratch
+            STATUSLOGS.pop(Project.path(project, user) + ".status", None)
+        if os.path.exists(Project.path(project, user) + clam.common.accounting.RESOURCEFILE):
+            os.unlink(Project.path(project, user) + clam.common.accounting.RESOURCEFILE)
+        if statestore() is not None:
+            statestore().set(user, project, state=clam.common.statestore.READY, exitcode=None, aborted=0, pid=0, started=None, finished=None)
+        Project.changed(project, user, -removed, status=clam.common.status.READY)
 
     @staticmethod
     def getarchive(project, user, format=None):
@@ -1428,12 +1908,16 @@ class Project:
 
         if len(filename) == 0:
             #Deleting all input files
+            removed = computediskusage(Project.path(project, user) + 'input') * clam.common.diskusage.MB
             shutil.rmtree(Project.path(project, user) + 'input')
             os.makedirs(Project.path(project, user) + 'input') #re-add new input directory
+            Project.changed(project, user, -removed)
             return "Deleted" #200
         elif os.path.isdir(Project.path(project, user) + filename):
             #Deleting specified directory
+            removed = computediskusage(Project.path(project, user) + filename) * clam.common.diskusage.MB
             shutil.rmtree(Project.path(project, user) + filename)
+            Project.changed(project, user, -removed)
             return "Deleted" #200
         else:
             try:
@@ -1441,10 +1925,12 @@ class Project:
             except:
                 raise flask.abort(404)
 
+            removed = clam.common.diskusage.filesizes(Project.path(project, user) + 'input', file.filename)
             success = file.delete()
             if not success:
                 raise flask.abort(404)
             else:
+                Project.changed(project, user, -removed)
                 msg = "Deleted"
                 return withheaders(flask.make_response(msg),'text/plain', {'Content-Length': len(msg), 'allow_origin': settings.ALLOW_ORIGIN}) #200
 
@@ -1741,6 +2227,7 @@ def addfile(project, filename, user, postdata, inputsource=None,returntype='xml'
     #  ----------- Check if archive are allowed -------------
     archive = False
     addedfiles = []
+    replacedsize = 0 #bytes of files that are overwritten
     if not errors and inputtemplate.acceptarchive: #pylint: disable=too-many-nested-blocks
         printdebug('(Archive test)')
         # -------- Are we an archive? If so, determine what kind
@@ -1836,6 +2323,7 @@ def addfile(project, filename, user, postdata, inputsource=None,returntype='xml'
                     if subfile and os.path.isfile(Project.path(project, user) + subfile):
                         subfile_newname = clam.common.data.resolveinputfilename(os.path.basename(subfile), parameters, inputtemplate, nextseq+len(addedfiles), project)
                         printdebug('(Extracted file ' + subfile + ', moving to input/' + subfile_newname+')')
+                        replacedsize += clam.common.diskusage.filesizes(Project.path(project, user) + 'input', subfile_newname)
                         os.rename(Project.path(project, user) + subfile, Project.path(project, user) + 'input/' +  subfile_newname)
                         addedfiles.append(subfile_newname)
                 firstline = False
@@ -1871,6 +2359,7 @@ def addfile(project, filename, user, postdata, inputsource=None,returntype='xml'
             if not archive:
                 #============================ Transfer file ========================================
                 printdebug('(Start file transfer: ' +  Project.path(project, user) + 'input/' + filename+' )')
+                replacedsize += clam.common.diskusage.filesizes(Project.path(project, user) + 'input', filename)
                 if 'file' in flask.request.files:
                     printdebug('(Receiving data by uploading file)')
                     #Upload file from client to server
@@ -2014,6 +2503,13 @@ def addfile(project, filename, user, postdata, inputsource=None,returntype='xml'
 
     output += "</clamupload>"
 
+    #account for the added files (and their metadata) in the size of the project
+    if addedfiles:
+        addedsize = 0
+        for filename in addedfiles:
+            addedsize += clam.common.diskusage.filesizes(Project.path(project, user) + 'input', filename)
+        Project.changed(project, user, addedsize - replacedsize)
+
 
 
     if returntype == 'boolean':
@@ -2048,6 +2544,10 @@ def addfile(project, filename, user, postdata, inputsource=None,returntype='xml'
 
 
 def interfacedata(): #no auth
+    return staticresponse('data.js')
+
+def interfacescript():
+    """Returns the data the web interface loads (data.js)"""
     inputtemplates_mem = []
     inputtemplates = []
     for profile in settings.PROFILES:
@@ -2056,7 +2556,7 @@ def interfacedata(): #no auth
                 inputtemplates_mem.append(inputtemplate)
                 inputtemplates.append( inputtemplate.json() )
 
-    return withheaders(flask.make_response("systemid = '"+ settings.SYSTEM_ID + "'; baseurl = '" + getrooturl() + "';\n inputtemplates = [ " + ",".join(inputtemplates) + " ];"), 'text/javascript', {'allow_origin': settings.ALLOW_ORIGIN})
+    return "systemid = '"+ settings.SYSTEM_ID + "'; baseurl = '" + getrooturl() + "';\n inputtemplates = [ " + ",".join(inputtemplates) + " ];"
 
 def foliaxsl():
     if foliatools is not None:
@@ -2066,10 +2566,28 @@ def foliaxsl():
 
 
 def styledata():
+    return staticresponse('style.css')
+
+def stylesheet():
+    """Returns the style sheet of the web interface"""
     if settings.STYLE[0] == '/':
-        return withheaders(flask.make_response(io.open(settings.STYLE,'r',encoding='utf-8').read()),'text/css', {'allow_origin': settings.ALLOW_ORIGIN})
+        return io.open(settings.STYLE,'r',encoding='utf-8').read()
+    else:
+        return io.open(settings.CLAMDIR + '/style/' + settings.STYLE + '.css','r',encoding='utf-8').read()
+
+def staticresponse(name):
+    """Serves static data rendered at startup (clam.common.fragments) with a strong entity tag, clients may cache it for STATIC_MAXAGE seconds"""
+    static = fragments().static.get(name)
+    if static is None:
+        return withheaders(flask.make_response(name + " is not available",404),headers={'allow_origin': settings.ALLOW_ORIGIN})
+    if flask.request.if_none_match.contains(static.etag):
+        response = flask.make_response("",304)
     else:
-        return withheaders(flask.make_response(io.open(settings.CLAMDIR + '/style/' + settings.STYLE + '.css','r',encoding='utf-8').read()),'text/css', {'allow_origin': settings.ALLOW_ORIGIN})
+        response = flask.make_response(static.content)
+    response = withheaders(response, static.mimetype, {'allow_origin': settings.ALLOW_ORIGIN})
+    response.set_etag(static.etag)
+    response.headers['Cache-Control'] = 'public, max-age=' + str(settings.STATIC_MAXAGE)
+    return response
 
 
 def uploader(project, credentials=None):
@@ -2099,6 +2617,8 @@ def uploader(project, credentials=None):
 
 class ActionHandler(object):
 
+    STREAMCHUNKSIZE = 65536 #maximum number of bytes read from the output of a streaming action at once
+
     @staticmethod
     def find_action( actionid, method):
         for action in settings.ACTIONS:
@@ -2107,8 +2627,10 @@ class ActionHandler(object):
         raise Exception("No such action: " + actionid)
 
     @staticmethod
-    def collect_parameters(action):
-        data = flask.request.values
+    def collect_parameters(action, data=None):
+        """Validates the parameter values (from the request unless ``data`` is given) and returns a list of (flag, value, id) tuples"""
+        if data is None:
+            data = flask.request.values
         params = []
         for parameter in action.parameters:
             if not parameter.id in data:
@@ -2134,8 +2656,37 @@ class ActionHandler(object):
         except:
             return withheaders(flask.make_response("Action does not exist",404),headers={'allow_origin': settings.ALLOW_ORIGIN})
 
-        printdebug("Performing action " + action.id)
+        if action.cache:
+            try:
+                collectedparams = ActionHandler.collect_parameters(action)
+            except clam.common.data.ParameterError as e:
+                return withheaders(flask.make_response(str(e),403),headers={'allow_origin': settings.ALLOW_ORIGIN})
+            return ActionHandler.docached(action, collectedparams, user, oauth_access_token)
 
+        return ActionHandler.perform(action, user, oauth_access_token)
+
+    @staticmethod
+    def docached(action, collectedparams, user, oauth_access_token):
+        """Returns the cached result of an action with cache=True, or performs it and caches its result"""
+        parameters = [ (paramid, value) for _, value, paramid in collectedparams ]
+        if action.command and (action.command.find('$USERNAME') != -1 or action.command.find('$OAUTH_ACCESS_TOKEN') != -1):
+            #the result may differ per user
+            parameters += [ ('$USERNAME', user), ('$OAUTH_ACCESS_TOKEN', oauth_access_token) ]
+        key = clam.common.actioncache.cachekey(action.id, parameters)
+        cached = actioncache(action).get(key)
+        if cached is not None:
+            status, contenttype, body = cached
+            printdebug("Returning cached result for action " + action.id)
+            return withheaders(flask.make_response(body,status), contenttype, {'allow_origin': settings.ALLOW_ORIGIN})
+        response = ActionHandler.perform(action, user, oauth_access_token, collectedparams)
+        if response.status_code == 200 and not response.is_streamed:
+            actioncache(action).put(key, response.status_code, response.headers['Content-Type'], response.get_data())
+        return response
+
+    @staticmethod
+    def perform(action, user="anonymous", oauth_access_token="", collectedparams=None): #pylint: disable=too-many-return-statements
+        """Performs the action and returns the response. The parameters are collected from the request unless ``collectedparams`` is given"""
+        printdebug("Performing action " + action.id)
 
         userdir =  settings.ROOT + "projects/" + user + '/'
 
@@ -2143,17 +2694,24 @@ class ActionHandler(object):
             cmd = action.command
 
             parameters = ""
-            try:
-                collectedparams =ActionHandler.collect_parameters(action)
-            except clam.common.data.ParameterError as e:
-                return withheaders(flask.make_response(str(e),403),headers={'allow_origin': settings.ALLOW_ORIGIN})
+            if collectedparams is None:
+                try:
+                    collectedparams = ActionHandler.collect_parameters(action)
+                except clam.common.data.ParameterError as e:
+                    return withheaders(flask.make_response(str(e),403),headers={'allow_origin': settings.ALLOW_ORIGIN})
+
+            if action.background:
+                #the command runs as a job, the client obtains the result later
+                return ActionHandler.submit(action, collectedparams, user, oauth_access_token)
 
+            values = []
             for flag, value, paramid in collectedparams:
                 if sys.version[0] == '2':
                     if isinstance(value, str):
                         value = unicode(value,'utf-8') #pylint: disable=undefined-variable
                 elif not isinstance(value, str):
                     value = str(value)
+                values.append( (flag, value, paramid) )
                 if value:
                     try:
                         if cmd.find('$' + paramid + '$') != -1:
@@ -2165,56 +2723,83 @@ class ActionHandler(object):
                     except ValueError as e:
                         return withheaders(flask.make_response("Parameter " + paramid + " has an invalid value...",403),headers={'allow_origin': settings.ALLOW_ORIGIN})
 
+            pooledtmpdir = False
             if action.tmpdir is True or cmd.find('$TMPDIRECTORY') != -1:
-                tmpdir = os.path.join(settings.SESSIONDIR, 'atmp.' + str("%034x" % random.getrandbits(128)))
+                try:
+                    tmpdir = tmpdirpool().acquire()
+                except OSError:
+                    return withheaders(flask.make_response("Unable to create temporary action directory",500),headers={'allow_origin': settings.ALLOW_ORIGIN})
+                pooledtmpdir = True
                 passdir = 'tmp://' + tmpdir
                 passcwd = tmpdir
             elif action.tmpdir:
                 tmpdir = action.tmpdir
                 passcwd = tmpdir
                 passdir = 'tmp://' + tmpdir
-            else:
-                tmpdir = None
-                passdir = 'NONE'
-                passcwd = userdir
-
-            if tmpdir:
                 try:
                     os.mkdir(tmpdir)
                 except: #pylint: disable=bare-except
                     return withheaders(flask.make_response("Unable to create temporary action directory",500),headers={'allow_origin': settings.ALLOW_ORIGIN})
-
-            cmd = cmd.replace('$PARAMETERS', parameters)
-            if tmpdir:
-                cmd = cmd.replace('$TMPDIRECTORY', tmpdir)
-            cmd = cmd.replace('$USERNAME',user if user else "anonymous")
-            cmd = cmd.replace('$OAUTH_ACCESS_TOKEN',oauth_access_token if oauth_access_token else "")
-            cmd = clam.common.data.escapeshelloperators(cmd)
-            #everything should be shell-safe now
-
-            #run the action
-            pythonpath = ''
-            try:
-                pythonpath = ':'.join(settings.DISPATCHER_PYTHONPATH)
-            except:
-                pass
-            if pythonpath:
-                pythonpath = os.path.dirname(settings.__file__) + ':' + pythonpath
             else:
-                pythonpath = os.path.dirname(settings.__file__)
+                tmpdir = None
+                passdir = 'NONE'
+                passcwd = userdir
 
-            cmd = settings.DISPATCHER + ' ' + pythonpath + ' ' + settingsmodule + ' ' + passdir + ' ' + cmd
-            if settings.REMOTEHOST:
-                if settings.REMOTEUSER:
-                    cmd = "ssh -o NumberOfPasswordPrompts=0 " + settings.REMOTEUSER + "@" + settings.REMOTEHOST + " " + cmd
+            def cleanup():
+                if pooledtmpdir:
+                    tmpdirpool().release(tmpdir)
+                elif tmpdir:
+                    shutil.rmtree(tmpdir)
+
+            variables = {
+                '$TMPDIRECTORY': tmpdir if tmpdir else '$TMPDIRECTORY',
+                '$USERNAME': user if user else "anonymous",
+                '$OAUTH_ACCESS_TOKEN': oauth_access_token if oauth_access_token else "",
+            }
+            process = None
+            if ActionHandler.direct():
+                #fast path: the dispatcher has nothing to add, run the command ourselves
+                argv = ActionHandler.argv(action)
+                if argv is not None:
+                    cmd = clam.common.directexec.buildargv(argv, values, variables)
                 else:
-                    cmd = "ssh -o NumberOfPasswordPrompts=0 " + settings.REMOTEHOST + " " + cmd
-            printlog("Starting dispatcher " +  settings.DISPATCHER + " for action " + actionid + " with " + action.command + ": " + repr(cmd) + " ..." )
-            if sys.version[0] == '2' and isinstance(cmd,unicode): #pylint: disable=undefined-variable
-                cmd = cmd.encode('utf-8')
-            process = subprocess.Popen(cmd,cwd=passcwd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            if process:
-                printlog("Waiting for dispatcher (pid " + str(process.pid) + ") to finish" )
+                    cmd = cmd.replace('$PARAMETERS', parameters)
+                    for variable, value in variables.items():
+                        cmd = cmd.replace(variable, value)
+                printlog("Running action " + action.id + " directly with " + action.command + ": " + repr(cmd) + " ..." )
+                if sys.version[0] == '2':
+                    if isinstance(cmd,unicode): #pylint: disable=undefined-variable
+                        cmd = cmd.encode('utf-8')
+                    elif argv is not None:
+                        cmd = [ arg.encode('utf-8') if isinstance(arg,unicode) else arg for arg in cmd ] #pylint: disable=undefined-variable
+                try:
+                    process = subprocess.Popen(cmd,cwd=passcwd, shell=argv is None, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                except OSError as e:
+                    printlog("Unable to execute command for action " + action.id + ": " + str(e))
+                    cleanup()
+                    return withheaders(flask.make_response("Unable to launch process",500),headers={'allow_origin': settings.ALLOW_ORIGIN})
+            else:
+                cmd = cmd.replace('$PARAMETERS', parameters)
+                for variable, value in variables.items():
+                    cmd = cmd.replace(variable, value)
+                cmd = clam.common.data.escapeshelloperators(cmd)
+                #everything should be shell-safe now
+
+                #run the action
+                cmd = settings.DISPATCHER + ' ' + getpythonpath() + ' ' + settingsmodule + ' ' + passdir + ' ' + cmd
+                if settings.REMOTEHOST:
+                    if settings.REMOTEUSER:
+                        cmd = "ssh -o NumberOfPasswordPrompts=0 " + settings.REMOTEUSER + "@" + settings.REMOTEHOST + " " + cmd
+                    else:
+                        cmd = "ssh -o NumberOfPasswordPrompts=0 " + settings.REMOTEHOST + " " + cmd
+                printlog("Starting dispatcher " +  settings.DISPATCHER + " for action " + action.id + " with " + action.command + ": " + repr(cmd) + " ..." )
+                if sys.version[0] == '2' and isinstance(cmd,unicode): #pylint: disable=undefined-variable
+                    cmd = cmd.encode('utf-8')
+                process = subprocess.Popen(cmd,cwd=passcwd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            if process and action.stream:
+                return ActionHandler.stream(action, process, cleanup)
+            elif process:
+                printlog("Waiting for action process (pid " + str(process.pid) + ") to finish" )
                 stdoutdata, stderrdata = process.communicate()
                 if sys.version >= '3':
                     stdoutdata = str(stdoutdata,'utf-8')
@@ -2229,23 +2814,26 @@ class ActionHandler(object):
                     else:
                         printdebug("    action stdout:\n" + stdoutdata)
                         printdebug("    action stderr:\n" + stderrdata)
-                printlog("Dispatcher finished with code " + str(process.returncode) )
-                if tmpdir:
-                    shutil.rmtree(tmpdir)
-                if process.returncode in action.returncodes200:
-                    return withheaders(flask.make_response(stdoutdata,200),action.mimetype, {'allow_origin': settings.ALLOW_ORIGIN}) #200
-                elif process.returncode in action.returncodes403:
-                    return withheaders(flask.make_response(stdoutdata,403), action.mimetype, {'allow_origin': settings.ALLOW_ORIGIN})
-                elif process.returncode in action.returncodes404:
-                    return withheaders(flask.make_response(stdoutdata, 404), action.mimetype, {'allow_origin': settings.ALLOW_ORIGIN})
-                else:
-                    return withheaders(flask.make_response("Process for action " +  actionid + " failed\n" + stderrdata,500),headers={'allow_origin': settings.ALLOW_ORIGIN})
+                printlog("Action process finished with code " + str(process.returncode) )
+                cleanup()
+                return ActionHandler.result(action, process.returncode, stdoutdata, stderrdata)
             else:
                 return withheaders(flask.make_response("Unable to launch process",500),headers={'allow_origin': settings.ALLOW_ORIGIN})
         elif action.function:
-            actionargs = [ x[1] for x in  ActionHandler.collect_parameters(action) ]
+            if collectedparams is None:
+                collectedparams = ActionHandler.collect_parameters(action)
+            actionargs = [ x[1] for x in collectedparams ]
             try:
-                r = action.function(*actionargs) #200
+                if action.pool and clam.common.actionpool.AVAILABLE:
+                    r = actionpool().call(settings.ACTIONS.index(action), actionargs, action.timeout) #200
+                else:
+                    r = action.function(*actionargs) #200
+            except clam.common.actionpool.PoolFull:
+                printlog("Process pool for actions is full, refusing action " + action.id)
+                return withheaders(flask.make_response("Too many pending requests, try again later",503),"text/plain", {'allow_origin': settings.ALLOW_ORIGIN, 'Retry-After': str(settings.ACTIONPOOL_RETRYAFTER)})
+            except clam.common.actionpool.PoolTimeout:
+                printlog("Action " + action.id + " timed out after " + str(action.timeout) + "s")
+                return withheaders(flask.make_response("Action " + action.id + " did not finish within " + str(action.timeout) + " seconds",504),"text/plain", {'allow_origin': settings.ALLOW_ORIGIN})
             except Exception as e: #pylint: disable=broad-except
                 if isinstance(e, werkzeug.exceptions.HTTPException):
                     raise
@@ -2260,7 +2848,342 @@ class ActionHandler(object):
             else:
                 return r
         else:
-            raise Exception("No command or function defined for action " + actionid)
+            raise Exception("No command or function defined for action " + action.id)
+
+    @staticmethod
+    def direct():
+        """Can action commands be run directly rather than through the dispatcher? Only if the dispatcher has no limits to enforce and commands run locally"""
+        return settings.ACTION_DIRECT and not settings.REMOTEHOST and not (settings.DISPATCHER_MAXRESMEM or settings.DISPATCHER_MAXTIME or settings.DISPATCHER_MAXCPUTIME or settings.DISPATCHER_MAXVIRTMEM)
+
+    @staticmethod
+    def argv(action):
+        """Returns the command of the action split into arguments, or None if it needs a shell. Commands are split only once."""
+        if action.id not in ACTIONARGV:
+            ACTIONARGV[action.id] = clam.common.directexec.tokenize(action.command)
+        return ACTIONARGV[action.id]
+
+    @staticmethod
+    def stream(action, process, cleanup):
+        """Returns a response that streams the output of the command while it runs. The status is decided on the first output: if the process ends before producing any, its return code is mapped as usual, otherwise the status is 200"""
+        stderrdata = []
+        def logstderr():
+            for line in iter(process.stderr.readline, b''):
+                line = line.decode('utf-8','replace')
+                stderrdata.append(line)
+                printlog("    action " + action.id + " stderr: " + line.rstrip())
+        stderrthread = threading.Thread(target=logstderr)
+        stderrthread.daemon = True
+        stderrthread.start()
+
+        finished = threading.Lock()
+        def finish(kill=False):
+            """Waits for the process and cleans up, once (called when the output ends as well as when the response is closed). With ``kill``, a process that still runs is killed: the client went away."""
+            if not finished.acquire(False):
+                return
+            if kill and process.poll() is None:
+                process.kill()
+            process.wait()
+            stderrthread.join()
+            printlog("Action process finished with code " + str(process.returncode) )
+            cleanup()
+
+        printlog("Streaming output of action process (pid " + str(process.pid) + ")" )
+        first = os.read(process.stdout.fileno(), ActionHandler.STREAMCHUNKSIZE)
+        if not first:
+            finish()
+            return ActionHandler.result(action, process.returncode, "", "".join(stderrdata))
+
+        def generate():
+            complete = False
+            try:
+                chunk = first
+                while chunk:
+                    yield chunk
+                    chunk = os.read(process.stdout.fileno(), ActionHandler.STREAMCHUNKSIZE)
+                complete = True
+            finally:
+                finish(kill=not complete)
+        response = flask.Response(generate(), 200)
+        response.call_on_close(lambda: finish(kill=True)) #if the client went away before the output was pulled at all, the generator never ran
+        return withheaders(response, action.mimetype, {'allow_origin': settings.ALLOW_ORIGIN})
+
+    @staticmethod
+    def result(action, returncode, stdoutdata, stderrdata):
+        """Returns the response for a finished action command"""
+        if returncode in action.returncodes200:
+            return withheaders(flask.make_response(stdoutdata,200),action.mimetype, {'allow_origin': settings.ALLOW_ORIGIN}) #200
+        elif returncode in action.returncodes403:
+            return withheaders(flask.make_response(stdoutdata,403), action.mimetype, {'allow_origin': settings.ALLOW_ORIGIN})
+        elif returncode in action.returncodes404:
+            return withheaders(flask.make_response(stdoutdata, 404), action.mimetype, {'allow_origin': settings.ALLOW_ORIGIN})
+        else:
+            return withheaders(flask.make_response("Process for action " +  action.id + " failed\n" + stderrdata,500),headers={'allow_origin': settings.ALLOW_ORIGIN})
+
+    @staticmethod
+    def jobdir(user, jobid=""):
+        """Directory of a background action job, it is treated as a project directory by the dispatcher"""
+        return settings.ROOT + "actionjobs/" + user + '/' + (jobid + '/' if jobid else '')
+
+    @staticmethod
+    def joburl(action, jobid):
+        return getrooturl() + '/actions/' + action.id + '/jobs/' + jobid
+
+    @staticmethod
+    def submit(action, collectedparams, user, oauth_access_token):
+        """Queue the command of a background action as a job, returns 202 with the URL of the job"""
+        ActionHandler.expirejobs()
+        jobid = "%032x" % random.getrandbits(128)
+        jobdir = ActionHandler.jobdir(user, jobid)
+        os.makedirs(jobdir + 'tmp')
+
+        cmd = action.command
+        parameters = ""
+        for flag, value, paramid in collectedparams:
+            if sys.version[0] == '2':
+                if isinstance(value, str):
+                    value = unicode(value,'utf-8') #pylint: disable=undefined-variable
+            elif not isinstance(value, str):
+                value = str(value)
+            if value:
+                try:
+                    if cmd.find('$' + paramid + '$') != -1:
+                        cmd = cmd.replace('$' + paramid + '$', clam.common.data.shellsafe(value,'"'))
+                    else:
+                        if parameters: parameters += " "
+                        if flag: parameters += flag + " "
+                        parameters += clam.common.data.shellsafe(value,'"')
+                except ValueError:
+                    shutil.rmtree(jobdir)
+                    return withheaders(flask.make_response("Parameter " + paramid + " has an invalid value...",403),headers={'allow_origin': settings.ALLOW_ORIGIN})
+
+        #the job directory has a temporary directory that the dispatcher cleans up, a custom one is removed along with the job
+        customtmpdir = None
+        if action.tmpdir is True or cmd.find('$TMPDIRECTORY') != -1:
+            cwd = jobdir + 'tmp'
+        elif action.tmpdir:
+            customtmpdir = cwd = action.tmpdir
+            try:
+                os.mkdir(customtmpdir)
+            except OSError:
+                shutil.rmtree(jobdir)
+                return withheaders(flask.make_response("Unable to create temporary action directory",500),headers={'allow_origin': settings.ALLOW_ORIGIN})
+        else:
+            cwd = settings.ROOT + "projects/" + user
+            if not os.path.isdir(cwd):
+                os.makedirs(cwd)
+
+        cmd = cmd.replace('$PARAMETERS', parameters)
+        cmd = cmd.replace('$TMPDIRECTORY', jobdir + 'tmp')
+        cmd = cmd.replace('$USERNAME',user if user else "anonymous")
+        cmd = cmd.replace('$OAUTH_ACCESS_TOKEN',oauth_access_token if oauth_access_token else "")
+        #the dispatcher runs commands in the project (job) directory, the command runs where it would for a normal action; its output is the result
+        cmd = "cd " + clam.common.data.shellsafe(cwd,'"') + " && " + cmd + " > " + jobdir + "stdout"
+        cmd = clam.common.data.escapeshelloperators(cmd)
+
+        with io.open(jobdir + 'job.json','w',encoding='utf-8') as f:
+            f.write(json.dumps({'action': action.id, 'user': user, 'submitted': time.time(), 'tmpdir': customtmpdir}))
+
+        try:
+            spec = {'projectdir': jobdir, 'args': shlex.split(cmd), 'errorlog': jobdir + 'stderr'}
+        except ValueError:
+            spec = None
+        cmd = settings.DISPATCHER + ' ' + getpythonpath() + ' ' + settingsmodule + ' ' + jobdir + ' ' + cmd + " 2> " + jobdir + "stderr"
+        if settings.REMOTEHOST:
+            if settings.REMOTEUSER:
+                cmd = "ssh -o NumberOfPasswordPrompts=0 " + settings.REMOTEUSER + "@" + settings.REMOTEHOST + " " + cmd
+            else:
+                cmd = "ssh -o NumberOfPasswordPrompts=0 " + settings.REMOTEHOST + " " + cmd
+        printlog("Queueing dispatcher " +  settings.DISPATCHER + " for background action " + action.id + " with " + action.command + ": " + repr(cmd) + " ..." )
+        try:
+            jobqueue().submit(jobdir, cmd, settings.CLAMDIR, user, 'action:' + action.id, 1, 0, spec)
+            schedule()
+        except (IOError, OSError) as e:
+            printlog("Unable to queue or launch process: " + str(e))
+            return withheaders(flask.make_response("Unable to launch process",500),headers={'allow_origin': settings.ALLOW_ORIGIN})
+        url = ActionHandler.joburl(action, jobid)
+        return withheaders(flask.make_response(url + "\n",202), "text/plain", {'allow_origin': settings.ALLOW_ORIGIN, 'Location': url})
+
+    @staticmethod
+    def expirejobs():
+        """Remove action jobs whose result has been kept for longer than ACTIONJOB_TTL"""
+        now = time.time()
+        for jobdir in glob.glob(ActionHandler.jobdir('*', '*')):
+            try:
+                if now - os.path.getmtime(jobdir + '.done') > settings.ACTIONJOB_TTL:
+                    ActionHandler.removejob(jobdir)
+            except OSError: #not done yet, or removed concurrently
+                pass
+
+    @staticmethod
+    def removejob(jobdir):
+        try:
+            with io.open(jobdir + 'job.json','r',encoding='utf-8') as f:
+                customtmpdir = json.load(f).get('tmpdir')
+            if customtmpdir and os.path.isdir(customtmpdir):
+                shutil.rmtree(customtmpdir)
+        except (IOError, OSError, ValueError):
+            pass
+        shutil.rmtree(jobdir, ignore_errors=True)
+
+    @staticmethod
+    def waitjob(jobdir, timeout):
+        """Waits at most ``timeout`` seconds for a background action job to be done, returns False on time out. A job whose dispatcher is gone without finishing it is marked as done (failed)."""
+        deadline = time.time() + timeout
+        with statuswatcher().watch(jobdir) as watch:
+            while True:
+                token = watch.token() #before checking, so no change is missed
+                if os.path.exists(jobdir + '.done'):
+                    return True
+                if not os.path.exists(jobdir + '.queued'):
+                    try:
+                        with open(jobdir + '.pid') as f:
+                            pid = int(f.read(64))
+                    except (IOError, OSError, ValueError):
+                        pid = 0 #not started yet, or finished just now
+                    try:
+                        if pid: os.kill(pid, 0) #raises error if pid doesn't exist
+                    except OSError:
+                        if not os.path.exists(jobdir + '.done'): #it may have just finished
+                            clam.common.status.writedone(jobdir, 1)
+                        return True
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                watch.wait(token, min(remaining, Project.STATUSEVENTINTERVAL)) #a dispatcher that dies does not change the directory, check it now and then
+
+    @staticmethod
+    def job(actionid, jobid, credentials=None):
+        """Get the result of a background action job. Returns 202 as long as the job is queued or running, an optional ``wait`` parameter (in seconds) holds the request until the job is done (long-polling)"""
+        try:
+            action = ActionHandler.find_action(actionid, 'GET')
+        except: #pylint: disable=bare-except
+            return withheaders(flask.make_response("Action does not exist",404),headers={'allow_origin': settings.ALLOW_ORIGIN})
+        if action.allowanonymous:
+            user = "anonymous"
+        else:
+            user, _ = parsecredentials(credentials)
+        jobdir = ActionHandler.jobdir(user, jobid)
+        if not jobid.isalnum() or not os.path.exists(jobdir + 'job.json'):
+            return withheaders(flask.make_response("Action job does not exist (or has expired)",404),headers={'allow_origin': settings.ALLOW_ORIGIN})
+
+        if flask.request.method == 'DELETE':
+            #abort the job if it's still in progress, and remove it
+            if not (os.path.exists(jobdir + '.queued') and jobqueue().remove(jobdir)) and not ActionHandler.waitjob(jobdir, 0):
+                #launched (possibly just now), the dispatcher has to stop before its directory can be removed
+                signalabort(jobdir)
+                if not ActionHandler.waitjob(jobdir, settings.ACTIONJOB_MAXWAIT):
+                    return withheaders(flask.make_response("Aborting",202),"text/plain", {'allow_origin': settings.ALLOW_ORIGIN, 'Location': ActionHandler.joburl(action, jobid), 'Retry-After': '1'})
+            ActionHandler.removejob(jobdir)
+            return withheaders(flask.make_response("Deleted",200),"text/plain",headers={'allow_origin': settings.ALLOW_ORIGIN})
+
+        try:
+            wait = min(float(flask.request.values.get('wait',0)), settings.ACTIONJOB_MAXWAIT)
+        except ValueError:
+            wait = 0
+        if os.path.exists(jobdir + '.queued'):
+            schedule()
+        if not ActionHandler.waitjob(jobdir, wait):
+            if os.path.exists(jobdir + '.queued'):
+                position, queuelength = jobqueue().position(jobdir)
+                msg = "Queued at position " + str(position) + " of " + str(queuelength)
+            else:
+                msg = "Running"
+            return withheaders(flask.make_response(msg,202),"text/plain", {'allow_origin': settings.ALLOW_ORIGIN, 'Location': ActionHandler.joburl(action, jobid), 'Retry-After': '1'})
+
+        with open(jobdir + '.done') as f:
+            returncode = min(int(f.read(1024) or 1), 127) #as the exit code of the dispatcher
+        stdoutdata = stderrdata = ""
+        if os.path.exists(jobdir + 'stdout'):
+            with io.open(jobdir + 'stdout','r',encoding='utf-8',errors='replace') as f:
+                stdoutdata = f.read()
+        if os.path.exists(jobdir + 'stderr'):
+            with io.open(jobdir + 'stderr','r',encoding='utf-8',errors='replace') as f:
+                stderrdata = f.read()
+        return ActionHandler.result(action, returncode, stdoutdata, stderrdata)
+
+    @staticmethod
+    def batch(actionid, credentials=None): #pylint: disable=too-many-return-statements
+        """Perform an action for a list of parameter sets (POST /actions/<actionid>/batch). The body is a JSON list of objects, or NDJSON with one object per line, each mapping parameter ids to values. The response is streamed as NDJSON, one line per parameter set in the same order, holding the index, status and result of each."""
+        try:
+            action = ActionHandler.find_action(actionid, 'POST')
+        except: #pylint: disable=bare-except
+            return withheaders(flask.make_response("Action does not exist",404),headers={'allow_origin': settings.ALLOW_ORIGIN})
+        if action.allowanonymous:
+            user = "anonymous"
+            oauth_access_token = ""
+        else:
+            user, oauth_access_token = parsecredentials(credentials)
+        if action.background:
+            return withheaders(flask.make_response("Background actions can not be performed in batch",400),"text/plain", {'allow_origin': settings.ALLOW_ORIGIN})
+
+        body = flask.request.get_data(as_text=True).strip()
+        try:
+            if body.startswith('['):
+                items = json.loads(body)
+            else:
+                items = [ json.loads(line) for line in body.split('\n') if line.strip() ]
+        except ValueError as e:
+            return withheaders(flask.make_response("Invalid JSON: " + str(e),400),"text/plain", {'allow_origin': settings.ALLOW_ORIGIN})
+        if not isinstance(items, list) or not all( isinstance(item, dict) for item in items ):
+            return withheaders(flask.make_response("Expected a list of objects with parameter values",400),"text/plain", {'allow_origin': settings.ALLOW_ORIGIN})
+        if len(items) > settings.ACTIONBATCH_MAXITEMS:
+            return withheaders(flask.make_response("Too many items in batch, the maximum is " + str(settings.ACTIONBATCH_MAXITEMS),413),"text/plain", {'allow_origin': settings.ALLOW_ORIGIN})
+
+        #validation is done one by one, the parameters of the action hold the value being validated
+        collected = []
+        for item in items:
+            try:
+                collected.append(ActionHandler.collect_parameters(action, item))
+            except clam.common.data.ParameterError as e:
+                collected.append(e)
+            except (TypeError, ValueError) as e:
+                collected.append(clam.common.data.ParameterError(str(e)))
+        printlog("Performing action " + action.id + " for a batch of " + str(len(items)) + " items")
+
+        app = flask.current_app._get_current_object() #pylint: disable=protected-access
+        def runitem(collectedparams):
+            if isinstance(collectedparams, clam.common.data.ParameterError):
+                return 403, str(collectedparams)
+            with app.app_context():
+                try:
+                    if action.cache:
+                        response = ActionHandler.docached(action, collectedparams, user, oauth_access_token)
+                    else:
+                        response = ActionHandler.perform(action, user, oauth_access_token, collectedparams)
+                except Exception as e: #pylint: disable=broad-except
+                    return 500, str(e)
+                return response.status_code, response.get_data(as_text=True)
+
+        def runbatch(chunk):
+            """Calls the batch function of the action for the valid items of the chunk at once"""
+            results = [ runitem(collectedparams) if isinstance(collectedparams, clam.common.data.ParameterError) else None for collectedparams in chunk ]
+            calls = [ tuple( x[1] for x in collectedparams ) for collectedparams in chunk if not isinstance(collectedparams, clam.common.data.ParameterError) ]
+            if calls:
+                try:
+                    batchresults = iter(action.function.function(calls))
+                    results = [ result if result is not None else (200, str(next(batchresults))) for result in results ]
+                except Exception as e: #pylint: disable=broad-except
+                    results = [ result if result is not None else (500, str(e)) for result in results ]
+            return results
+
+        def generate():
+            index = 0
+            if isinstance(action.function, clam.common.batching.Batcher) and not action.cache:
+                #the function has a batch hook, pass it the items in batches of its maximum size
+                for begin in range(0, len(collected), action.function.maxsize):
+                    for status, result in runbatch(collected[begin:begin+action.function.maxsize]):
+                        yield json.dumps({'index': index, 'status': status, 'result': result}) + "\n"
+                        index += 1
+            elif collected:
+                pool = multiprocessing.pool.ThreadPool(max(1, min(settings.ACTIONBATCH_PARALLEL, len(collected))))
+                try:
+                    for status, result in pool.imap(runitem, collected):
+                        yield json.dumps({'index': index, 'status': status, 'result': result}) + "\n"
+                        index += 1
+                finally:
+                    pool.terminate()
+
+        return withheaders(flask.Response(generate(), 200), "application/x-ndjson", {'allow_origin': settings.ALLOW_ORIGIN})
 
     @staticmethod
     def do_auth(actionid, method, credentials=None):
@@ -2296,6 +3219,179 @@ class ActionHandler(object):
         return ActionHandler.run(actionid, 'DELETE')
 
 
+def getpythonpath():
+    """Returns the python path for the dispatcher and worker pool, so they can import the settings module"""
+    pythonpath = ''
+    try:
+        pythonpath = ':'.join(settings.DISPATCHER_PYTHONPATH)
+    except AttributeError:
+        pass
+    if pythonpath:
+        return os.path.dirname(settings.__file__) + ':' + pythonpath
+    else:
+        return os.path.dirname(settings.__file__)
+
+def startworkerpool():
+    """Start the worker pool (clamworkerpool) if it is not running yet"""
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(settings.WORKER_SOCKET)
+        printlog("Worker pool already running on " + settings.WORKER_SOCKET)
+        return
+    except socket.error:
+        pass
+    finally:
+        s.close()
+    printlog("Starting worker pool with " + str(settings.WORKERS) + " worker(s) on " + settings.WORKER_SOCKET)
+    #detached from the service, the pool refuses to start if another one already holds the socket
+    subprocess.Popen([sys.executable, '-m', 'clam.clamworkerpool', getpythonpath(), settingsmodule], cwd=settings.CLAMDIR, preexec_fn=os.setsid, close_fds=True)
+
+def startlauncher():
+    """Start the resident launcher (clamlauncher), a launcher of an earlier instance of the service makes way for it"""
+    printlog("Starting launcher on " + settings.LAUNCHER_SOCKET)
+    subprocess.Popen([sys.executable, '-m', 'clam.clamlauncher', getpythonpath(), settingsmodule], cwd=settings.CLAMDIR, preexec_fn=os.setsid, close_fds=True)
+    #wait for it to become available, until then jobs are launched without it
+    begintime = time.time()
+    while time.time() - begintime < 5:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            s.connect(settings.LAUNCHER_SOCKET)
+            if os.stat(settings.LAUNCHER_SOCKET).st_mtime >= begintime - 1: #not the one being replaced
+                return True
+        except (socket.error, OSError):
+            pass
+        finally:
+            s.close()
+        time.sleep(0.05)
+    printlog("Launcher did not come up, jobs will be launched without it")
+    return False
+
+def actionpool():
+    """Returns the process pool for function actions with pool=True"""
+    global ACTIONPOOL #pylint: disable=global-statement
+    if ACTIONPOOL is None:
+        ACTIONPOOL = clam.common.actionpool.ActionPool(getpythonpath(), settingsmodule, settings.ACTIONPOOL_WORKERS, settings.ACTIONPOOL_MAXQUEUE)
+    return ACTIONPOOL
+
+def tmpdirpool():
+    """Returns the pool of temporary directories for actions, of this process"""
+    global TMPDIRPOOL #pylint: disable=global-statement
+    if TMPDIRPOOL is None or TMPDIRPOOL.pid != os.getpid():
+        TMPDIRPOOL = clam.common.directexec.TmpDirPool(settings.SESSIONDIR, settings.ACTION_TMPDIRPOOL)
+    return TMPDIRPOOL
+
+def actioncache(action):
+    """Returns the result cache of an action with cache=True"""
+    if action.id not in ACTIONCACHES:
+        if settings.ACTIONCACHEDIR:
+            directory = os.path.join(settings.ACTIONCACHEDIR, action.id)
+        else:
+            directory = None
+        ACTIONCACHES[action.id] = clam.common.actioncache.ActionCache(action.id, action.cachesize, action.cachettl, directory)
+    return ACTIONCACHES[action.id]
+
+def runcache():
+    """Returns the run cache"""
+    return clam.common.runcache.RunCache(settings.RUNCACHEDIR, settings.RUNCACHE_MAXSIZE)
+
+def statuslog(statusfile):
+    """Returns the parser of the status file, which keeps what it parsed so far"""
+    with STATUSLOGS_LOCK:
+        log = STATUSLOGS.pop(statusfile, None)
+        if log is None:
+            log = clam.common.statuslog.StatusLog(statusfile, settings.STATUSLOG_MAXENTRIES)
+        STATUSLOGS[statusfile] = log
+        while len(STATUSLOGS) > STATUSLOGS_MAX:
+            STATUSLOGS.popitem(last=False)
+    return log
+
+def servicetag():
+    """Returns an identifier of the service and its configuration, part of all entity tags"""
+    global SERVICETAG #pylint: disable=global-statement
+    if SERVICETAG is None:
+        try:
+            configmtime = os.path.getmtime(settings.__file__)
+        except (AttributeError, OSError):
+            configmtime = None
+        SERVICETAG = hashlib.md5(json.dumps([VERSION, settings.SYSTEM_ID, str(settings.SYSTEM_VERSION), configmtime]).encode('utf-8')).hexdigest()
+    return SERVICETAG
+
+def fragments():
+    """Returns the parts of responses that only depend on the configuration (clam.common.fragments), rendered once per process"""
+    global FRAGMENTS #pylint: disable=global-statement
+    if FRAGMENTS is None:
+        rendered = clam.common.fragments.Fragments(settings.PROFILES, settings.PARAMETERS, settings.INPUTSOURCES, settings.ACTIONS)
+        rendered.addstatic('data.js', interfacescript(), 'text/javascript')
+        try:
+            rendered.addstatic('style.css', stylesheet(), 'text/css')
+        except (IOError, OSError) as e:
+            warning("Unable to load style " + settings.STYLE + ": " + str(e))
+        FRAGMENTS = rendered
+    return FRAGMENTS
+
+def statuswatcher():
+    """Returns the watcher notifying changes of the status of projects (one per process)"""
+    global STATUSWATCHER #pylint: disable=global-statement
+    if STATUSWATCHER is None or STATUSWATCHER.pid != os.getpid():
+        #changes made on a remote host are not notified to us, poll instead
+        STATUSWATCHER = clam.common.statuswatch.Watcher(inotify=not settings.REMOTEHOST)
+    return STATUSWATCHER
+
+def reconcilediskusage():
+    """Determines the size of all projects anew by walking their directories, correcting any drift of the sizes kept up to date incrementally (clam.common.diskusage)"""
+    for userdir in glob.glob(settings.ROOT + "projects/*"):
+        if not os.path.isdir(userdir):
+            continue
+        user = os.path.basename(userdir)
+        projectindex = clam.common.projectindex.ProjectIndex(userdir)
+        for projectdir in glob.glob(userdir + '/*'):
+            if not os.path.isdir(projectdir):
+                continue
+            project = os.path.basename(projectdir)
+            try:
+                old, new = clam.common.diskusage.reconcile(projectdir)
+            except (IOError, OSError): #deleted in the meantime
+                continue
+            if old is None or round(old,2) != round(new,2):
+                if old is not None:
+                    printlog("Corrected disk usage of project " + project + " of user " + user + " from " + str(round(old,2)) + " MB to " + str(round(new,2)) + " MB")
+                if statestore() is not None:
+                    statestore().set(user, project, size=new)
+                projectindex.update(project, touch=False, size=new)
+
+def diskusagereconciler():
+    """Starts the thread that reconciles disk usage every DISKUSAGE_RECONCILE seconds, once per process. Of several processes (e.g. uWSGI workers), only one does each pass."""
+    global DISKUSAGE_RECONCILER #pylint: disable=global-statement
+    if settings.DISKUSAGE_RECONCILE and DISKUSAGE_RECONCILER != os.getpid():
+        DISKUSAGE_RECONCILER = os.getpid()
+        def run():
+            while True:
+                try:
+                    if clam.common.diskusage.due(settings.ROOT + '.reconciled', settings.DISKUSAGE_RECONCILE):
+                        printlog("Reconciling disk usage of all projects")
+                        reconcilediskusage()
+                except Exception as e: #pylint: disable=broad-except
+                    printlog("Unable to reconcile disk usage: " + str(e))
+                time.sleep(min(settings.DISKUSAGE_RECONCILE, 3600))
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+def statestore():
+    """Returns the project state store, or None if it is not enabled"""
+    global STATESTORE #pylint: disable=global-statement
+    if settings.STATEDB and STATESTORE is None:
+        STATESTORE = clam.common.statestore.StateStore(settings.STATEDB)
+    return STATESTORE
+
+def jobqueue():
+    """Returns the persistent job queue"""
+    return clam.common.jobqueue.JobQueue(settings.QUEUEDIR, settings.LAUNCHER_SOCKET if settings.LAUNCHER and not settings.REMOTEHOST else None, statestore())
+
+def schedule():
+    """Launch queued jobs as far as limits and system resources allow"""
+    return jobqueue().schedule(settings.MAXJOBS, settings.MAXCORES, settings.MAXMEMORY, sufficientresources, printlog)
+
 def sufficientresources():
     if settings.REQUIREMEMORY > 0:
         if not os.path.exists('/proc/meminfo'):
@@ -2425,6 +3521,8 @@ class CLAMService(object):
 
 
 
+        fragments() #render what is the same for all requests once, up front
+
         self.service = flask.Flask("clam")
         self.service.jinja_env.trim_blocks = True
         self.service.jinja_env.lstrip_blocks = True
@@ -2443,6 +3541,7 @@ class CLAMService(object):
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>', 'action_put2', self.auth.require_login(ActionHandler.PUT), methods=['PUT'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>', 'action_delete2', self.auth.require_login(ActionHandler.DELETE), methods=['DELETE'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/status', 'project_status_json2', Project.status_json, methods=['GET'] )
+        self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/status/events', 'project_status_events', Project.status_events, methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/upload', 'project_uploader2', uploader, methods=['POST'] ) #has it's own login mechanism
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>', 'project_get2', self.auth.require_login(Project.get), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>', 'project_start2', self.auth.require_login(Project.start), methods=['POST'] )
@@ -2463,6 +3562,8 @@ class CLAMService(object):
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>/', 'action_post', self.auth.require_login(ActionHandler.POST), methods=['POST'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>/', 'action_put', self.auth.require_login(ActionHandler.PUT), methods=['PUT'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>/', 'action_delete', self.auth.require_login(ActionHandler.DELETE), methods=['DELETE'] )
+        self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>/jobs/<jobid>', 'action_job', self.auth.require_login(ActionHandler.job), methods=['GET','DELETE'] )
+        self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/actions/<actionid>/batch', 'action_batch', self.auth.require_login(ActionHandler.batch), methods=['POST'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/output/zip/', 'project_download_zip', self.auth.require_login(Project.download_zip), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/output/gz/', 'project_download_targz', self.auth.require_login(Project.download_targz), methods=['GET'] )
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/output/bz2/', 'project_download_tarbz2', self.auth.require_login(Project.download_tarbz2), methods=['GET'] )
@@ -2482,6 +3583,20 @@ class CLAMService(object):
         self.service.add_url_rule(settings.STANDALONEURLPREFIX + '/<project>/', 'project_delete', self.auth.require_login(Project.delete), methods=['DELETE'] )
 
 
+        if settings.WORKER_ENTRYPOINT:
+            startworkerpool()
+        if settings.LAUNCHER and not settings.REMOTEHOST:
+            startlauncher()
+
+        if statestore() is not None and statestore().empty() and os.path.isdir(settings.ROOT + "projects"):
+            printlog("Importing the state of existing projects into the state store " + settings.STATEDB)
+            printlog("Imported " + str(statestore().importall(settings.ROOT + "projects/")) + " project(s)")
+
+        #resume any jobs still queued from a previous run
+        launched = schedule()
+        if launched:
+            printlog("Launched " + str(len(launched)) + " job(s) that were still queued")
+
         self.mode = mode
         if self.mode != 'wsgi' and (settings.OAUTH or settings.PREAUTHHEADER or settings.BASICAUTH):
             warning("*** YOU ARE RUNNING THE DEVELOPMENT SERVER, THIS IS INSECURE WITH THE CONFIGURED AUTHENTICATION METHOD ***")
@@ -2576,6 +3691,83 @@ def set_defaults():
             settings.MINDISKSPACE = 0
     if not 'DISK' in settingkeys:
         settings.DISK = None
+    if not 'QUEUEDIR' in settingkeys:
+        settings.QUEUEDIR = settings.ROOT + 'queue/'
+    if not 'MAXJOBS' in settingkeys:
+        settings.MAXJOBS = 0 #unlimited
+    if not 'MAXCORES' in settingkeys:
+        settings.MAXCORES = 0 #unlimited
+    if not 'MAXMEMORY' in settingkeys:
+        settings.MAXMEMORY = 0 #unlimited
+    if not 'WORKER_ENTRYPOINT' in settingkeys:
+        settings.WORKER_ENTRYPOINT = None
+    if not 'WORKER_PRELOAD' in settingkeys:
+        settings.WORKER_PRELOAD = None
+    if not 'WORKERS' in settingkeys:
+        settings.WORKERS = 1
+    if not 'WORKER_SOCKET' in settingkeys:
+        settings.WORKER_SOCKET = settings.ROOT + 'workers.sock'
+    if not 'LAUNCHER' in settingkeys:
+        settings.LAUNCHER = True
+    if not 'FANOUT_WIDTH' in settingkeys:
+        try:
+            settings.FANOUT_WIDTH = multiprocessing.cpu_count()
+        except NotImplementedError:
+            settings.FANOUT_WIDTH = 1
+    if not 'RUNCACHE' in settingkeys:
+        settings.RUNCACHE = False
+    if not 'RUNCACHEDIR' in settingkeys:
+        settings.RUNCACHEDIR = settings.ROOT + 'runcache/'
+    if not 'RUNCACHE_MAXSIZE' in settingkeys:
+        settings.RUNCACHE_MAXSIZE = 1024 #MB
+    if not 'RESOURCELOG' in settingkeys:
+        settings.RESOURCELOG = settings.ROOT + 'resources.log'
+    if not 'RESOURCELOG_WINDOW' in settingkeys:
+        settings.RESOURCELOG_WINDOW = 1000 #number of most recent runs aggregated on the administrative interface
+    if not 'ACTIONJOB_TTL' in settingkeys:
+        settings.ACTIONJOB_TTL = 3600 #seconds the result of a background action is kept
+    if not 'ACTIONJOB_MAXWAIT' in settingkeys:
+        settings.ACTIONJOB_MAXWAIT = 60 #maximum time (seconds) a request for the result of a background action is held
+    if not 'ACTIONPOOL_WORKERS' in settingkeys:
+        settings.ACTIONPOOL_WORKERS = multiprocessing.cpu_count() #worker processes for function actions with pool=True
+    if not 'ACTIONPOOL_MAXQUEUE' in settingkeys:
+        settings.ACTIONPOOL_MAXQUEUE = 16 #calls that may wait for a free worker, further calls get 503
+    if not 'ACTIONPOOL_RETRYAFTER' in settingkeys:
+        settings.ACTIONPOOL_RETRYAFTER = 5 #seconds, Retry-After sent along with 503 when the pool is full
+    if not 'STATUS_MAXWAIT' in settingkeys:
+        settings.STATUS_MAXWAIT = 30 #maximum time (seconds) a request for the status of a project is held waiting for it to change (?since=)
+    if not 'STATUSLOG_MAXENTRIES' in settingkeys:
+        settings.STATUSLOG_MAXENTRIES = 1000 #number of most recent status messages reported, 0 for all
+    if not 'LISTLIMIT' in settingkeys:
+        settings.LISTLIMIT = 0 #maximum number of projects, input files and output files listed in a response, clients request the others page by page (?offset=&limit=), 0 for no maximum
+    if not 'STATIC_MAXAGE' in settingkeys:
+        settings.STATIC_MAXAGE = 3600 #seconds clients may cache data.js and style.css without asking again (they are served with entity tags)
+    if not 'DISKUSAGE_RECONCILE' in settingkeys:
+        settings.DISKUSAGE_RECONCILE = 86400 #interval (seconds) at which the disk usage of all projects is determined anew to correct any drift, 0 to disable
+    if not 'STATEDB' in settingkeys:
+        settings.STATEDB = None #SQLite database holding the state of all projects, None to keep the state in flag files only
+    if not 'ACTIONBATCH_PARALLEL' in settingkeys:
+        settings.ACTIONBATCH_PARALLEL = multiprocessing.cpu_count() #number of items of a batch request performed at the same time
+    if not 'ACTIONBATCH_MAXITEMS' in settingkeys:
+        settings.ACTIONBATCH_MAXITEMS = 10000 #maximum number of items in a batch request
+    if not 'ACTION_DIRECT' in settingkeys:
+        settings.ACTION_DIRECT = True #run action commands without the dispatcher when it has no limits to enforce
+    if not 'ACTION_TMPDIRPOOL' in settingkeys:
+        settings.ACTION_TMPDIRPOOL = 8 #number of temporary directories for actions kept ready per process
+    if not 'DISPATCHER_MAXRESMEM' in settingkeys:
+        settings.DISPATCHER_MAXRESMEM = 0
+    if not 'DISPATCHER_MAXTIME' in settingkeys:
+        settings.DISPATCHER_MAXTIME = 0
+    if not 'DISPATCHER_MAXCPUTIME' in settingkeys:
+        settings.DISPATCHER_MAXCPUTIME = 0
+    if not 'DISPATCHER_MAXVIRTMEM' in settingkeys:
+        settings.DISPATCHER_MAXVIRTMEM = 0
+    if not 'ACTIONCACHEDIR' in settingkeys:
+        settings.ACTIONCACHEDIR = None #directory for cached action results shared between processes, None to cache in memory only
+    if not 'INCREMENTAL' in settingkeys:
+        settings.INCREMENTAL = False
+    if not 'LAUNCHER_SOCKET' in settingkeys:
+        settings.LAUNCHER_SOCKET = settings.ROOT + 'launcher.sock'
     if not 'STYLE' in settingkeys:
         settings.STYLE = 'classic'
     if not 'CLAMDIR' in settingkeys:
@@ -2603,6 +3795,9 @@ def set_defaults():
         settings.REMOTEHOST = None
     elif not 'REMOTEUSER' in settingkeys:
         settings.REMOTEUSER = None
+    if settings.STATEDB and settings.REMOTEHOST:
+        warning("The state store (STATEDB) can not be used with REMOTEHOST, the dispatcher on the remote host can not update it. Disabling the state store.")
+        settings.STATEDB = None
     if not 'PREAUTHHEADER' in settingkeys:
         settings.PREAUTHHEADER = None     #The name of the header field containing the pre-authenticated username
     elif isinstance(settings.PREAUTHHEADER,str):
@@ -2665,6 +3860,8 @@ def set_defaults():
 
     if not 'ACTIONS' in settingkeys:
         settings.ACTIONS = []
+    elif not clam.common.actionpool.AVAILABLE and any( action.pool for action in settings.ACTIONS ):
+        warning("Process pools are not available (install the futures package on Python 2), actions with pool=True will be called in the request thread")
 
     if not 'SESSIONDIR' in settingkeys:
         settings.SESSIONDIR = os.path.join(settings.ROOT,'sessions')
@@ -2697,6 +3894,10 @@ def test_dirs():
                     warning("\tMoving " + d + " to " + settings.ROOT + 'projects/anonymous/' + os.path.basename(d))
                     shutil.move(d, settings.ROOT + 'projects/anonymous/' + os.path.basename(d))
 
+    if not os.path.isdir(settings.QUEUEDIR):
+        warning("Queue directory does not exist yet, creating...")
+        os.makedirs(settings.QUEUEDIR)
+
     if not os.path.isdir(settings.SESSIONDIR):
         warning("Session directory does not exist yet, creating...")
         os.makedirs(settings.SESSIONDIR)
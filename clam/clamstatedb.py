@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- CLAM State Store Import --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""Imports the state of all existing projects of a webservice into its state store (``STATEDB``, see clam.common.statestore), from the flag files in the project directories. Projects that no longer exist are removed from the store.
+
+The webservice does this by itself when it starts with an empty state store; run this tool to bring the store up to date with the project directories again, e.g. after projects were moved or restored from a backup while the webservice was not running."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import sys
+import os
+
+sys.path.append(sys.path[0] + '/..')
+
+import clam.clamdispatcher #pylint: disable=wrong-import-position
+import clam.common.statestore #pylint: disable=wrong-import-position
+
+def main():
+    if len(sys.argv) < 2:
+        print("[CLAM State Store] ERROR: Invalid syntax, use clamstatedb [pythonpath] settingsmodule", file=sys.stderr)
+        return 1
+
+    offset = 0
+    if '/' in sys.argv[1]:
+        for path in sys.argv[1].split(':'):
+            sys.path.append(path)
+        offset = 1
+    settingsmodule = sys.argv[1+offset]
+
+    try:
+        settings = clam.clamdispatcher.loadsettings(settingsmodule)
+    except ImportError as e:
+        print("[CLAM State Store] FATAL ERROR: Unable to import settings module, settingsmodule is " + settingsmodule + ", error: " + str(e), file=sys.stderr)
+        return 1
+    if not settings.STATEDB:
+        print("[CLAM State Store] ERROR: No state store configured (STATEDB) in " + settingsmodule, file=sys.stderr)
+        return 1
+
+    projectsdir = os.path.join(settings.ROOT, 'projects') + '/'
+    store = clam.common.statestore.StateStore(settings.STATEDB)
+    if os.path.isdir(projectsdir):
+        count = store.importall(projectsdir, lambda msg: print("[CLAM State Store] " + msg, file=sys.stderr))
+    else:
+        count = 0
+    print("[CLAM State Store] Imported " + str(count) + " project(s) into " + settings.STATEDB, file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- CLAM Worker Pool --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""A pool of long-lived worker processes that run projects by calling a Python entry point, rather than by executing a wrapper script.
+
+The service configuration registers the entry point as ``WORKER_ENTRYPOINT`` (a function taking the CLAMData instance, the path to the status file and the path to the output directory) and optionally a ``WORKER_PRELOAD`` hook. The preload hook is called once in the master process, which then forks ``WORKERS`` workers, so expensive resources such as models stay loaded in memory and are shared between workers. A worker that dies or is killed (on abort or when exceeding limits) is replaced by a fresh fork of the master.
+
+The dispatcher submits jobs over a unix socket (``WORKER_SOCKET``) and supervises them as usual: abort and limits are enforced by the dispatcher by signalling the worker's process group. The webservice starts the pool automatically; only one pool runs per socket."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import sys
+import os
+import io
+import json
+import time
+import datetime
+import socket
+import select
+import signal
+import fcntl
+import importlib
+import traceback
+import array
+from collections import deque
+
+sys.path.append(sys.path[0] + '/..')
+
+import clam.common.data #pylint: disable=wrong-import-position
+
+
+def log(msg):
+    print("[CLAM Worker Pool] " + msg + " (" + datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S') + ")", file=sys.stderr)
+    sys.stderr.flush()
+
+#Passing file descriptors over unix sockets requires sendmsg/recvmsg (Python 3.3+)
+FDPASSING = hasattr(socket.socket, 'sendmsg')
+
+def send(sock, message, fd=None):
+    """Send a message (dictionary) as a line of JSON, optionally passing along a file descriptor"""
+    data = json.dumps(message).encode('utf-8') + b"\n"
+    if fd is not None and FDPASSING:
+        sock.sendmsg([data], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', [fd]))])
+    else:
+        sock.sendall(data)
+
+class LineReader(object):
+    """Reads newline-delimited JSON messages from a socket. Messages with a true ``fd`` field get the file descriptor that was passed along with them"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b""
+        self.fds = []
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def recv(self):
+        if FDPASSING:
+            data, ancdata, _, _ = self.sock.recvmsg(65536, socket.CMSG_SPACE(array.array('i').itemsize * 4))
+            for level, msgtype, fddata in ancdata:
+                if level == socket.SOL_SOCKET and msgtype == socket.SCM_RIGHTS:
+                    fds = array.array('i')
+                    fds.frombytes(fddata[:len(fddata) - (len(fddata) % fds.itemsize)])
+                    self.fds += list(fds)
+            return data
+        return self.sock.recv(65536)
+
+    def parse(self, line):
+        message = json.loads(line.decode('utf-8'))
+        if message.get('fd'):
+            message['fd'] = self.fds.pop(0) if self.fds else None
+        return message
+
+    def read(self):
+        """Reads whatever is available (call when the socket is readable). Returns a list of messages, or None on end-of-file"""
+        try:
+            data = self.recv()
+        except socket.error:
+            data = b""
+        if not data:
+            return None
+        self.buffer += data
+        messages = []
+        while b"\n" in self.buffer:
+            line, self.buffer = self.buffer.split(b"\n",1)
+            if line.strip():
+                messages.append(self.parse(line))
+        return messages
+
+    def readmessage(self):
+        """Blocking read of a single message, returns None on end-of-file"""
+        while b"\n" not in self.buffer:
+            data = self.recv()
+            if not data:
+                return None
+            self.buffer += data
+        line, self.buffer = self.buffer.split(b"\n",1)
+        return self.parse(line)
+
+
+def runjob(job, entrypoint):
+    """Run a single job in the worker, returns the exit code"""
+    projectdir = job['projectdir']
+    sys.stdout.flush()
+    sys.stderr.flush()
+    savedstderr = os.dup(2)
+    savedcwd = os.getcwd()
+    try:
+        #like for commands, the error output of the job goes to the error output of the dispatcher (i.e. the error log)
+        if job.get('fd') is not None:
+            errorlog = job['fd']
+        else:
+            errorlog = os.open(os.path.join(projectdir, 'output', 'error.log'), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        os.dup2(errorlog, 2)
+        os.close(errorlog)
+        os.chdir(projectdir)
+        try:
+            clamdata = clam.common.data.getclamdata(os.path.join(projectdir, 'clam.xml'))
+            entrypoint(clamdata, os.path.join(projectdir, '.status'), os.path.join(projectdir, 'output') + '/')
+            exitcode = 0
+        except SystemExit as e:
+            if e.code is None:
+                exitcode = 0
+            elif isinstance(e.code, int):
+                exitcode = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                exitcode = 1
+        except Exception: #pylint: disable=broad-except
+            traceback.print_exc()
+            exitcode = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(savedstderr, 2)
+        os.close(savedstderr)
+        os.chdir(savedcwd)
+    return exitcode
+
+def workerloop(sock, entrypoint):
+    """Main loop of a worker process: receive jobs from the master, run them, report the exit code"""
+    reader = LineReader(sock)
+    while True:
+        job = reader.readmessage()
+        if job is None: #master is gone
+            break
+        send(sock, {'exitcode': runjob(job, entrypoint)})
+
+
+class Worker(object):
+    """A worker process as seen from the master"""
+
+    def __init__(self, entrypoint, sockets):
+        mastersock, workersock = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            #worker: own process group so the dispatcher can signal it and its subprocesses at once
+            try:
+                os.setsid()
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                for s in sockets:
+                    s.close()
+                mastersock.close()
+                workerloop(workersock, entrypoint)
+            except Exception: #pylint: disable=broad-except
+                traceback.print_exc()
+            finally:
+                os._exit(0) #pylint: disable=protected-access
+        workersock.close()
+        self.pid = pid
+        self.sock = mastersock
+        self.reader = LineReader(mastersock)
+        self.client = None #the dispatcher connection of the job the worker is running, if any
+
+    def fileno(self):
+        return self.sock.fileno()
+
+
+class WorkerPool(object):
+    def __init__(self, socketpath, size, entrypoint):
+        self.socketpath = socketpath
+        self.size = size
+        self.entrypoint = entrypoint
+        self.workers = []
+        self.clients = {} #socket file descriptor -> LineReader for dispatcher connections
+        self.waiting = deque() #(client, job) tuples waiting for a free worker
+
+        if os.path.exists(socketpath):
+            os.unlink(socketpath)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(socketpath)
+        os.chmod(socketpath, 0o660)
+        self.listener.listen(64)
+
+    def spawn(self):
+        sockets = [self.listener] + [ w.sock for w in self.workers ] + [ c.sock for c in self.clients.values() ]
+        worker = Worker(self.entrypoint, sockets)
+        log("Started worker with pid " + str(worker.pid))
+        self.workers.append(worker)
+        return worker
+
+    def assign(self):
+        """Hand waiting jobs to idle workers"""
+        for worker in self.workers:
+            if not self.waiting:
+                break
+            if worker.client is None:
+                client, job = self.waiting.popleft()
+                fd = job.get('fd')
+                try:
+                    send(worker.sock, dict(job, fd=fd is not None), fd)
+                    send(client.sock, {'pid': worker.pid})
+                except socket.error:
+                    continue
+                finally:
+                    if fd is not None:
+                        os.close(fd) #the worker has its own copy now
+                worker.client = client
+                log("Worker " + str(worker.pid) + " runs " + job['projectdir'])
+
+    def finish(self, worker, status):
+        """Report the wait status of a job to its dispatcher"""
+        if worker.client is not None:
+            try:
+                send(worker.client.sock, {'status': status})
+            except socket.error:
+                pass
+            self.dropclient(worker.client)
+            worker.client = None
+
+    def dropclient(self, client):
+        if client.sock.fileno() in self.clients:
+            del self.clients[client.sock.fileno()]
+        for c, job in self.waiting:
+            if c is client and job.get('fd') is not None:
+                os.close(job['fd'])
+        self.waiting = deque( (c, job) for c, job in self.waiting if c is not client )
+        client.sock.close()
+
+    def serve(self):
+        while len(self.workers) < self.size:
+            self.spawn()
+        log("Listening on " + self.socketpath + " with " + str(self.size) + " worker(s)")
+        while True:
+            readable, _, _ = select.select([self.listener] + self.workers + list(self.clients.values()), [], [])
+            for obj in readable:
+                if obj is self.listener:
+                    clientsock, _ = self.listener.accept()
+                    self.clients[clientsock.fileno()] = LineReader(clientsock)
+                elif isinstance(obj, Worker):
+                    worker = obj
+                    messages = worker.reader.read()
+                    if messages is None:
+                        #worker died (aborted or killed for exceeding limits), replace it
+                        _, status = os.waitpid(worker.pid, 0)
+                        log("Worker " + str(worker.pid) + " ended with status " + str(status))
+                        self.workers.remove(worker)
+                        worker.sock.close()
+                        self.finish(worker, status)
+                        self.spawn()
+                    else:
+                        for message in messages:
+                            self.finish(worker, (message['exitcode'] & 0xff) << 8) #encoded like a wait status
+                else:
+                    client = obj
+                    messages = client.read()
+                    if messages is None:
+                        #dispatcher is gone; if its job is still running there is nobody left to supervise it
+                        for worker in self.workers:
+                            if worker.client is client:
+                                log("Dispatcher for the job of worker " + str(worker.pid) + " disconnected, terminating worker")
+                                try:
+                                    os.killpg(worker.pid, signal.SIGKILL)
+                                except OSError: #the worker is gone already, it will be reaped
+                                    pass
+                                worker.client = None
+                        self.dropclient(client)
+                    else:
+                        for job in messages:
+                            self.waiting.append( (client, job) )
+            self.assign()
+
+    def close(self):
+        for worker in self.workers:
+            try:
+                os.killpg(worker.pid, signal.SIGTERM)
+            except OSError:
+                pass
+        self.listener.close()
+        if os.path.exists(self.socketpath):
+            os.unlink(self.socketpath)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("[CLAM Worker Pool] ERROR: Invalid syntax, use clamworkerpool [pythonpath] settingsmodule", file=sys.stderr)
+        return 1
+
+    offset = 0
+    if '/' in sys.argv[1]:
+        for path in sys.argv[1].split(':'):
+            sys.path.append(path)
+        offset = 1
+    settingsmodule = sys.argv[1+offset]
+
+    try:
+        settings = importlib.import_module(settingsmodule)
+    except ImportError as e:
+        print("[CLAM Worker Pool] FATAL ERROR: Unable to import settings module, settingsmodule is " + settingsmodule + ", error: " + str(e), file=sys.stderr)
+        return 1
+    settingkeys = dir(settings)
+    if not 'WORKER_ENTRYPOINT' in settingkeys or not settings.WORKER_ENTRYPOINT:
+        print("[CLAM Worker Pool] FATAL ERROR: No WORKER_ENTRYPOINT configured in " + settingsmodule, file=sys.stderr)
+        return 1
+    if 'CUSTOM_FORMATS' in settingkeys:
+        clam.common.data.CUSTOM_FORMATS = settings.CUSTOM_FORMATS
+    socketpath = settings.WORKER_SOCKET if 'WORKER_SOCKET' in settingkeys else os.path.join(settings.ROOT, 'workers.sock')
+    size = settings.WORKERS if 'WORKERS' in settingkeys else 1
+
+    #only one pool per socket
+    lockfile = io.open(socketpath + '.lock','a')
+    try:
+        fcntl.flock(lockfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError:
+        print("[CLAM Worker Pool] Another worker pool is already running for " + socketpath, file=sys.stderr)
+        return 0
+
+    if 'WORKER_PRELOAD' in settingkeys and settings.WORKER_PRELOAD:
+        log("Preloading...")
+        begintime = time.time()
+        settings.WORKER_PRELOAD()
+        log("Preloading done in " + str(round(time.time() - begintime,2)) + "s")
+
+    def shutdown(signum, frame): #pylint: disable=unused-argument
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    pool = WorkerPool(socketpath, size, settings.WORKER_ENTRYPOINT)
+    try:
+        pool.serve()
+    except (KeyboardInterrupt, SystemExit):
+        log("Shutting down")
+    finally:
+        pool.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -68,7 +68,7 @@ if data.status == clam.common.status.READY: #should always be the case, since we
 
     while data.status != clam.common.status.DONE:
         time.sleep(5) #wait 5 seconds
-        data = clamclient.get(project) #get status again
+        data = clamclient.get(project, include=('status','output')) #get status again (and the output files once done)
         print("STATUS: " + str(data.completion) + '% -- ' + data.statusmessage)
 
 
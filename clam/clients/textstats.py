@@ -113,7 +113,7 @@ if data.errors:
 #If everything went well, the system is now running, we simply wait until it is done and retrieve the status in the meantime
 while data.status != clam.common.status.DONE:
     time.sleep(5) #wait 5 seconds before polling status
-    data = clamclient.get(project) #get status again
+    data = clamclient.get(project, include=('status','output')) #get status again (and the output files once done)
     print("\tPROJECT IS RUNNING: " + str(data.completion) + '% -- ' + data.statusmessage)
 
 #Good, all is done! We should have some output...
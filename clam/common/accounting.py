@@ -0,0 +1,95 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Resource accounting --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""Accounting of the resources used by runs.
+
+The dispatcher measures the resources used by each run and stores them in the project directory (``.resources``), from where they are included in the CLAM XML, and appends them to a log (``RESOURCELOG``) from which the administrative interface shows aggregated figures.
+
+A record is a dictionary with the following keys:
+
+* ``walltime`` - Duration of the run in seconds
+* ``usertime``, ``systemtime`` - CPU time in seconds, of the whole process tree
+* ``maxrss`` - Peak resident memory in kB
+* ``readbytes``, ``writebytes`` - Bytes read from and written to storage
+* ``processes`` - Number of processes the run consisted of
+
+The log records additionally hold ``user``, ``project``, ``time`` (UNIX timestamp of the end of the run) and ``exitcode``."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import os
+import io
+import json
+import math
+from collections import deque
+
+#resource keys, in the order they are presented
+KEYS = ('walltime','usertime','systemtime','maxrss','readbytes','writebytes','processes')
+
+RESOURCEFILE = '.resources'
+
+def load(filename):
+    """Load the resources of a run, returns None if there are none"""
+    try:
+        with io.open(filename,'r',encoding='utf-8') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+def save(filename, record):
+    with io.open(filename,'w',encoding='utf-8') as f:
+        f.write(json.dumps(record))
+
+def log(filename, record):
+    """Append a record to the resource log, one JSON object per line. A single small write on a file opened for appending does not interleave with other writers."""
+    line = (json.dumps(record) + "\n").encode('utf-8')
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+def readlog(filename, limit=0):
+    """Read the records from the resource log, only the last ``limit`` ones if non-zero"""
+    records = deque(maxlen=limit or None)
+    try:
+        with io.open(filename,'r',encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError: #partially written line
+                    continue
+    except (IOError, OSError):
+        pass
+    return list(records)
+
+def percentile(values, p):
+    """Returns the p-th percentile (nearest rank) of a list of values"""
+    values = sorted(values)
+    if not values:
+        return 0
+    index = max(0, int(math.ceil(p / 100.0 * len(values))) - 1)
+    return values[min(index, len(values) - 1)]
+
+def aggregate(records):
+    """Aggregate resource records, returns a dictionary with the number of runs (``runs``, ``failed``) and for each resource a dictionary with ``mean``, ``p95`` and ``max``"""
+    summary = {'runs': len(records), 'failed': len([ record for record in records if record.get('exitcode') ])}
+    for key in KEYS:
+        values = [ record[key] for record in records if record.get(key) is not None ]
+        if values:
+            summary[key] = {'mean': sum(values) / len(values), 'p95': percentile(values, 95), 'max': max(values)}
+        else:
+            summary[key] = {'mean': 0, 'p95': 0, 'max': 0}
+    return summary
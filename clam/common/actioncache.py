@@ -0,0 +1,194 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Action result cache --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""Cache of the results of idempotent actions (``Action(cache=True)``).
+
+Results are keyed by the id of the action and its normalized parameter values. Each process keeps a least-recently-used cache in memory holding at most ``maxentries`` results, each valid for ``ttl`` seconds. If a directory is given, results are also stored on disk, one file ``<directory>/<key>`` per result, so processes serving the same webservice (e.g. uWSGI workers) share them. Hit/miss counters are then shared through ``<directory>/stats.json`` as well; they are written at most once per second."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import os
+import io
+import json
+import time
+import hashlib
+import fcntl
+import threading
+from collections import OrderedDict
+
+#counters in the statistics
+COUNTERS = ('hits','diskhits','misses','stores','expirations','evictions')
+
+def cachekey(actionid, parameters):
+    """Compute the cache key for a call of the action. ``parameters`` is a list of (id, value) tuples, the values as normalized by the parameter."""
+    hasher = hashlib.sha256()
+    hasher.update(actionid.encode('utf-8') + b"\0")
+    hasher.update(json.dumps(sorted([ (key, value) for key, value in parameters ], key=lambda x: x[0]), default=str).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+class ActionCache(object):
+    def __init__(self, actionid, maxentries=1000, ttl=3600, directory=None):
+        """``ttl`` is the time in seconds a result remains valid, 0 means forever"""
+        self.actionid = actionid
+        self.maxentries = maxentries
+        self.ttl = ttl
+        if directory and directory[-1] != '/':
+            directory += '/'
+        self.directory = directory
+        if directory and not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError: #may be created concurrently
+                if not os.path.isdir(directory):
+                    raise
+        #key => (expiry time, status code, content type, body)
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        #counters not yet written to disk (all counters if there is no directory)
+        self.counters = dict( (counter, 0) for counter in COUNTERS )
+        self.flushed = 0
+
+    def count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+        if self.directory and time.time() - self.flushed >= 1:
+            self.flush()
+
+    def flush(self):
+        """Add the counters of this process to the shared statistics on disk"""
+        with self.lock:
+            counters = self.counters
+            self.counters = dict( (counter, 0) for counter in COUNTERS )
+            self.flushed = time.time()
+        with open(self.directory + '.lock','a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                stats = self.readstats()
+                for counter, n in counters.items():
+                    stats[counter] = stats.get(counter,0) + n
+                with io.open(self.directory + 'stats.json.' + str(os.getpid()),'w',encoding='utf-8') as statsfile:
+                    statsfile.write(json.dumps(stats))
+                os.rename(self.directory + 'stats.json.' + str(os.getpid()), self.directory + 'stats.json')
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def readstats(self):
+        try:
+            with io.open(self.directory + 'stats.json','r',encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def get(self, key):
+        """Returns a (status code, content type, body) tuple for a cached result, or None on a miss"""
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if not entry[0] or entry[0] > now:
+                    self.memory.pop(key)
+                    self.memory[key] = entry #most recently used
+                else:
+                    del self.memory[key]
+                    entry = None
+        if entry is not None:
+            self.count('hits')
+            return entry[1:]
+        if self.directory:
+            entry = self.readentry(key, now)
+            if entry is not None:
+                self.remember(key, entry)
+                self.count('diskhits')
+                return entry[1:]
+        self.count('misses')
+        return None
+
+    def readentry(self, key, now):
+        try:
+            with open(self.directory + key,'rb') as f:
+                header = json.loads(f.readline().decode('utf-8'))
+                body = f.read()
+        except (IOError, OSError, ValueError):
+            return None
+        if header['expires'] and header['expires'] <= now:
+            try:
+                os.unlink(self.directory + key)
+            except OSError: #removed concurrently
+                pass
+            self.count('expirations')
+            return None
+        return (header['expires'], header['status'], header['contenttype'], body)
+
+    def remember(self, key, entry):
+        with self.lock:
+            self.memory[key] = entry
+            while len(self.memory) > self.maxentries:
+                self.memory.popitem(last=False)
+
+    def put(self, key, status, contenttype, body):
+        """Store a result in the cache"""
+        expires = time.time() + self.ttl if self.ttl else 0
+        self.remember(key, (expires, status, contenttype, body))
+        if self.directory:
+            tmpfile = self.directory + '.' + key + '.' + str(os.getpid()) + '.' + str(threading.current_thread().ident)
+            with open(tmpfile,'wb') as f:
+                f.write(json.dumps({'expires': expires, 'status': status, 'contenttype': contenttype}).encode('utf-8') + b"\n")
+                f.write(body)
+            os.rename(tmpfile, self.directory + key)
+            self.evict()
+        self.count('stores')
+
+    def entries(self):
+        """Returns a list of (key, last modified time) tuples of the results on disk"""
+        entries = []
+        for key in os.listdir(self.directory):
+            if key[0] != '.' and key != 'stats.json':
+                try:
+                    entries.append( (key, os.path.getmtime(self.directory + key)) )
+                except OSError: #removed concurrently
+                    pass
+        return entries
+
+    def evict(self):
+        """Remove the oldest results on disk until at most maxentries remain"""
+        entries = self.entries()
+        if len(entries) > self.maxentries:
+            entries.sort(key=lambda x: x[1])
+            for key, _ in entries[:len(entries) - self.maxentries]:
+                try:
+                    os.unlink(self.directory + key)
+                    self.count('evictions')
+                except OSError: #removed concurrently
+                    pass
+
+    def stats(self):
+        """Returns a dictionary with statistics: entries, maxentries, ttl, hits, diskhits, misses, stores, expirations, evictions, hitratio"""
+        if self.directory:
+            self.flush()
+            stats = self.readstats()
+            stats['entries'] = len(self.entries())
+        else:
+            with self.lock:
+                stats = dict(self.counters)
+                stats['entries'] = len(self.memory)
+        for counter in COUNTERS:
+            stats.setdefault(counter, 0)
+        stats['maxentries'] = self.maxentries
+        stats['ttl'] = self.ttl
+        hits = stats['hits'] + stats['diskhits']
+        lookups = hits + stats['misses']
+        stats['hitratio'] = round(hits / lookups, 3) if lookups else 0.0
+        return stats
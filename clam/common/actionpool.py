@@ -0,0 +1,123 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Process pool for function actions --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""Process pool for actions with a Python function (``Action(function=..., pool=True)``).
+
+Normally the function of an action is called in the thread that handles the request, where a CPU-heavy function holds the GIL and stalls all other requests. Pooled actions are called in a pool of worker processes instead. Each worker imports the service configuration once when it starts, and looks up the function of the action there, so functions need not be picklable (lambdas are fine); their arguments and return values have to be.
+
+The number of calls that may be pending (running or waiting for a worker) is limited; beyond that, calls are refused with ``PoolFull`` so the webservice can answer with 503 rather than queueing requests without bound."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import os
+import sys
+import threading
+import importlib
+
+try:
+    import concurrent.futures
+    import concurrent.futures.process
+except ImportError: #Python 2 without the futures backport
+    concurrent = None
+
+#process pools are available
+AVAILABLE = concurrent is not None
+
+#the service configuration, in a worker process
+settings = None
+
+
+class PoolFull(Exception):
+    """Raised when too many calls are pending already"""
+    pass
+
+class PoolTimeout(Exception):
+    """Raised when a call did not finish within its timeout"""
+    pass
+
+
+def initialize(pythonpath, settingsmodule):
+    """Initializes a worker process: imports the service configuration"""
+    global settings #pylint: disable=global-statement
+    for path in reversed(pythonpath.split(':')):
+        if path and path not in sys.path:
+            sys.path.insert(0, path)
+    settings = importlib.import_module(settingsmodule)
+
+def call(index, args, pythonpath, settingsmodule):
+    """Calls the function of the action with the given index in ACTIONS, in a worker process"""
+    if settings is None: #no initializer support (before Python 3.7)
+        initialize(pythonpath, settingsmodule)
+    return settings.ACTIONS[index].function(*args)
+
+
+class ActionPool(object):
+    def __init__(self, pythonpath, settingsmodule, workers, maxqueue):
+        self.pythonpath = pythonpath
+        self.settingsmodule = settingsmodule
+        self.workers = workers
+        #number of calls that may wait for a free worker
+        self.maxqueue = maxqueue
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pid = None
+        self.pending = 0
+
+    def getexecutor(self):
+        """Returns the executor, started lazily in the process that uses it (the webservice may have forked since)"""
+        if self.pid != os.getpid():
+            #forked, calls pending in the parent are not ours
+            self.pid = os.getpid()
+            self.pending = 0
+            self.executor = None
+        if self.executor is None:
+            if sys.version_info >= (3,7):
+                self.executor = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=initialize, initargs=(self.pythonpath, self.settingsmodule))
+            else:
+                self.executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+        return self.executor
+
+    def submit(self, index, args):
+        """Submits a call of the function of the action with the given index in ACTIONS, returns a future. Raises PoolFull if too many calls are pending"""
+        with self.lock:
+            executor = self.getexecutor()
+            if self.pending >= self.workers + self.maxqueue:
+                raise PoolFull()
+            future = executor.submit(call, index, args, self.pythonpath, self.settingsmodule)
+            future.executor = executor
+            self.pending += 1
+        future.add_done_callback(self.done)
+        return future
+
+    def done(self, future): #pylint: disable=unused-argument
+        with self.lock:
+            self.pending -= 1
+
+    def call(self, index, args, timeout=None):
+        """Calls the function of the action with the given index in ACTIONS in the pool and returns its result. Raises PoolFull if too many calls are pending, PoolTimeout if the call does not finish within timeout seconds. Exceptions raised by the function are raised again."""
+        future = self.submit(index, args)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            #a call that already started can not be interrupted, its worker stays busy (and the call counts as pending) until it finishes
+            future.cancel()
+            raise PoolTimeout()
+        except concurrent.futures.process.BrokenProcessPool:
+            #a worker died, start a fresh pool for the next call
+            with self.lock:
+                if self.executor is future.executor:
+                    self.executor.shutdown(wait=False)
+                    self.executor = None
+            raise
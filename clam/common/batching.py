@@ -0,0 +1,107 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Micro-batching of function actions --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""Micro-batching for actions with a batch-capable function (``Action(batchfunction=...)``).
+
+Concurrent calls to the action are collected into a single call of the batch function: a batch is closed as soon as it holds ``maxsize`` calls, or ``maxwait`` seconds after its first call arrived. The batch function receives a list with the arguments of each call (a list of tuples) and has to return a list with one result per call, in the same order. Calls are collected within a single process, so they have to be served by threads of the same process (e.g. a threaded WSGI server or uWSGI with several threads per worker)."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import os
+import sys
+import time
+import threading
+
+if sys.version < '3':
+    from Queue import Queue, Empty #pylint: disable=import-error
+else:
+    from queue import Queue, Empty #pylint: disable=import-error
+
+
+class BatchCall(object):
+    """A single call waiting for its result"""
+
+    def __init__(self, args):
+        self.args = args
+        self.result = None
+        self.exception = None
+        self.done = threading.Event()
+
+
+class Batcher(object):
+    """Callable that behaves like a single-call function, but passes the calls on to a batch function in batches"""
+
+    def __init__(self, function, maxsize=32, maxwait=0.01):
+        self.function = function
+        self.maxsize = maxsize
+        self.maxwait = maxwait
+        self.lock = threading.Lock()
+        self.queue = None
+        self.pid = None
+        #statistics
+        self.batches = 0
+        self.calls = 0
+
+    def __call__(self, *args):
+        self.start()
+        call = BatchCall(args)
+        self.queue.put(call)
+        call.done.wait()
+        if call.exception is not None:
+            raise call.exception #pylint: disable=raising-bad-type
+        return call.result
+
+    def start(self):
+        """Start the thread that runs the batches, if it isn't running in this process yet (the webservice may have forked since)"""
+        with self.lock:
+            if self.pid != os.getpid():
+                self.queue = Queue()
+                self.pid = os.getpid()
+                thread = threading.Thread(target=self.run, name="batcher")
+                thread.daemon = True
+                thread.start()
+
+    def collect(self):
+        """Blocks until a call arrives, then collects calls until the batch is full or the maximum waiting time has passed"""
+        batch = [ self.queue.get() ]
+        deadline = time.time() + self.maxwait
+        while len(batch) < self.maxsize:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    batch.append(self.queue.get(True, remaining))
+                else:
+                    batch.append(self.queue.get(False)) #take what's already waiting
+            except Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.collect()
+            try:
+                results = self.function([ call.args for call in batch ])
+                if len(results) != len(batch):
+                    raise ValueError("Batch function returned " + str(len(results)) + " results for " + str(len(batch)) + " calls")
+                for call, result in zip(batch, results):
+                    call.result = result
+            except Exception as e: #pylint: disable=broad-except
+                #the whole batch fails
+                for call in batch:
+                    call.exception = e
+            self.batches += 1
+            self.calls += len(batch)
+            for call in batch:
+                call.done.set()
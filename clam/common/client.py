@@ -20,6 +20,7 @@ from __future__ import print_function, unicode_literals, division, absolute_impo
 
 import os.path
 import sys
+import json
 import requests
 import certifi
 from requests_toolbelt import MultipartEncoder #pylint: disable=import-error
@@ -27,8 +28,10 @@ from lxml import etree as ElementTree
 if sys.version < '3':
     from StringIO import StringIO #pylint: disable=import-error,unused-import
     from io import IOBase
+    from urllib import urlencode #pylint: disable=import-error,no-name-in-module
 else:
     from io import StringIO, IOBase, BytesIO  #pylint: disable=import-error,unused-import
+    from urllib.parse import urlencode #pylint: disable=import-error,no-name-in-module
 
 import clam.common.status
 import clam.common.parameters
@@ -84,6 +87,7 @@ class CLAMClient:
             self.password = None
             self.initauth()
         self.loadmetadata = loadmetadata
+        self.etags = {} #(project, include, listing) => (entity tag, CLAMData) of the last response, for conditional requests
 
 
     def initauth(self):
@@ -124,10 +128,12 @@ class CLAMClient:
         params['verify'] = self.verify
         return params
 
-    def request(self, url='', method = 'GET', data = None, parse=True, encoding=None):
-        """Issue a HTTP request and parse CLAM XML response, this is a low-level function called by all of the higher-level communication methods in this class, use those instead"""
+    def request(self, url='', method = 'GET', data = None, parse=True, encoding=None, raw=False, headers=None):
+        """Issue a HTTP request and parse CLAM XML response, this is a low-level function called by all of the higher-level communication methods in this class, use those instead. With ``raw`` the response object is returned as is (after checking for errors). ``headers`` are extra request headers."""
 
         requestparams = self.initrequest(data)
+        if headers:
+            requestparams['headers'].update(headers)
 
 
         if method == 'POST':
@@ -172,12 +178,16 @@ class CLAMClient:
             raise clam.common.data.ServerError(r.text)
         elif r.status_code == 405:
             raise clam.common.data.ServerError("Server returned 405: Method not allowed for " + method + " on " + self.url + url)
-        elif r.status_code == 408:
+        elif r.status_code == 408 or r.status_code == 504:
             raise clam.common.data.TimeOut()
-        elif not (r.status_code >= 200 and r.status_code <= 299):
+        elif r.status_code == 503:
+            raise clam.common.data.ServerError("Service temporarily unavailable, retry after " + r.headers.get('Retry-After','a few') + " seconds: " + r.text)
+        elif not (r.status_code >= 200 and r.status_code <= 299) and r.status_code != 304: #304: not modified, in response to a conditional request
             raise Exception("An error occured, return code " + str(r.status_code))
 
-        if parse:
+        if raw:
+            return r
+        elif parse:
             return self._parse(r.text)
         else:
             return r.text
@@ -195,20 +205,64 @@ class CLAMClient:
         else:
             return True
 
-    def index(self):
-        """Get index of projects. Returns a ``CLAMData`` instance. Use CLAMData.projects for the index of projects."""
-        return self.request('')
+    def index(self, **listing):
+        """Get index of projects. Returns a ``CLAMData`` instance. Use CLAMData.projects for the index of projects.
 
-    def get(self, project):
-        """Query the project status. Returns a ``CLAMData`` instance or raises an exception according to the returned HTTP Status code"""
-        try:
-            data = self.request(project + '/')
-        except:
-            raise
+        Keyword arguments ``offset``, ``limit``, ``sort`` (``name``, ``date``, ``size`` or ``status``), ``order`` (``asc`` or ``desc``), ``filter`` (a prefix of the project names) and ``status`` request part of the index only (see ``CLAMData.listings``). Without them all projects are listed, also if the service lists only part of them at once."""
+        if listing:
+            return self.request('?' + urlencode(listing))
+        return self.fetchall('', self.request(''), ('projects',))
+
+    def fetchall(self, url, data, keys):
+        """Completes the listings the service cut short (at its LISTLIMIT) by requesting the remaining pages, for internal use"""
+        for key in keys:
+            listing = data.listings.pop(key, None)
+            while listing and listing['limit'] and listing['offset'] + listing['limit'] < listing['filtered']:
+                page = self.request(url + ('&' if '?' in url else '?') + 'offset=' + str(listing['offset'] + listing['limit']))
+                getattr(data, key).extend(getattr(page, key))
+                listing = page.listings.get(key)
+        return data
+
+    def get(self, project, since=None, wait=None, include=None, **listing):
+        """Query the project status. Returns a ``CLAMData`` instance or raises an exception according to the returned HTTP Status code.
+
+        The client remembers the last response for each project; if the project did not change since, the service says so (HTTP 304) rather than sending it again and the same ``CLAMData`` instance is returned.
+
+        Rather than polling the status repeatedly, pass the ``statusversion`` of the last ``CLAMData`` instance as ``since``: the service then holds the request until the status changes, for at most ``wait`` seconds (or the maximum the service allows), e.g.::
+
+            data = client.get(project)
+            while data.status != clam.common.status.DONE:
+                data = client.get(project, since=data.statusversion)
+
+        Keyword arguments ``offset``, ``limit``, ``sort`` (``name`` or ``template``), ``order`` (``asc`` or ``desc``), ``filter`` (a prefix of the file names) and ``template`` request part of the input and output files only (see ``CLAMData.listings``). Without them all files are listed, also if the service lists only part of them at once.
+
+        Pass the sections of the response you need as ``include`` (any of ``status``, ``profiles``, ``parameters``, ``program``, ``input`` and ``output``) to have the service leave out, and not compute, the others; e.g. ``include=('status',)`` when only polling the status. The ``CLAMData`` instance then holds nothing for the sections left out.
+        """
+        params = dict(listing)
+        if include:
+            params['include'] = include if isinstance(include, str) or (sys.version < '3' and isinstance(include, unicode)) else ','.join(include) #pylint: disable=undefined-variable
+        if since:
+            params['since'] = since
+            if wait is not None:
+                params['wait'] = wait
+        url = project + '/'
+        if params:
+            url += '?' + urlencode(sorted(params.items()))
+        key = (project, params.get('include'), tuple(sorted(listing.items())))
+        headers = {}
+        if key in self.etags:
+            headers['If-None-Match'] = self.etags[key][0]
+        r = self.request(url, 'GET', None, True, None, True, headers)
+        if r.status_code == 304:
+            return self.etags[key][1]
+        data = self._parse(r.text)
         if not isinstance(data, clam.common.data.CLAMData):
             raise Exception("Unable to retrieve CLAM Data")
-        else:
-            return data
+        if not listing:
+            self.fetchall(project + '/' + ('?' + urlencode({'include': params['include']}) if include else ''), data, ('input','output'))
+        if r.headers.get('ETag'):
+            self.etags[key] = (r.headers['ETag'], data)
+        return data
 
 
     def create(self,project):
@@ -234,7 +288,51 @@ class CLAMClient:
         else:
             encoding = 'utf-8'
 
-        return self.request('actions/' + action_id, method, kwargs, False,encoding)
+        r = self.request('actions/' + action_id, method, kwargs, False, encoding, True)
+        if r.status_code == 202 and 'Location' in r.headers:
+            #background action, wait for the result
+            result = None
+            while result is None:
+                result = self.actionresult(r.headers['Location'], 30, encoding)
+            return result
+        return r.text
+
+    def startaction(self, action_id, **kwargs):
+        """Start an action that runs in the background (``background=True`` on the service). Takes the same arguments as ``action()``, but returns the URL of the action job immediately; pass it to ``actionresult()`` to obtain the result"""
+        if 'method' in kwargs:
+            method = kwargs['method']
+            del kwargs['method']
+        else:
+            method = 'GET'
+        r = self.request('actions/' + action_id, method, kwargs, False, None, True)
+        if r.status_code != 202 or 'Location' not in r.headers:
+            raise Exception("Action " + action_id + " does not run in the background")
+        return r.headers['Location']
+
+    def actionresult(self, joburl, wait=0, encoding='utf-8'):
+        """Obtain the result of a background action job (by the URL ``startaction()`` returned). Returns None if the job is not done yet; ``wait`` is the maximum number of seconds the service may hold the request waiting for the job to finish. Raises the same exceptions as ``action()`` if the action failed."""
+        r = self.request(self._joburl(joburl) + ('?wait=' + str(wait) if wait else ''), 'GET', None, False, encoding, True)
+        if r.status_code == 202:
+            return None
+        return r.text
+
+    def deleteactionjob(self, joburl):
+        """Abort (if still in progress) and remove a background action job"""
+        return self.request(self._joburl(joburl), 'DELETE', None, False)
+
+    def actionbatch(self, action_id, items, encoding='utf-8'):
+        """Perform an action for many parameter sets in a single request. ``items`` is a list of dictionaries mapping parameter ids to values. Returns a list of (status, result) tuples in the same order, where status is the HTTP status code the action would have returned for that item."""
+        r = self.request('actions/' + action_id + '/batch', 'POST', json.dumps(items), False, encoding, True)
+        results = []
+        for line in r.text.split("\n"):
+            if line.strip():
+                result = json.loads(line)
+                results.append( (result['status'], result['result']) )
+        return results
+
+    def _joburl(self, joburl):
+        """URL of an action job relative to the service URL"""
+        return 'actions/' + joburl.split('/actions/',1)[1]
 
 
 
@@ -279,6 +377,8 @@ class CLAMClient:
 
             client.delete("myprojectname")
         """
+        for key in [ key for key in self.etags if key[0] == project ]:
+            del self.etags[key]
         return self.request(project + '/', 'DELETE')
 
     def abort(self, project): #alias
@@ -379,7 +479,7 @@ class CLAMClient:
 
         """
         if isinstance( inputtemplate, str) or (sys.version < '3' and isinstance( inputtemplate, unicode)): #pylint: disable=undefined-variable
-            data = self.get(project) #causes an extra query to server
+            data = self.get(project, include=('profiles',)) #causes an extra query to server
             inputtemplate = data.inputtemplate(inputtemplate)
         elif not isinstance(inputtemplate, clam.common.data.InputTemplate):
             raise Exception("inputtemplate must be instance of InputTemplate. Get from CLAMData.inputtemplate(id)")
@@ -470,7 +570,7 @@ class CLAMClient:
 
         """
         if isinstance( inputtemplate, str) or (sys.version < '3' and isinstance( inputtemplate, unicode)): #pylint: disable=undefined-variable
-            data = self.get(project) #causes an extra query to server
+            data = self.get(project, include=('profiles',)) #causes an extra query to server
             inputtemplate = data.inputtemplate(inputtemplate)
         elif not isinstance(inputtemplate, clam.common.data.InputTemplate):
             raise Exception("inputtemplate must be instance of InputTemplate. Get from CLAMData.inputtemplate(id)")
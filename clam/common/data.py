@@ -34,6 +34,7 @@ import clam.common.parameters
 import clam.common.status
 import clam.common.util
 import clam.common.viewers
+import clam.common.batching
 
 VERSION = '2.2.5'
 
@@ -463,12 +464,16 @@ class CLAMData(object):
         * ``statusmessage``   - The latest status message (string)
         * ``completion``      - An integer between 0 and 100 indicating
                           the percentage towards completion.
+        * ``queueposition``   - Position of the project in the job queue (1-based), 0 if the project is not queued. A queued project has status ``clam.common.status.RUNNING``
+        * ``queuelength``     - Total number of jobs in the queue (only set if the project is queued)
+        * ``statusversion``   - Identifier of the status, changes whenever the status does (pass it to ``CLAMClient.get()`` to wait for a change)
         * ``parameters``      - List of parameters (but use the methods instead)
         * ``profiles``        - List of profiles (``[ Profile ]``)
         * ``program``         - A Program instance (or None). Describes the expected outputfiles given the uploaded inputfiles. This is the concretisation of the matching profiles.
         * ``input``           - List of input files  (``[ CLAMInputFile ]``); use ``inputfiles()`` instead for easier access
         * ``output``          - List of output files (``[ CLAMOutputFile ]``)
         * ``projects``        - List of project IDs (``[ string ]``)
+        * ``listings``        - For the listings of ``projects``, ``input`` and ``output`` that hold only part of all entries (a page), a dictionary with the number of entries in ``total``, the number after filtering in ``filtered``, and the ``offset`` and ``limit`` of the page
         * ``corpora``         - List of pre-installed corpora
         * ``errors``          - Boolean indicating whether there are errors in parameter specification
         * ``errormsg``        - String containing an error message
@@ -505,6 +510,16 @@ class CLAMData(object):
         self.statusmessage = ""
         self.completion = 0
 
+        #: Position in the job queue if the project is queued and waiting for execution (1-based), 0 otherwise
+        self.queueposition = 0
+        self.queuelength = 0
+
+        #: Identifier of the status, changes whenever the status does
+        self.statusversion = None
+
+        #: Resources used by the run once it is done, a dictionary (see clam.common.accounting), None if not available
+        self.resources = None
+
         #: This contains a list of (parametergroup, [parameters]) tuples.
         self.parameters = []
 
@@ -529,6 +544,9 @@ class CLAMData(object):
         #: List of projects ([ string ])
         self.projects = None
 
+        #: Listings that hold only part of all entries: 'projects', 'input' or 'output' => {'total','filtered','offset','limit'}
+        self.listings = {}
+
         #: Boolean indicating whether there are errors in parameter specification
         self.errors = False
 
@@ -587,10 +605,18 @@ class CLAMData(object):
                 self.status = int(node.attrib['code'])
                 self.statusmessage  = node.attrib['message']
                 self.completion  = node.attrib['completion']
+                if 'queueposition' in node.attrib:
+                    self.queueposition = int(node.attrib['queueposition'])
+                    self.queuelength = int(node.attrib['queuelength'])
+                if 'version' in node.attrib:
+                    self.statusversion = node.attrib['version']
                 if 'errors' in node.attrib:
                     self.errors = ((node.attrib['errors'] == 'yes') or (node.attrib['errors'] == '1'))
                 if 'errormsg' in node.attrib:
                     self.errormsg = node.attrib['errormsg']
+                for subnode in node:
+                    if subnode.tag == 'resources':
+                        self.resources = dict( (key, float(value) if '.' in value else int(value)) for key, value in subnode.attrib.items() )
             elif node.tag == 'parameters':
                 for parametergroupnode in node:
                     if parametergroupnode.tag == 'parametergroup':
@@ -610,24 +636,27 @@ class CLAMData(object):
                     if subnode.tag == 'profile':
                         self.profiles.append(Profile.fromxml(subnode))
             elif node.tag == 'input':
+                self.parselisting(node)
                 for filenode in node:
                     if filenode.tag == 'file':
                         for n in filenode:
                             if n.tag == 'name':
                                 self.input.append( CLAMInputFile( self.projecturl, n.text, self.loadmetadata, self.client,True) )
             elif node.tag == 'output':
+                self.parselisting(node)
                 for filenode in node:
                     if filenode.tag == 'file':
                         for n in filenode:
                             if n.tag == 'name':
                                 self.output.append( CLAMOutputFile( self.projecturl, n.text, self.loadmetadata, self.client ) )
             elif node.tag == 'projects':
+                self.parselisting(node)
                 self.projects = []
                 for projectnode in node:
                     if projectnode.tag == 'project':
                         self.projects.append(projectnode.text)
             elif node.tag == 'program':
-                self.program = Program(self.projecturl, [ int(i) for i in node.attrib['matchedprofiles'].split(',') ] )
+                self.program = Program(self.projecturl, [ int(i) for i in node.attrib['matchedprofiles'].split(',') ], node.attrib.get('incremental') == 'yes' )
                 for outputfilenode in node:
                     if outputfilenode.tag == 'outputfile':
                         inputfound = False
@@ -638,6 +667,10 @@ class CLAMData(object):
                         if not inputfound:
                             self.program.add(outputfilenode.attrib['name'],outputfilenode.attrib['template'])
 
+    def parselisting(self, node):
+        if 'total' in node.attrib:
+            self.listings[node.tag] = dict( (key, int(node.attrib[key])) for key in ('total','filtered','offset','limit') )
+
     def outputtemplate(self, template_id):
         """Get an output template by ID"""
         for profile in self.profiles:
@@ -785,12 +818,25 @@ def profiler(profiles, projectpath,parameters,serviceid,servicename,serviceurl,p
 
 
 class Profile(object):
-    def __init__(self, *args):
-        """Create a Profile. Arguments can be of class InputTemplate, OutputTemplate or ParameterCondition"""
+    def __init__(self, *args, **kwargs):
+        """Create a Profile. Arguments can be of class InputTemplate, OutputTemplate or ParameterCondition
+
+        Keyword arguments:
+
+            * ``cores``  - The number of CPU cores a run of this profile occupies (default: 1). Used by the scheduler to pack jobs when ``MAXCORES`` is set.
+            * ``memory`` - The amount of memory (in MB) a run of this profile is expected to use (default: 0, unspecified). Used by the scheduler when ``MAXMEMORY`` is set.
+            * ``fanout`` - Split a run into sub-jobs that each process the input files of one sequence number, running in parallel. Set to ``True`` to run ``FANOUT_WIDTH`` sub-jobs at once, or to an integer to set the number explicitly (default: False). Each sub-job calls the system with a ``clam.xml`` restricted to its inputs and outputs (see ``Program.partition()``).
+            * ``reduce`` - When fanning out, run a final step that produces the outputs without parent (unique outputs) after all sub-jobs are done (default: True)
+        """
 
         self.input = []
         self.output = []
 
+        self.cores = int(kwargs.get('cores', 1))
+        self.memory = int(kwargs.get('memory', 0))
+        self.fanout = kwargs.get('fanout', False)
+        self.reduce = bool(kwargs.get('reduce', True))
+
         for arg in args:
             if isinstance(arg, InputTemplate):
                 self.input.append(arg)
@@ -937,7 +983,16 @@ class Profile(object):
 
     def xml(self, indent = ""):
         """Produce XML output for the profile"""
-        xml = "\n" + indent + "<profile>\n"
+        xml = "\n" + indent + "<profile"
+        if self.cores != 1:
+            xml += " cores=\"" + str(self.cores) + "\""
+        if self.memory:
+            xml += " memory=\"" + str(self.memory) + "\""
+        if self.fanout:
+            xml += " fanout=\"" + ("yes" if self.fanout is True else str(int(self.fanout))) + "\""
+            if not self.reduce:
+                xml += " reduce=\"no\""
+        xml += ">\n"
         xml += indent + " <input>\n"
         for inputtemplate in self.input:
             xml += inputtemplate.xml(indent +"    ") + "\n"
@@ -967,8 +1022,16 @@ class Profile(object):
             node = parsexmlstring(node)
 
         args = []
+        kwargs = {}
 
         if node.tag == 'profile':
+            for key in ('cores','memory'):
+                if key in node.attrib:
+                    kwargs[key] = int(node.attrib[key])
+            if 'fanout' in node.attrib:
+                kwargs['fanout'] = True if node.attrib['fanout'] == 'yes' else int(node.attrib['fanout'])
+            if 'reduce' in node.attrib:
+                kwargs['reduce'] = node.attrib['reduce'] != 'no'
             for node in node:
                 if node.tag == 'input':
                     for subnode in node:
@@ -980,18 +1043,21 @@ class Profile(object):
                             args.append(OutputTemplate.fromxml(subnode))
                         elif subnode.tag.lower() == 'parametercondition':
                             args.append(ParameterCondition.fromxml(subnode))
-        return Profile(*args)
+        return Profile(*args, **kwargs)
 
 class Program(dict):
     """A Program is the concretisation of Profile. It describes the exact output files that will be created on the basis of what input files. This is in essence a dictionary
-    structured as follows: ``{outputfilename: (outputtemplate, inputfiles)}`` in which ``inputfiles`` is a dictionary ``{inputfilename: inputtemplate}``"""
+    structured as follows: ``{outputfilename: (outputtemplate, inputfiles)}`` in which ``inputfiles`` is a dictionary ``{inputfilename: inputtemplate}``
+
+    In an incremental run (``incremental`` is True), the program only holds the output files that have to be produced anew, output files for unchanged input have been kept from the previous run."""
 
-    def __init__(self, projectpath, matchedprofiles=None):
+    def __init__(self, projectpath, matchedprofiles=None, incremental=False):
         self.projectpath=projectpath
         if matchedprofiles is None:
             self.matchedprofiles=[]
         else:
             self.matchedprofiles=matchedprofiles
+        self.incremental = incremental
         super(Program,self).__init__()
 
     def update(self, src):
@@ -1015,6 +1081,41 @@ class Program(dict):
             else:
                 self[outputfilename] = (outputtemplate, {})
 
+    def restrict(self, outputfilenames):
+        """Returns a new Program with only the specified output files"""
+        program = Program(self.projectpath, self.matchedprofiles, self.incremental)
+        for outputfilename in outputfilenames:
+            outputtemplate, inputfiles = self[outputfilename]
+            program[outputfilename] = (outputtemplate, dict(inputfiles))
+        return program
+
+    def inputfilenames(self):
+        """Returns the set of all input filenames the program uses"""
+        inputfilenames = set()
+        for outputtemplate, inputfiles in self.values(): #pylint: disable=unused-variable
+            inputfilenames.update(inputfiles.keys())
+        return inputfilenames
+
+    def partition(self, outputtemplates):
+        """Splits the program for running it in independent parts. Output files of the specified output templates (IDs) that have input files are grouped so that each group has its own input files (normally one input sequence number).
+
+        Returns a tuple ``(parts, remainder)``, where ``parts`` is a list of Program instances, one per group, and ``remainder`` is a Program with all other output files (e.g. unique outputs that need all input)."""
+        groups = [] #list of (set of inputfilenames, list of outputfilenames)
+        remainder = []
+        for outputfilename in sorted(self.keys()):
+            outputtemplate, inputfiles = self[outputfilename]
+            if outputtemplate not in outputtemplates or not inputfiles:
+                remainder.append(outputfilename)
+                continue
+            inputfilenames = set(inputfiles.keys())
+            overlapping = [ group for group in groups if group[0] & inputfilenames ]
+            for group in overlapping: #merge all groups that share input files with this output
+                groups.remove(group)
+                inputfilenames |= group[0]
+            groups.append( (inputfilenames, sum([ group[1] for group in overlapping ], []) + [outputfilename]) )
+        groups.sort(key=lambda group: sorted(group[0]))
+        return [ self.restrict(outputfilenames) for _, outputfilenames in groups ], self.restrict(remainder)
+
     def outputpairs(self):
         """Iterates over all (outputfilename, outputtemplate) pairs"""
         for outputfilename, (outputtemplate, inputfiles) in self.items():
@@ -2198,6 +2299,10 @@ class Action(object):
         elif 'function' in kwargs:
             self.command = None
             self.function = kwargs['function']
+        elif 'batchfunction' in kwargs:
+            #concurrent calls are collected into batches for a function that processes a list of calls at once, see clam.common.batching
+            self.command = None
+            self.function = clam.common.batching.Batcher(kwargs['batchfunction'], kwargs.get('batchsize',32), kwargs.get('batchwait',0.01))
         else:
             self.command = self.function = None #action won't be able to do anything!
 
@@ -2248,6 +2353,47 @@ class Action(object):
         else:
             self.tmpdir = False
 
+        #run the command in the background: the request returns a job URL (202) to obtain the result from later, rather than waiting for the command
+        if 'background' in kwargs:
+            self.background = bool(kwargs['background'])
+            if self.background and not self.command:
+                raise Exception("Only actions with a command can run in the background (action " + self.id + ")")
+        else:
+            self.background = False
+
+        #call the function in the process pool of the webservice rather than in the thread handling the request
+        if 'pool' in kwargs:
+            self.pool = bool(kwargs['pool'])
+            if self.pool and not 'function' in kwargs:
+                raise Exception("Only actions with a function can run in the process pool (action " + self.id + ")")
+        else:
+            self.pool = False
+
+        #maximum number of seconds a pooled function may take, the request fails with 504 after that
+        if 'timeout' in kwargs:
+            self.timeout = kwargs['timeout']
+        else:
+            self.timeout = None
+
+        #send the output of the command to the client while it runs, rather than when it has finished
+        if 'stream' in kwargs:
+            self.stream = bool(kwargs['stream'])
+            if self.stream and not self.command:
+                raise Exception("Only actions with a command can stream their output (action " + self.id + ")")
+            if self.stream and self.background:
+                raise Exception("Background actions can not stream their output (action " + self.id + ")")
+        else:
+            self.stream = False
+
+        #cache results by parameter values, for actions whose result depends only on their parameters, see clam.common.actioncache
+        if 'cache' in kwargs:
+            self.cache = bool(kwargs['cache'])
+            if self.cache and 'background' in kwargs and kwargs['background']:
+                raise Exception("Results of background actions can not be cached (action " + self.id + ")")
+        else:
+            self.cache = False
+        self.cachesize = kwargs.get('cachesize',1000) #maximum number of cached results
+        self.cachettl = kwargs.get('cachettl',3600) #seconds a cached result remains valid, 0 for forever
 
 
     def xml(self, indent = ""):
@@ -2259,7 +2405,11 @@ class Action(object):
             allowanonymous = "allowanoymous=\"yes\""
         else:
             allowanonymous = ""
-        xml = indent + "<action id=\"" + self.id + "\" " + method + " name=\"" + self.name + "\" description=\"" +self.description + "\" mimetype=\"" + self.mimetype + "\" " + allowanonymous + ">\n"
+        if self.background:
+            background = " background=\"yes\""
+        else:
+            background = ""
+        xml = indent + "<action id=\"" + self.id + "\" " + method + " name=\"" + self.name + "\" description=\"" +self.description + "\" mimetype=\"" + self.mimetype + "\" " + allowanonymous + background + ">\n"
         for parameter in self.parameters:
             xml += parameter.xml(indent+ "    ") + "\n"
         xml += indent + "</action>\n"
@@ -0,0 +1,131 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Direct execution of action commands --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""Fast path for action commands: the webservice runs them itself rather than through the dispatcher, which saves a shell, the dispatcher process and its import of the service configuration on every call. This is only done when the dispatcher has nothing to add, i.e. when no resource limits are configured and commands run locally.
+
+Commands that need no shell are split into their arguments once (``tokenize``); for each call the placeholders in the arguments are then filled in with the parameter values as they are, without any quoting (``buildargv``). Temporary directories for actions are taken from a pool of directories that are emptied and reused rather than created anew for every call (``TmpDirPool``)."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import os
+import re
+import random
+import shutil
+import shlex
+import atexit
+import threading
+
+#Characters that require the command to be run through a shell, the same as in clam.clamdispatcher
+SHELLCHARACTERS = set('|&;<>()$`\\*?[]{}~!#\n')
+
+#Shell builtins and keywords, commands starting with these are no programs and need a shell
+SHELLBUILTINS = set(('exit','cd','export','source','.',':','set','unset','ulimit','umask','exec','eval','test','[','[[','true','false','alias','shift','trap','wait','read','readonly','return','break','continue','type','hash','command','builtin','let','local','declare','typeset','pushd','popd','times','if','then','else','elif','fi','for','while','until','do','done','case','esac','function','time','!','{','}'))
+
+#placeholders CLAM fills in: $PARAMETERS, $TMPDIRECTORY, $USERNAME, $OAUTH_ACCESS_TOKEN and $parameterid$
+PLACEHOLDERS = re.compile(r'\$(?:PARAMETERS|TMPDIRECTORY|USERNAME|OAUTH_ACCESS_TOKEN)(?![A-Za-z0-9_])|\$[A-Za-z0-9_\-]+\$')
+
+def tokenize(command):
+    """Splits the command of an action into its arguments, placeholders included. Returns None if the command needs a shell."""
+    if any( c in SHELLCHARACTERS for c in PLACEHOLDERS.sub('', command) ):
+        return None
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return None
+    if not argv or '=' in argv[0] or any( PLACEHOLDERS.search(arg) for arg in argv[:1] ): #a variable assignment, or the program itself is variable
+        return None
+    if argv[0] in SHELLBUILTINS: #e.g. exit 3
+        return None
+    return argv
+
+def buildargv(argv, parameters, variables):
+    """Fills in the placeholders in the arguments of a tokenized command. ``parameters`` is a list of (flag, value, id) tuples as collected for the action, ``variables`` maps $TMPDIRECTORY, $USERNAME and $OAUTH_ACCESS_TOKEN to their values."""
+    used = set()
+    for arg in argv:
+        for _, value, paramid in parameters:
+            if arg.find('$' + paramid + '$') != -1:
+                used.add(paramid)
+    #parameters that are not placed explicitly make up $PARAMETERS
+    remaining = []
+    for flag, value, paramid in parameters:
+        if value and paramid not in used:
+            if flag: remaining.append(flag)
+            remaining.append(value)
+
+    result = []
+    for arg in argv:
+        if arg == '$PARAMETERS':
+            result += remaining
+            continue
+        for flag, value, paramid in parameters:
+            if value:
+                arg = arg.replace('$' + paramid + '$', value)
+        arg = PLACEHOLDERS.sub(lambda match: variables.get(match.group(0), match.group(0)) if match.group(0) != '$PARAMETERS' else ' '.join(remaining), arg)
+        result.append(arg)
+    return result
+
+
+class TmpDirPool(object):
+    """Pool of empty temporary directories, created when first needed and reused after they have been emptied. The free directories are removed when the process exits."""
+
+    def __init__(self, directory, size=8):
+        self.directory = directory
+        self.size = size
+        self.lock = threading.Lock()
+        self.pid = os.getpid() #directories are not to be shared with forked processes
+        self.free = []
+        atexit.register(self.clear)
+
+    def clear(self):
+        """Removes the free directories (those in use are removed when released)"""
+        if os.getpid() != self.pid: #a forked process exiting, the directories are its parent's
+            return
+        with self.lock:
+            free, self.free = self.free, []
+            self.size = 0
+        for tmpdir in free:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    def create(self):
+        tmpdir = os.path.join(self.directory, 'atmp.' + str("%034x" % random.getrandbits(128)))
+        os.mkdir(tmpdir)
+        return tmpdir
+
+    def acquire(self):
+        """Returns an empty temporary directory"""
+        with self.lock:
+            if self.free:
+                return self.free.pop()
+        return self.create()
+
+    def release(self, tmpdir):
+        """Empties the temporary directory and returns it to the pool (or removes it if the pool is full)"""
+        with self.lock:
+            full = len(self.free) >= self.size
+        if full:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            return
+        try:
+            for filename in os.listdir(tmpdir):
+                path = os.path.join(tmpdir, filename)
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                else:
+                    os.unlink(path)
+        except OSError:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            return
+        with self.lock:
+            self.free.append(tmpdir)
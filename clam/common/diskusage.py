@@ -0,0 +1,123 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Disk usage accounting --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""Disk usage of projects, kept up to date as files are added and removed rather than by walking the project directory each time.
+
+The size of a project (in MB) is stored in ``.du`` in the project directory. Uploads, archive extraction and deletions adjust it by the number of bytes they add or remove (``adjust``); after a run the dispatcher determines it anew (``reconcile``), as does the reconciler that periodically goes over all projects to correct any drift. A project without ``.du`` has an unknown size, which is computed by walking the project directory when it is needed."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import os
+import io
+import re
+import glob
+import time
+import fcntl
+import threading
+from contextlib import contextmanager
+
+from clam.common.util import computediskusage
+
+FILENAME = '.du'
+
+MB = 1024 * 1024
+
+def filesize(*paths):
+    """Returns the total size in bytes of the given files (missing files count as zero), measured the same way as computediskusage()"""
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+def filesizes(directory, filename):
+    """Returns the size in bytes of an input or output file in the directory, together with its metadata file and the input template links to it (which computediskusage() counts as the file they point to)"""
+    dirname, basename = os.path.split(filename)
+    prefix = os.path.join(directory, dirname, '.' + basename)
+    return filesize(os.path.join(directory, filename), prefix + '.METADATA', *glob.glob(re.sub(r'([*?[])', r'[\1]', prefix) + '.INPUTTEMPLATE.*')) #escaped by hand, glob.escape() requires Python 3.4
+
+def get(projectdir):
+    """Returns the size of the project in MB, or None if it is not known"""
+    try:
+        with open(os.path.join(projectdir, FILENAME),'r') as f:
+            return float(f.read().strip())
+    except (IOError, OSError, ValueError):
+        return None
+
+@contextmanager
+def lock(projectdir):
+    with open(os.path.join(projectdir, FILENAME + '.lock'),'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def write(projectdir, size):
+    tmpfile = os.path.join(projectdir, FILENAME + '.' + str(os.getpid()) + '.' + str(threading.current_thread().ident))
+    with io.open(tmpfile,'w',encoding='utf-8') as f:
+        f.write(str(size))
+    os.rename(tmpfile, os.path.join(projectdir, FILENAME))
+
+def set(projectdir, size): #pylint: disable=redefined-builtin
+    """Sets the size of the project in MB"""
+    with lock(projectdir):
+        write(projectdir, max(size, 0.0))
+
+def adjust(projectdir, delta):
+    """Adjusts the size of the project by ``delta`` bytes. Returns the new size in MB, or None if the size is not known (and will be computed when needed)."""
+    if not delta:
+        return get(projectdir)
+    if not os.path.exists(os.path.join(projectdir, FILENAME)):
+        return None
+    with lock(projectdir):
+        size = get(projectdir)
+        if size is None:
+            return None
+        size = max(size + delta / MB, 0.0)
+        write(projectdir, size)
+    return size
+
+def reconcile(projectdir):
+    """Determines the size of the project by walking its directory and stores it. Returns an (old size, new size) tuple in MB, the old size is None if it was not known."""
+    with lock(projectdir):
+        old = get(projectdir)
+        new = computediskusage(projectdir)
+        write(projectdir, new)
+    return old, new
+
+def due(stampfile, interval):
+    """Returns True if the periodic reconciliation is due (the stamp file holds the time it was last done), marking it as done if so. Only one of several processes sharing the stamp file gets True."""
+    with open(stampfile,'a+') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError): #another process is at it
+            return False
+        try:
+            f.seek(0)
+            try:
+                last = float(f.read().strip() or 0)
+            except ValueError:
+                last = 0
+            if time.time() - last < interval:
+                return False
+            f.seek(0)
+            f.truncate()
+            f.write(str(time.time()))
+            return True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
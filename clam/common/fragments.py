@@ -0,0 +1,61 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Pre-rendered response fragments --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""Parts of responses that only depend on the service configuration, rendered once when the service starts rather than on every request.
+
+These are the XML of the profiles, parameters, input sources and actions in ``response.xml``, and the static data the web interface loads (``data.js`` and ``style.css``). A parameter is rendered anew only if its value or error in the response differs from that in the configuration (e.g. in the response to starting a project with the values submitted); the others use the XML rendered at startup. Static data is served with a strong entity tag derived from its content."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import hashlib
+from collections import namedtuple
+
+from clam.common.util import xmlescape
+
+#static data served as is, with a strong entity tag
+Static = namedtuple('Static', ('content','mimetype','etag'))
+
+def state(parameter):
+    """Returns what the XML of the parameter depends on besides its definition"""
+    return (parameter.hasvalue, parameter.value, parameter.error)
+
+def indent(xml, width):
+    """Indents all lines but the first, as the ``indent`` filter of the templates does"""
+    return xml.replace("\n", "\n" + " " * width)
+
+
+class Fragments(object):
+    def __init__(self, profiles, parameters, inputsources, actions):
+        """Renders the fragments for the profiles, parameters (a list of (group, [parameters]) tuples), input sources and actions of the service"""
+        self.profiles = "\n".join( indent(profile.xml(), 8) for profile in profiles )
+        self.parameters = {} #parameter id => (state, XML)
+        for _, parameterlist in parameters:
+            for parameter in parameterlist:
+                self.parameters[parameter.id] = (state(parameter), parameter.xml())
+        self.inputsources = "\n".join( '<inputsource id="' + xmlescape(inputsource.id) + '">' + xmlescape(inputsource.label) + '</inputsource>' for inputsource in inputsources )
+        self.actions = "\n".join( action.xml() for action in actions )
+        self.static = {} #name => Static
+
+    def parameter(self, parameter):
+        """Returns the XML of the parameter, as rendered at startup unless its value or error differs from that in the configuration"""
+        rendered = self.parameters.get(parameter.id)
+        if rendered is not None and rendered[0] == state(parameter):
+            return rendered[1]
+        return parameter.xml()
+
+    def addstatic(self, name, content, mimetype):
+        """Adds static data (text) to be served as is"""
+        content = content.encode('utf-8')
+        self.static[name] = Static(content, mimetype, hashlib.md5(content).hexdigest())
@@ -0,0 +1,128 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Incremental runs --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""Support for incremental re-runs of a project.
+
+After a successful run, a manifest is kept in the project directory, recording a hash of the contents and metadata of each input file, a hash over the parameter values, matched profiles and system version, and the program (which output files were produced from which input files). When the output of the project is reset, it is moved aside instead of being deleted. On the next run the current input is compared with the manifest: output files whose input files (and the parameters) are unchanged are moved back, and only the remaining output files are left in the program for the system to produce. Output files without input files (unique outputs, e.g. aggregates over all input) are always produced again.
+
+The manifest is written as ``.manifest.pending`` when a run starts and promoted to ``.manifest`` by the dispatcher if the run succeeds."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import os
+import io
+import json
+import shutil
+import hashlib
+
+from clam.common.runcache import hashfile
+
+MANIFEST = '.manifest'
+PENDINGMANIFEST = '.manifest.pending'
+#directory in the project holding the output of the previous run, after a reset
+PREVIOUSDIR = '.previous'
+
+def metafilename(filename):
+    """Returns the name of the metadata file of an input or output file (relative to its directory)"""
+    dirname = os.path.dirname(filename)
+    return (dirname + '/' if dirname else '') + '.' + os.path.basename(filename) + '.METADATA'
+
+def inputmanifest(projectdir):
+    """Returns a dictionary mapping all input files to a hash of their contents and metadata"""
+    manifest = {}
+    inputdir = os.path.join(projectdir, 'input')
+    for dirpath, dirnames, filenames in os.walk(inputdir):
+        dirnames.sort()
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            filename = os.path.relpath(path, inputdir)
+            if os.path.basename(filename)[0] == '.':
+                continue #metadata, hashed along with the file it belongs to
+            hasher = hashfile(path)
+            if os.path.exists(os.path.join(inputdir, metafilename(filename))):
+                hashfile(os.path.join(inputdir, metafilename(filename)), hasher)
+            manifest[filename] = hasher.hexdigest()
+    return manifest
+
+def configkey(parameters, profiles, version):
+    """Hash over everything other than the input files that affects all output: ``parameters`` is a list of (id, value) tuples, ``profiles`` a list of the indices of the matched profiles"""
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps(sorted([ (key, value) for key, value in parameters ], key=lambda x: x[0]), default=str).encode('utf-8') + b"\0")
+    hasher.update(json.dumps(sorted(profiles)).encode('utf-8') + b"\0")
+    hasher.update(str(version).encode('utf-8'))
+    return hasher.hexdigest()
+
+def write(filename, inputs, config, program):
+    manifest = {
+        'inputs': inputs,
+        'config': config,
+        'program': dict( (outputfilename, sorted(inputfiles.keys())) for outputfilename, (_, inputfiles) in program.items() ),
+    }
+    with io.open(filename + '.tmp','w',encoding='utf-8') as f:
+        f.write(json.dumps(manifest, ensure_ascii=False))
+    os.rename(filename + '.tmp', filename)
+
+def load(filename):
+    try:
+        with io.open(filename,'r',encoding='utf-8') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+def unchanged(previous, inputs, config, program):
+    """Returns the output files of the program that can be kept from the previous run (described by the manifest ``previous``): those that were produced from exactly the same, unchanged input files, with the same configuration"""
+    if not previous or previous.get('config') != config:
+        return []
+    keep = []
+    for outputfilename, (_, inputfiles) in program.items():
+        if not inputfiles:
+            continue #unique outputs depend on all input
+        if previous['program'].get(outputfilename) != sorted(inputfiles.keys()):
+            continue
+        if all( inputfilename in previous['inputs'] and inputs.get(inputfilename) == previous['inputs'][inputfilename] for inputfilename in inputfiles ):
+            keep.append(outputfilename)
+    return keep
+
+def restore(projectdir, outputfilenames):
+    """Move the specified output files (and their metadata) of the previous run back into the output directory, returns the output files that were restored"""
+    previousdir = os.path.join(projectdir, PREVIOUSDIR)
+    outputdir = os.path.join(projectdir, 'output')
+    restored = []
+    for outputfilename in outputfilenames:
+        if not os.path.exists(os.path.join(previousdir, outputfilename)):
+            continue
+        for filename in (outputfilename, metafilename(outputfilename)):
+            if os.path.exists(os.path.join(previousdir, filename)):
+                target = os.path.join(outputdir, filename)
+                if not os.path.isdir(os.path.dirname(target)):
+                    os.makedirs(os.path.dirname(target))
+                os.rename(os.path.join(previousdir, filename), target)
+        restored.append(outputfilename)
+    return restored
+
+def setaside(projectdir):
+    """Move the output of the previous run aside (on reset), so unchanged output can be restored on the next run"""
+    previousdir = os.path.join(projectdir, PREVIOUSDIR)
+    outputdir = os.path.join(projectdir, 'output')
+    if os.path.isdir(previousdir):
+        shutil.rmtree(previousdir)
+    os.rename(outputdir, previousdir)
+    os.makedirs(outputdir)
+
+def discard(projectdir):
+    """Remove the output of the previous run that was not restored"""
+    previousdir = os.path.join(projectdir, PREVIOUSDIR)
+    if os.path.isdir(previousdir):
+        shutil.rmtree(previousdir)
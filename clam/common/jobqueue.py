@@ -0,0 +1,264 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Persistent job queue --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""A durable FIFO job queue for CLAM projects.
+
+Jobs are stored as small JSON files in a spool directory (``ROOT/queue/`` by default), so the queue survives restarts of the webservice. Pending jobs live in the spool directory itself, launched jobs are moved to the ``running/`` subdirectory until their project is done. The project directory holds a ``.queued`` file while the project waits in line.
+
+The scheduler launches pending jobs in order of submission as long as the configured limits on concurrent jobs, CPU cores and memory allow it. It is invoked by the webservice (on submission, on status requests and at startup) and by the dispatcher when a job ends. Jobs are handed to the resident launcher (see clamlauncher) if one is available, otherwise the dispatcher command is run through the shell."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import os
+import io
+import json
+import time
+import hashlib
+import fcntl
+import subprocess
+import socket
+from contextlib import contextmanager
+
+import clam.common.statestore
+
+class JobQueue(object):
+    """Persistent job queue, backed by a spool directory"""
+
+    def __init__(self, directory, launcher=None, statestore=None):
+        if directory[-1] != '/':
+            directory += '/'
+        self.directory = directory
+        self.launcher = launcher #socket of the resident launcher, if any
+        self.statestore = statestore #project state store to keep up to date, if any (see clam.common.statestore)
+        self.runningdir = directory + 'running/'
+        if not os.path.isdir(self.runningdir):
+            try:
+                os.makedirs(self.runningdir)
+            except OSError: #may be created concurrently
+                if not os.path.isdir(self.runningdir):
+                    raise
+
+    @contextmanager
+    def lock(self):
+        """Exclusive lock on the queue, shared between all processes (webservice workers and dispatchers)"""
+        with open(self.directory + '.lock','a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _setstate(self, projectdir, unless=None, **fields):
+        """Update the state of the project in the state store (if any), unless it is in the state ``unless``"""
+        if self.statestore is not None:
+            location = clam.common.statestore.locate(projectdir)
+            if location is not None:
+                self.statestore.set(location[0], location[1], unless=unless, **fields)
+
+    @staticmethod
+    def _read(filename):
+        try:
+            with io.open(filename,'r',encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write(filename, job):
+        with io.open(filename + '.tmp','w',encoding='utf-8') as f:
+            f.write(json.dumps(job, ensure_ascii=False))
+        os.rename(filename + '.tmp', filename)
+
+    def _pendingfiles(self):
+        """Sorted list of pending job files, the order is the order of submission"""
+        return sorted( filename for filename in os.listdir(self.directory) if filename.endswith('.json') )
+
+    def submit(self, projectdir, cmd, cwd, user="", project="", cores=1, memory=0, spec=None):
+        """Add a job to the queue. ``cmd`` is the full (shell) command that launches the dispatcher, ``spec`` is the job as understood by the launcher (a dictionary with the command line arguments for the dispatcher and the error log). ``cores`` and ``memory`` (in MB) are the resources the job claims. Returns the queue position (1-based)."""
+        if projectdir[-1] != '/':
+            projectdir += '/'
+        job = {
+            'projectdir': projectdir,
+            'user': user,
+            'project': project,
+            'cmd': cmd,
+            'cwd': cwd,
+            'cores': cores,
+            'memory': memory,
+            'spec': spec,
+            'submitted': time.time(),
+        }
+        with self.lock():
+            self._remove(projectdir)
+            #name consists of submission time (for ordering) and a hash of the project directory (for uniqueness)
+            jobfile = "%020d" % int(job['submitted'] * 1000000) + '.' + hashlib.md5(projectdir.encode('utf-8')).hexdigest()[:12] + '.json'
+            self._write(self.directory + jobfile, job)
+            with open(projectdir + '.queued','w') as f:
+                f.write(jobfile)
+            self._setstate(projectdir, state=clam.common.statestore.QUEUED, pid=0, exitcode=None, aborted=0, started=None, finished=None)
+            return self._pendingfiles().index(jobfile) + 1
+
+    def _remove(self, projectdir):
+        queuedfile = projectdir + '.queued'
+        if os.path.exists(queuedfile):
+            with open(queuedfile,'r') as f:
+                jobfile = f.read().strip()
+            if jobfile and os.path.exists(self.directory + jobfile):
+                os.unlink(self.directory + jobfile)
+            os.unlink(queuedfile)
+            return True
+        return False
+
+    def remove(self, projectdir):
+        """Remove a pending job from the queue, returns True if the job was queued"""
+        if projectdir[-1] != '/':
+            projectdir += '/'
+        with self.lock():
+            return self._remove(projectdir)
+
+    def position(self, projectdir):
+        """Returns a (position, total) tuple for the job of the given project, position is 1-based and 0 if the project is not queued"""
+        if projectdir[-1] != '/':
+            projectdir += '/'
+        jobfiles = self._pendingfiles()
+        try:
+            with open(projectdir + '.queued','r') as f:
+                jobfile = f.read().strip()
+            return jobfiles.index(jobfile) + 1, len(jobfiles)
+        except (IOError, OSError, ValueError):
+            return 0, len(jobfiles)
+
+    def pending(self):
+        """Returns a list of all pending jobs (dictionaries), in order"""
+        jobs = []
+        for jobfile in self._pendingfiles():
+            job = self._read(self.directory + jobfile)
+            if job is not None:
+                jobs.append(job)
+        return jobs
+
+    @staticmethod
+    def _finished(job):
+        projectdir = job['projectdir']
+        if not os.path.isdir(projectdir) or os.path.exists(projectdir + '.done'):
+            return True
+        try:
+            with open(projectdir + '.pid','r') as f:
+                pid = int(f.read().strip())
+            os.kill(pid, 0) #raises an error if the process no longer exists
+            return False
+        except (IOError, OSError, ValueError):
+            return True
+
+    def _running(self):
+        """Returns a list of (jobfile, job) tuples for all jobs that are still running, cleaning up the ones that ended"""
+        running = []
+        for jobfile in sorted(os.listdir(self.runningdir)):
+            if not jobfile.endswith('.json'):
+                continue
+            job = self._read(self.runningdir + jobfile)
+            if job is None or self._finished(job):
+                try:
+                    os.unlink(self.runningdir + jobfile)
+                except OSError:
+                    pass
+            else:
+                running.append( (jobfile, job) )
+        return running
+
+    def running(self):
+        """Returns a list of all running jobs (dictionaries)"""
+        with self.lock():
+            return [ job for _, job in self._running() ]
+
+    def schedule(self, maxjobs=0, maxcores=0, maxmemory=0, resourcecheck=None, log=None):
+        """Launch as many pending jobs as the limits allow, in order of submission. A limit of 0 means unlimited. Jobs that do not fit in the remaining cores/memory are skipped in favour of later jobs that do. ``resourcecheck`` is an optional function returning a ``(bool, message)`` tuple that is consulted before each launch (to check load average, free memory, etc...). Returns the list of launched jobs."""
+        launched = []
+        with self.lock():
+            running = [ job for _, job in self._running() ]
+            cores = sum( job['cores'] for job in running )
+            memory = sum( job['memory'] for job in running )
+            for jobfile in self._pendingfiles():
+                if maxjobs and len(running) >= maxjobs:
+                    break
+                job = self._read(self.directory + jobfile)
+                if job is None:
+                    continue
+                if not os.path.isdir(job['projectdir']):
+                    #project was deleted in the meantime
+                    os.unlink(self.directory + jobfile)
+                    continue
+                #a job claiming more than the total available is allowed to run on its own
+                jobcores = min(job['cores'], maxcores) if maxcores else job['cores']
+                jobmemory = min(job['memory'], maxmemory) if maxmemory else job['memory']
+                if (maxcores and cores + jobcores > maxcores) or (maxmemory and memory + jobmemory > maxmemory):
+                    continue
+                if resourcecheck is not None:
+                    sufficient, msg = resourcecheck()
+                    if not sufficient:
+                        if log: log("Not launching queued jobs, insufficient resources: " + msg)
+                        break
+                self.launch(jobfile, job, log)
+                running.append(job)
+                launched.append(job)
+                cores += jobcores
+                memory += jobmemory
+        return launched
+
+    def launch(self, jobfile, job, log=None):
+        """Launch the job, must be called with the queue locked"""
+        #the job is marked as running before it is handed off: a short job may be done before we get back
+        job['started'] = time.time()
+        self._setstate(job['projectdir'], state=clam.common.statestore.RUNNING, pid=0, started=job['started'])
+        pid = None
+        if self.launcher and job.get('spec'):
+            try:
+                pid = launch(self.launcher, dict(job['spec'], cwd=job['cwd']))
+                if log: log("Launched queued job for " + job['projectdir'] + " through the launcher")
+            except (socket.error, IOError, ValueError, KeyError) as e:
+                if log: log("Launcher not available (" + str(e) + "), running dispatcher directly")
+        if pid is None:
+            if log: log("Launching queued job for " + job['projectdir'] + ": " + repr(job['cmd']))
+            process = subprocess.Popen(job['cmd'], cwd=job['cwd'], shell=True, close_fds=True)
+            pid = process.pid
+            with open(job['projectdir'] + '.pid','w') as f: #will be overwritten by the dispatcher
+                f.write(str(pid))
+        self._write(self.runningdir + jobfile, job)
+        os.unlink(self.directory + jobfile)
+        if os.path.exists(job['projectdir'] + '.queued'):
+            os.unlink(job['projectdir'] + '.queued')
+        self._setstate(job['projectdir'], unless=clam.common.statestore.DONE, pid=pid)
+        return pid
+
+
+def launch(socketpath, spec, timeout=10):
+    """Hand a job to the resident launcher listening on the given socket, returns the pid of the process supervising the job"""
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(timeout)
+    try:
+        s.connect(socketpath)
+        s.sendall(json.dumps(spec).encode('utf-8') + b"\n")
+        data = b""
+        while b"\n" not in data:
+            chunk = s.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        s.close()
+    reply = json.loads(data.decode('utf-8'))
+    if 'error' in reply:
+        raise IOError(reply['error'])
+    return reply['pid']
@@ -0,0 +1,131 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Paginated listings --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""Paging, sorting and filtering of the listings of projects and of input and output files.
+
+A ``Listing`` holds the parameters of a request for part of a listing: ``offset`` and ``limit`` select the page, ``sort`` the column to order by (``order`` being ``asc`` or ``desc``), ``filter`` a prefix the names have to start with, ``template`` the input or output template of files and ``status`` the status of projects. Rows are filtered, sorted and paged on these few columns first, so only the rows on the page have to be described in full: loading the metadata and viewers of all files of a project with tens of thousands of outputs, only to show a hundred of them, is what makes large projects slow."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import os
+import io
+import re
+
+import clam.common.status
+
+#request parameters of a listing
+PARAMETERS = ('offset','limit','sort','order','filter','template','status')
+
+ORDERS = ('asc','desc')
+
+STATUSES = {'ready': clam.common.status.READY, 'running': clam.common.status.RUNNING, 'done': clam.common.status.DONE}
+
+TEMPLATEMATCH = re.compile(r'\s(?:outputtemplate|inputtemplate)="([^"]*)"')
+
+def files(directory):
+    """Returns the names of all files in the directory and its subdirectories (relative to the directory), hidden files excepted"""
+    result = []
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames[:] = [ d for d in dirnames if d[0] != '.' ]
+        prefix = os.path.relpath(dirpath, directory)
+        for filename in filenames:
+            if filename[0] != '.':
+                result.append(filename if prefix == '.' else os.path.join(prefix, filename))
+    return result
+
+def template(directory, filename):
+    """Returns the ID of the input or output template of a file in the directory, as recorded in its metadata file (None if there is none). Only the attribute is looked up, the metadata is not parsed."""
+    dirname, basename = os.path.split(filename)
+    try:
+        with io.open(os.path.join(directory, dirname, '.' + basename + '.METADATA'),'r',encoding='utf-8') as f:
+            match = TEMPLATEMATCH.search(f.read())
+    except (IOError, OSError):
+        return None
+    return match.group(1) if match else None
+
+
+class Listing(object):
+    def __init__(self, offset=0, limit=0, sort='name', order='asc', prefix='', template=None, status=None): #pylint: disable=redefined-outer-name
+        """``limit`` is the maximum number of rows on the page, 0 for all"""
+        self.offset = offset
+        self.limit = limit
+        self.sort = sort
+        self.order = order
+        self.prefix = prefix
+        self.template = template
+        self.status = status
+        self.total = 0 #number of rows before filtering, set by apply()
+        self.filtered = 0 #number of rows after filtering, set by apply()
+
+    @staticmethod
+    def fromrequest(values, sortkeys, filterkeys, maxlimit=0):
+        """Returns the listing requested by the parameters in ``values`` (e.g. ``flask.request.values``), or None if none are given and there is no ``maxlimit``. ``sortkeys`` are the columns that can be sorted on, the first being the default, ``filterkeys`` the filters that can be applied (``filter``, ``template`` and/or ``status``). ``maxlimit`` is the maximum number of rows on a page (0 for no maximum). Raises ValueError on invalid parameters."""
+        if not any( values.get(key) for key in PARAMETERS ) and not maxlimit:
+            return None
+        for key in ('filter','template','status'):
+            if values.get(key) and key not in filterkeys:
+                raise ValueError("Can not filter on " + key + ", only on " + ", ".join(filterkeys))
+        offset = int(values.get('offset') or 0)
+        limit = int(values.get('limit') or 0)
+        if offset < 0 or limit < 0:
+            raise ValueError("Offset and limit must not be negative")
+        if maxlimit and (not limit or limit > maxlimit):
+            limit = maxlimit
+        sort = values.get('sort') or sortkeys[0]
+        if sort not in sortkeys:
+            raise ValueError("Can not sort on " + sort + ", only on " + ", ".join(sortkeys))
+        order = values.get('order') or 'asc'
+        if order not in ORDERS:
+            raise ValueError("Order must be asc or desc")
+        status = values.get('status')
+        if status:
+            if status.lower() in STATUSES:
+                status = STATUSES[status.lower()]
+            elif status.isdigit() and int(status) in STATUSES.values():
+                status = int(status)
+            else:
+                raise ValueError("No such status: " + status)
+        else:
+            status = None
+        return Listing(offset, limit, sort, order, values.get('filter') or '', values.get('template') or None, status)
+
+    def needs(self, column):
+        """Is the column needed to filter or sort the rows?"""
+        return self.sort == column or getattr(self, column, None) is not None
+
+    def apply(self, rows):
+        """Returns the page of the rows (dictionaries with at least a ``name``, and the columns filtered and sorted on). Sets ``total`` and ``filtered``."""
+        self.total = len(rows)
+        if self.prefix:
+            rows = [ row for row in rows if row['name'].startswith(self.prefix) ]
+        if self.template is not None:
+            rows = [ row for row in rows if row.get('template') == self.template ]
+        if self.status is not None:
+            rows = [ row for row in rows if row.get('status') == self.status ]
+        self.filtered = len(rows)
+        if self.sort == 'name':
+            rows = sorted(rows, key=lambda row: row['name'], reverse=self.order == 'desc')
+        else: #ties, and rows without a value, are ordered by name
+            rows = sorted(rows, key=lambda row: row['name'])
+            present = [ row for row in rows if row.get(self.sort) is not None ]
+            present.sort(key=lambda row: row[self.sort], reverse=self.order == 'desc')
+            rows = present + [ row for row in rows if row.get(self.sort) is None ] #last in either order
+        if self.limit:
+            return rows[self.offset:self.offset + self.limit]
+        return rows[self.offset:]
+
+    def attributes(self):
+        """Returns the listing as a dictionary for responses (the number of rows in total and after filtering, the offset and the limit)"""
+        return {'total': self.total, 'filtered': self.filtered, 'offset': self.offset, 'limit': self.limit}
@@ -0,0 +1,116 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Per-user project index --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""Index of the projects of a user (``ROOT/projects/<user>/.index``), for project listings and quota checks.
+
+The index holds one row per project: its name, date of last modification, size in MB and status (``clam.common.status``). It is built by scanning all projects only when there is no index yet; after that the row of a project is updated whenever the project is created, started, finished, changed or deleted, by the webservice as well as the dispatcher. A size of None means the size changed and is to be computed again when it is needed.
+
+Updates read, modify and rewrite the index while holding an exclusive lock on ``.index.lock``, and the new index replaces the old one by an atomic rename, so concurrent processes (e.g. uWSGI workers and dispatchers) neither lose updates nor read a partially written index."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import os
+import io
+import json
+import time
+import datetime
+import fcntl
+import threading
+from contextlib import contextmanager
+
+import clam.common.status
+
+#columns of a row, after the project name
+COLUMNS = ('date','size','status')
+
+def formatdate(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ProjectIndex(object):
+    def __init__(self, userdir):
+        self.filename = os.path.join(userdir, '.index')
+
+    def load(self):
+        """Returns the index as a dictionary with keys ``totalsize`` (MB) and ``projects`` (a list of [project, date, size, status] rows, ordered by project), or None if there is no valid index"""
+        try:
+            with io.open(self.filename,'r',encoding='utf-8') as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or not isinstance(data.get('projects'), list):
+            return None
+        return data
+
+    @contextmanager
+    def lock(self):
+        with open(self.filename + '.lock','a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def write(self, projects):
+        """Writes the index (to be called with the lock held), returns it"""
+        projects.sort(key=lambda row: row[0])
+        data = {'totalsize': sum( row[2] for row in projects if row[2] is not None ), 'projects': projects}
+        tmpfile = self.filename + '.' + str(os.getpid()) + '.' + str(threading.current_thread().ident)
+        with io.open(tmpfile,'w',encoding='utf-8') as f:
+            f.write(json.dumps(data, ensure_ascii=False))
+        os.rename(tmpfile, self.filename)
+        return data
+
+    def build(self, scan):
+        """Returns the index, building it first if there is none. ``scan`` is a function returning the rows of all projects of the user. The lock is held while scanning, so no update made in the meantime is lost."""
+        data = self.load()
+        if data is None:
+            with self.lock():
+                data = self.load() #may have been built by another process in the meantime
+                if data is None:
+                    data = self.write([ list(row) for row in scan() ])
+        return data
+
+    def update(self, project, touch=True, **fields):
+        """Updates the row of the project, or adds it. ``fields`` are the columns to set (date, size, status); the date defaults to now, unless ``touch`` is False. Does nothing if there is no index yet: it will be built from scratch when needed."""
+        for key in fields:
+            if key not in COLUMNS:
+                raise ValueError("No such column: " + key)
+        if not os.path.exists(self.filename):
+            return
+        if touch:
+            fields.setdefault('date', formatdate(time.time()))
+        with self.lock():
+            data = self.load()
+            if data is None:
+                return
+            for row in data['projects']:
+                if row[0] == project:
+                    break
+            else:
+                row = [project, fields.get('date', formatdate(time.time())), None, clam.common.status.READY]
+                data['projects'].append(row)
+            for key, value in fields.items():
+                row[COLUMNS.index(key) + 1] = round(value,2) if key == 'size' and value is not None else value
+            self.write(data['projects'])
+
+    def remove(self, project):
+        """Removes the row of the project"""
+        if not os.path.exists(self.filename):
+            return
+        with self.lock():
+            data = self.load()
+            if data is not None:
+                self.write([ row for row in data['projects'] if row[0] != project ])
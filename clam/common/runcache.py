@@ -0,0 +1,195 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Run cache --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""Content-addressed cache of the results of earlier runs.
+
+A run is identified by a hash over the contents and metadata of its input files, the parameter values, the matched profiles and the system version. When a project is started with a key that is in the cache, its output is populated from the cache (using hard links where possible) instead of running the system. Successful runs are stored in the cache by the dispatcher when they end.
+
+Each entry is a directory ``<cachedir>/<key[:2]>/<key>/`` holding a copy of the output directory and the status file. Entries are evicted in least-recently-used order once the cache exceeds its maximum size. Hit/miss statistics are kept in ``<cachedir>/stats.json``."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import os
+import io
+import json
+import shutil
+import hashlib
+import fcntl
+import stat
+from contextlib import contextmanager
+
+#file in the project directory holding the key of the current run, so the dispatcher knows where to store the results
+KEYFILE = '.runcachekey'
+
+def hashfile(filename, hasher=None):
+    if hasher is None:
+        hasher = hashlib.sha256()
+    with open(filename,'rb') as f:
+        while True:
+            data = f.read(65536)
+            if not data:
+                break
+            hasher.update(data)
+    return hasher
+
+def runkey(projectdir, parameters, profiles, version):
+    """Compute the cache key for a run of the project. ``parameters`` is a list of (id, value) tuples, ``profiles`` a list of the indices of the matched profiles."""
+    hasher = hashlib.sha256()
+    inputdir = os.path.join(projectdir, 'input')
+    for dirpath, dirnames, filenames in os.walk(inputdir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            #both the input files and their metadata (.*.METADATA) files are included
+            path = os.path.join(dirpath, filename)
+            hasher.update(os.path.relpath(path, inputdir).encode('utf-8') + b"\0")
+            hasher.update(hashfile(path).hexdigest().encode('ascii') + b"\0")
+    hasher.update(json.dumps(sorted([ (key, value) for key, value in parameters ], key=lambda x: x[0]), default=str).encode('utf-8') + b"\0")
+    hasher.update(json.dumps(sorted(profiles)).encode('utf-8') + b"\0")
+    hasher.update(str(version).encode('utf-8'))
+    return hasher.hexdigest()
+
+def linkorcopy(source, target):
+    try:
+        os.link(source, target)
+    except OSError: #different filesystem or no hard links supported
+        shutil.copy2(source, target)
+
+
+class RunCache(object):
+    def __init__(self, directory, maxsize=0):
+        """``maxsize`` is the maximum size in MB, 0 means unlimited"""
+        if directory[-1] != '/':
+            directory += '/'
+        self.directory = directory
+        self.maxsize = maxsize
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError: #may be created concurrently
+                if not os.path.isdir(directory):
+                    raise
+
+    @contextmanager
+    def lock(self):
+        with open(self.directory + '.lock','a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def path(self, key):
+        return self.directory + key[:2] + '/' + key + '/'
+
+    def count(self, counter, n=1):
+        """Increment a counter in the statistics, must be called with the cache locked"""
+        stats = self.readstats()
+        stats[counter] = stats.get(counter,0) + n
+        with io.open(self.directory + 'stats.json.tmp','w',encoding='utf-8') as f:
+            f.write(json.dumps(stats))
+        os.rename(self.directory + 'stats.json.tmp', self.directory + 'stats.json')
+
+    def readstats(self):
+        try:
+            with io.open(self.directory + 'stats.json','r',encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def retrieve(self, key, projectdir):
+        """Populate the output of the project from the cache, returns True on a hit and False on a miss"""
+        with self.lock():
+            entry = self.path(key)
+            if not os.path.isdir(entry + 'output'):
+                self.count('misses')
+                return False
+            outputdir = os.path.join(projectdir, 'output')
+            for dirpath, dirnames, filenames in os.walk(entry + 'output'):
+                targetdir = os.path.join(outputdir, os.path.relpath(dirpath, entry + 'output'))
+                if not os.path.isdir(targetdir):
+                    os.makedirs(targetdir)
+                for filename in filenames:
+                    target = os.path.join(targetdir, filename)
+                    if os.path.exists(target):
+                        os.unlink(target)
+                    linkorcopy(os.path.join(dirpath, filename), target)
+            if os.path.exists(entry + 'status'):
+                shutil.copyfile(entry + 'status', os.path.join(projectdir, '.status'))
+            os.utime(entry, None) #for least-recently-used eviction
+            self.count('hits')
+        return True
+
+    def store(self, key, projectdir):
+        """Store the output of a finished project in the cache, evicting old entries if the cache grows too big"""
+        entry = self.path(key)
+        if os.path.isdir(entry):
+            return False
+        tmpentry = self.directory + '.' + key + '.' + str(os.getpid())
+        shutil.copytree(os.path.join(projectdir, 'output'), tmpentry + '/output', ignore=shutil.ignore_patterns('error.log'))
+        if os.path.exists(os.path.join(projectdir, '.status')):
+            shutil.copyfile(os.path.join(projectdir, '.status'), tmpentry + '/status')
+        #entries are shared through hard links, protect them from being modified in place
+        for dirpath, _, filenames in os.walk(tmpentry):
+            for filename in filenames:
+                os.chmod(os.path.join(dirpath, filename), stat.S_IRUSR | stat.S_IRGRP)
+        with self.lock():
+            if not os.path.isdir(os.path.dirname(entry[:-1])):
+                os.makedirs(os.path.dirname(entry[:-1]))
+            if os.path.isdir(entry): #stored concurrently
+                shutil.rmtree(tmpentry)
+                return False
+            os.rename(tmpentry, entry)
+            self.count('stores')
+            if self.maxsize:
+                self.evict()
+        return True
+
+    def entries(self):
+        """Returns a list of (key, size in bytes, last used time) tuples"""
+        entries = []
+        for prefix in os.listdir(self.directory):
+            if len(prefix) != 2 or not os.path.isdir(self.directory + prefix):
+                continue
+            for key in os.listdir(self.directory + prefix):
+                entry = self.directory + prefix + '/' + key
+                size = 0
+                for dirpath, _, filenames in os.walk(entry):
+                    for filename in filenames:
+                        size += os.path.getsize(os.path.join(dirpath, filename))
+                entries.append( (key, size, os.path.getmtime(entry)) )
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits its maximum size, must be called with the cache locked"""
+        entries = sorted(self.entries(), key=lambda x: x[2])
+        total = sum( size for _, size, _ in entries )
+        while entries and total > self.maxsize * 1024 * 1024:
+            key, size, _ = entries.pop(0)
+            shutil.rmtree(self.path(key), ignore_errors=True)
+            total -= size
+            self.count('evictions')
+
+    def stats(self):
+        """Returns a dictionary with statistics: entries, size (MB), hits, misses, stores, evictions"""
+        entries = self.entries()
+        stats = self.readstats()
+        for counter in ('hits','misses','stores','evictions'):
+            stats.setdefault(counter, 0)
+        stats['entries'] = len(entries)
+        stats['size'] = round(sum( size for _, size, _ in entries ) / 1024 / 1024, 2)
+        stats['maxsize'] = self.maxsize
+        lookups = stats['hits'] + stats['misses']
+        stats['hitratio'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
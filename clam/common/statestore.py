@@ -0,0 +1,176 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Project state store --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""Indexed store of the state of all projects.
+
+Without it, the state of a project is derived from flag files in the project directory (``.queued``, ``.pid``, ``.done``, ``.aborted``, ``.du``) and listings from a per-user ``.index`` file, which takes several file system operations per project and request. The state store keeps the state, pid, exit code, timestamps and size of each project, by user, in a single SQLite database in WAL mode, so a status request or a listing is answered by one indexed lookup. It is updated by the webservice, the job queue and the dispatcher; the flag files are still written for tools that rely on them.
+
+SQLite relies on file locking, and WAL mode on shared memory: the database has to be on a local file system and all processes using it have to run on the same host."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import os
+import time
+import threading
+import sqlite3
+
+import clam.common.diskusage
+
+#project states
+READY = 'ready'
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+
+FIELDS = ('state','pid','exitcode','aborted','created','modified','started','finished','size')
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS projects (
+    user TEXT NOT NULL,
+    project TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'ready',
+    pid INTEGER NOT NULL DEFAULT 0,
+    exitcode INTEGER,
+    aborted INTEGER NOT NULL DEFAULT 0,
+    created REAL,
+    modified REAL,
+    started REAL,
+    finished REAL,
+    size REAL,
+    PRIMARY KEY (user, project)
+)"""
+
+def locate(projectdir):
+    """Returns a (user, project) tuple for a project directory (``.../projects/<user>/<project>/``), or None if the directory is not a project directory (e.g. an action job)"""
+    projectdir = projectdir.rstrip('/')
+    userdir = os.path.dirname(projectdir)
+    if os.path.basename(os.path.dirname(userdir)) != 'projects':
+        return None
+    return os.path.basename(userdir), os.path.basename(projectdir)
+
+def readstate(projectdir):
+    """Derives the state of a project from the flag files in its directory, returns a dictionary of fields"""
+    if projectdir[-1] != '/':
+        projectdir += '/'
+    fields = {'state': READY, 'pid': 0, 'exitcode': None, 'aborted': 0, 'created': os.path.getctime(projectdir), 'started': None, 'finished': None, 'size': None}
+    if os.path.exists(projectdir + '.done'):
+        fields['state'] = DONE
+        try:
+            with open(projectdir + '.done','r') as f:
+                fields['exitcode'] = int(f.read(1024) or 1)
+        except (IOError, OSError, ValueError):
+            fields['exitcode'] = 1
+        fields['finished'] = os.path.getmtime(projectdir + '.done')
+        fields['aborted'] = int(os.path.exists(projectdir + '.aborted'))
+    elif os.path.exists(projectdir + '.queued'):
+        fields['state'] = QUEUED
+    elif os.path.exists(projectdir + '.pid'):
+        fields['state'] = RUNNING
+        try:
+            with open(projectdir + '.pid','r') as f:
+                fields['pid'] = int(f.read().strip())
+        except (IOError, OSError, ValueError):
+            pass
+        fields['started'] = os.path.getmtime(projectdir + '.pid')
+    size = clam.common.diskusage.get(projectdir)
+    if size is not None:
+        fields['size'] = size
+    return fields
+
+
+class StateStore(object):
+    def __init__(self, filename):
+        self.filename = filename
+        self.local = threading.local()
+        directory = os.path.dirname(filename)
+        if directory and not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError: #may be created concurrently
+                if not os.path.isdir(directory):
+                    raise
+        self.connection().execute(SCHEMA)
+
+    def connection(self):
+        """Returns the database connection of this thread (connections are not shared between threads or forked processes)"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(self.filename, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def get(self, user, project):
+        """Returns the state of the project as a dictionary, or None if the project is unknown"""
+        row = self.connection().execute("SELECT * FROM projects WHERE user = ? AND project = ?", (user, project)).fetchone()
+        return dict(row) if row is not None else None
+
+    def set(self, user, project, unless=None, **fields):
+        """Updates the state of the project, adding it if it is unknown, but leaves it as it is if it is in the state ``unless``. Returns True if the project was updated"""
+        for key in fields:
+            if key not in FIELDS:
+                raise ValueError("No such field: " + key)
+        fields['modified'] = time.time()
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("INSERT OR IGNORE INTO projects (user, project, created) VALUES (?, ?, ?)", (user, project, fields.get('created', fields['modified'])))
+            if unless is None:
+                cursor = connection.execute("UPDATE projects SET " + ", ".join( key + " = ?" for key in fields ) + " WHERE user = ? AND project = ?", list(fields.values()) + [user, project])
+            else:
+                cursor = connection.execute("UPDATE projects SET " + ", ".join( key + " = ?" for key in fields ) + " WHERE user = ? AND project = ? AND (state IS NULL OR state != ?)", list(fields.values()) + [user, project, unless])
+            connection.execute("COMMIT")
+        except: #pylint: disable=bare-except
+            connection.execute("ROLLBACK")
+            raise
+        return cursor.rowcount > 0
+
+    def remove(self, user, project):
+        self.connection().execute("DELETE FROM projects WHERE user = ? AND project = ?", (user, project))
+
+    def projects(self, user):
+        """Returns the states of all projects of the user, ordered by project"""
+        return [ dict(row) for row in self.connection().execute("SELECT * FROM projects WHERE user = ? ORDER BY project", (user,)) ]
+
+    def users(self):
+        return [ row[0] for row in self.connection().execute("SELECT DISTINCT user FROM projects ORDER BY user") ]
+
+    def empty(self):
+        return self.connection().execute("SELECT 1 FROM projects LIMIT 1").fetchone() is None
+
+    def importproject(self, user, project, projectdir):
+        """Imports the state of an existing project from the flag files in its directory"""
+        self.set(user, project, **readstate(projectdir))
+
+    def importall(self, projectsdir, log=None):
+        """Imports the state of all projects in the projects directory (``ROOT/projects/``), returns the number of projects imported. Projects that no longer exist are removed from the store."""
+        count = 0
+        found = set()
+        for user in sorted(os.listdir(projectsdir)):
+            if not os.path.isdir(os.path.join(projectsdir, user)):
+                continue
+            for project in sorted(os.listdir(os.path.join(projectsdir, user))):
+                projectdir = os.path.join(projectsdir, user, project)
+                if project[0] != '.' and os.path.isdir(projectdir):
+                    self.importproject(user, project, projectdir)
+                    found.add( (user, project) )
+                    count += 1
+                    if log: log("Imported project " + user + "/" + project)
+        for row in self.connection().execute("SELECT user, project FROM projects").fetchall():
+            if (row[0], row[1]) not in found:
+                self.remove(row[0], row[1])
+        return count
@@ -1,6 +1,7 @@
 from __future__ import print_function, unicode_literals, division, absolute_import
 
 import io
+import os
 import time
 import sys
 
@@ -21,3 +22,11 @@ def write(statusfile, statusmessage, completion = 0, timestamp = False, encoding
         f.write(str(completion) + "%\t" + str(timestamp) + "\t" + statusmessage + "\n")
         f.close()
 
+
+
+def writedone(projectdir, exitcode):
+    """Marks the project as done with the given exit code. The ``.done`` file is written in full before it appears (atomic rename), so whoever notices it can read the exit code"""
+    tmpfile = projectdir + '.done.' + str(os.getpid())
+    with open(tmpfile,'w') as f:
+        f.write(str(exitcode))
+    os.rename(tmpfile, projectdir + '.done')
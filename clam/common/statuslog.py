@@ -0,0 +1,125 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Incremental status log parser --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""Parser for the ``.status`` file a wrapper script writes its progress to.
+
+The file is only ever appended to while the system runs, so rather than parsing it entirely on every status request, a ``StatusLog`` remembers how far it has read (keyed by the inode and size of the file) and only parses the lines appended since. As a file recreated after a reset may get the same inode back, the first bytes of the file are remembered as well and compared whenever the file changed. Only the ``maxentries`` most recent messages are kept."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import os
+import re
+import datetime
+import threading
+from collections import deque
+
+DATEMATCH = re.compile(r'^[\d\.\-\s:]*$')
+
+#number of bytes at the start of the file that identify it (the first line holds a timestamp)
+HEADSIZE = 64
+
+def parseline(line):
+    """Parses a line of the status file, returns a (message, timestamp, completion) tuple. Fields are separated by tabs, a field like ``50%`` is the completion and a numeric field a unix timestamp, all other fields make up the message."""
+    message = ""
+    completion = 0
+    timestamp = ""
+    for field in line.strip().split("\t"):
+        if field:
+            if field[-1] == '%' and field[:-1].isdigit():
+                completion = int(field[:-1])
+            elif DATEMATCH.match(field):
+                if field.isdigit():
+                    try:
+                        d = datetime.datetime.fromtimestamp(float(field))
+                        timestamp = d.strftime("%d/%b/%Y %H:%M:%S")
+                    except ValueError:
+                        pass
+            else:
+                message += " " + field
+    return message.strip(), timestamp, completion
+
+
+class StatusLog(object):
+    def __init__(self, filename, maxentries=1000):
+        """``maxentries`` is the number of most recent messages that is kept, 0 means all"""
+        self.filename = filename
+        self.maxentries = maxentries
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self, inode=None):
+        self.inode = inode #(device, inode) of the file
+        self.head = b"" #the first bytes of the file parsed so far (at most HEADSIZE)
+        self.signature = None #(size, modification time) of the file when last read
+        self.offset = 0 #bytes parsed so far, always at the start of a line
+        self.entries = deque(maxlen=self.maxentries or None) #(message, timestamp, completion), in chronological order
+        self.prevmsg = None
+        self.completion = 0
+
+    def readhead(self):
+        """Returns as many bytes from the start of the file as were remembered"""
+        try:
+            with open(self.filename,'rb') as f:
+                return f.read(len(self.head))
+        except (IOError, OSError):
+            return b""
+
+    def add(self, message, timestamp, completion):
+        if completion > 0:
+            self.completion = completion
+        if message and message != self.prevmsg: #repeated messages are only listed once
+            self.entries.append( (message, timestamp, completion) )
+            self.prevmsg = message
+
+    def read(self):
+        """Returns a (statuslog, completion) tuple, the status log being a list of (message, timestamp, completion) tuples with the most recent message first"""
+        try:
+            filestat = os.stat(self.filename)
+        except OSError:
+            return [], 0
+        inode = (filestat.st_dev, filestat.st_ino)
+        signature = (filestat.st_size, filestat.st_mtime)
+        with self.lock:
+            if inode != self.inode or filestat.st_size < self.offset: #a new file or a truncated one: start all over
+                self.clear(inode)
+            elif signature != self.signature and self.head and self.readhead() != self.head: #a new file with the inode of the old one
+                self.clear(inode)
+            self.signature = signature
+            pending = b""
+            if filestat.st_size > self.offset:
+                with open(self.filename,'rb') as f:
+                    f.seek(self.offset)
+                    data = f.read(filestat.st_size - self.offset)
+                end = data.rfind(b"\n") + 1
+                if len(self.head) < HEADSIZE:
+                    self.head += data[:min(end, HEADSIZE - len(self.head))]
+                for line in data[:end].split(b"\n"):
+                    if line.strip():
+                        self.add(*parseline(line.decode('utf-8', errors='replace')))
+                self.offset += end
+                pending = data[end:]
+            statuslog = list(self.entries)
+            completion = self.completion
+            if pending.strip():
+                #the last line may still be being written, it is included but not remembered
+                message, timestamp, linecompletion = parseline(pending.decode('utf-8', errors='replace'))
+                if linecompletion > 0:
+                    completion = linecompletion
+                if message and message != self.prevmsg:
+                    statuslog.append( (message, timestamp, linecompletion) )
+                    if self.maxentries and len(statuslog) > self.maxentries:
+                        del statuslog[0]
+        statuslog.reverse()
+        return statuslog, completion
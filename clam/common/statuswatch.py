@@ -0,0 +1,211 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Project status change notification --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Centre for Language and Speech Technology / Language Machines
+#       Radboud University Nijmegen
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+"""Notification of changes to the status of projects, for requests that wait for the status to change (server-sent events and long-polling) rather than having clients poll.
+
+The status of a project changes when the wrapper script appends to its status file or when the dispatcher or job queue writes one of the flag files (``.queued``, ``.pid``, ``.done``, ``.aborted``). On Linux these files are watched through inotify: a single thread per process reads the events of all watched project directories and wakes up the requests waiting for them. Elsewhere, or if a directory can not be watched (e.g. the inotify watch limit is reached), the files are checked with ``stat()`` every ``POLLINTERVAL`` seconds, which is still far cheaper than computing the status."""
+
+from __future__ import print_function, unicode_literals, division, absolute_import
+
+import os
+import sys
+import time
+import struct
+import threading
+import ctypes
+import ctypes.util
+
+#files in the project directory that reflect its status
+FILES = ('.status','.queued','.pid','.done','.aborted')
+
+#the status file proper, appended to by the wrapper script; the others are flag files
+STATUSFILE = '.status'
+
+#seconds between checks when files can not be watched
+POLLINTERVAL = 0.5
+
+#inotify events
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+
+EVENTHEADER = struct.Struct(str('iIII'))
+
+LIBC = None
+if sys.platform.startswith('linux'):
+    try:
+        LIBC = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        LIBC.inotify_init1 #pylint: disable=pointless-statement
+    except (OSError, AttributeError):
+        LIBC = None
+
+AVAILABLE = LIBC is not None #is inotify available?
+
+def signature(directory):
+    """Returns the size and modification time of the status files in the directory, any change of the status changes the signature"""
+    result = []
+    for filename in FILES:
+        try:
+            filestat = os.stat(os.path.join(directory, filename))
+            result.append( (filestat.st_size, filestat.st_mtime) )
+        except OSError:
+            result.append(None)
+    return tuple(result)
+
+
+class Watch(object):
+    """A watched project directory, use as a context manager. Typical use::
+
+        with watcher.watch(projectdir) as watch:
+            while True:
+                token = watch.token()
+                #... determine and report the status ...
+                watch.wait(token, timeout)
+    """
+
+    def __init__(self, watcher, directory):
+        self.watcher = watcher
+        self.directory = directory
+
+    def __enter__(self):
+        self.watcher.acquire(self.directory)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.watcher.release(self.directory)
+
+    @property
+    def watched(self):
+        """Is the directory watched through inotify? (otherwise it is polled)"""
+        with self.watcher.condition:
+            entry = self.watcher.watches.get(self.directory)
+            return entry is not None and entry[0] is not None
+
+    def token(self):
+        """Returns a token identifying the current state of the directory, to be passed to ``wait()``. Obtain it *before* determining the status so no change is missed."""
+        if self.watched:
+            with self.watcher.condition:
+                return self.watcher.generations.get(self.directory, 0)
+        return signature(self.directory) #a token of another kind than before counts as a change
+
+    def wait(self, token, timeout):
+        """Waits at most ``timeout`` seconds for a change since the token was obtained. Returns True if there was a change, False on time out."""
+        deadline = time.time() + timeout
+        if self.watched:
+            with self.watcher.condition:
+                while self.watcher.generations.get(self.directory, 0) == token and self.directory in self.watcher.watches and self.watcher.watches[self.directory][0] is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                    self.watcher.condition.wait(remaining)
+            return True
+        while signature(self.directory) == token:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(POLLINTERVAL, remaining))
+        return True
+
+
+class Watcher(object):
+    """Watches project directories for changes of the status, one instance per process"""
+
+    def __init__(self, inotify=True):
+        self.condition = threading.Condition()
+        self.generations = {} #directory => number of changes seen
+        self.watches = {} #directory => [watch descriptor or None, number of users]
+        self.directories = {} #watch descriptor => directory
+        self.fd = None
+        self.pid = os.getpid() #the thread reading events is not inherited by forked processes
+        if inotify and AVAILABLE:
+            fd = LIBC.inotify_init1(os.O_CLOEXEC)
+            if fd >= 0:
+                self.fd = fd
+                thread = threading.Thread(target=self.run)
+                thread.daemon = True
+                thread.start()
+
+    def watch(self, directory):
+        return Watch(self, directory.rstrip('/'))
+
+    def acquire(self, directory):
+        """Starts watching the directory (if not watched already), returns False if it can not be watched and has to be polled"""
+        with self.condition:
+            if directory in self.watches:
+                self.watches[directory][1] += 1
+            else:
+                wd = None
+                if self.fd is not None:
+                    wd = LIBC.inotify_add_watch(self.fd, os.fsencode(directory) if hasattr(os,'fsencode') else directory.encode('utf-8'), IN_MASK)
+                    if wd < 0:
+                        wd = None
+                    else:
+                        self.directories[wd] = directory
+                self.watches[directory] = [wd, 1]
+                self.generations.setdefault(directory, 0)
+            return self.watches[directory][0] is not None
+
+    def release(self, directory):
+        with self.condition:
+            entry = self.watches.get(directory)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self.watches[directory]
+                self.generations.pop(directory, None)
+                if entry[0] is not None:
+                    self.directories.pop(entry[0], None)
+                    LIBC.inotify_rm_watch(self.fd, entry[0])
+
+    def run(self):
+        """Reads inotify events and wakes up the waiting requests (runs in a thread)"""
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError:
+                break
+            changed = set()
+            offset = 0
+            while offset + EVENTHEADER.size <= len(data):
+                wd, mask, _, length = EVENTHEADER.unpack_from(data, offset)
+                name = data[offset + EVENTHEADER.size:offset + EVENTHEADER.size + length].rstrip(b"\0").decode('utf-8','replace')
+                offset += EVENTHEADER.size + length
+                if mask & IN_IGNORED: #the watch is gone (e.g. the directory was removed), poll from now on
+                    with self.condition:
+                        directory = self.directories.pop(wd, None)
+                        if directory is not None and directory in self.watches:
+                            self.watches[directory][0] = None
+                    changed.add(wd)
+                elif mask & IN_DELETE_SELF or name == STATUSFILE:
+                    changed.add(wd)
+                elif name in FILES and mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE):
+                    #flag files count once written in full (or removed), not when created: the content (e.g. the exit code in .done) may not be there yet
+                    changed.add(wd)
+            if changed:
+                with self.condition:
+                    for wd in changed:
+                        directory = self.directories.get(wd)
+                        if directory is not None:
+                            self.generations[directory] += 1
+                    self.condition.notify_all()
@@ -28,6 +28,7 @@ from clam.common.viewers import *
 from clam.common.data import *
 from clam.common.digestauth import pwhash
 import sys
+import time
 
 REQUIRE_VERSION = "0.99"
 
@@ -125,15 +126,34 @@ PARAMETERS =  []
 
 def multiply(x,y):
     return x * y
+
+def slowmultiply(x,y):
+    time.sleep(2)
+    return x * y
 # ======== ACTIONS ===========
 
 ACTIONS = [
     Action(id="uppercase",name="Uppercaser",description="Convert a string to upper case", tmpdir=True, command="echo $text$ | tr '[:lower:]' '[:upper:]'", parameters=[
             StringParameter(id="text", name="Text", required=True),
     ]),
+    Action(id="slowuppercase",name="Slow uppercaser",description="Convert a string to upper case, slowly, in the background", background=True, command="sleep 1 && echo $text$ | tr '[:lower:]' '[:upper:]'", parameters=[
+            StringParameter(id="text", name="Text", required=True),
+    ]),
+    Action(id="count",name="Counter",description="Count up to a number, streaming the output", stream=True, command="seq 1 $n$", parameters=[
+            IntegerParameter(id="n", name="Number", required=True),
+    ]),
+    Action(id="failcount",name="Failing counter",description="Fail before producing any output, streaming", stream=True, command="exit 3", parameters=[]),
     Action(id="multiply",name="Multiplier",description="Multiply two numbers", function=multiply, parameters=[
             IntegerParameter(id="x", name="First value", required=True),
             IntegerParameter(id="y", name="Second value", required=True)
+    ]),
+    Action(id="poolmultiply",name="Pooled multiplier",description="Multiply two numbers, in the process pool", function=multiply, pool=True, timeout=1, parameters=[
+            IntegerParameter(id="x", name="First value", required=True),
+            IntegerParameter(id="y", name="Second value", required=True)
+    ]),
+    Action(id="slowpoolmultiply",name="Slow pooled multiplier",description="Multiply two numbers, in the process pool, too slowly", function=slowmultiply, pool=True, timeout=1, parameters=[
+            IntegerParameter(id="x", name="First value", required=True),
+            IntegerParameter(id="y", name="Second value", required=True)
     ])
 ]
 
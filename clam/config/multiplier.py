@@ -126,12 +126,21 @@ PARAMETERS =  []
 def multiply(x,y):
     return x * y
 
+def multiplybatch(calls):
+    #receives the arguments of many concurrent calls at once, a model would process them as a single batch here
+    return [ x * y for x, y in calls ]
+
 # ======== ACTIONS ===========
 
 ACTIONS = [
     Action(id="multiply",name="Multiplier",description="Multiply two numbers", function=multiply, parameters=[
             IntegerParameter(id="x", name="First value", required=True),
             IntegerParameter(id="y", name="Second value", required=True)
+    ]),
+    #concurrent calls are collected in batches of up to 64 calls, waiting at most 5ms for a batch to fill
+    Action(id="multiplybatch",name="Batch multiplier",description="Multiply two numbers, concurrent calls are processed in batches", batchfunction=multiplybatch, batchsize=64, batchwait=0.005, parameters=[
+            IntegerParameter(id="x", name="First value", required=True),
+            IntegerParameter(id="y", name="Second value", required=True)
     ])
 ]
 
@@ -105,9 +105,28 @@ MAXLOADAVG = 4.0
 DISK = '/dev/sda1' #set this to the disk where ROOT is on
 MINDISKSPACE = 10
 
+#Maximum number of projects that may run simultaneously, further projects are queued and started when a slot frees up (the queue persists across restarts of the service). Set to 0 for no limit (default)
+#MAXJOBS = 0
+
+#Total number of CPU cores and memory (in MB) available to running projects. Projects claim cores/memory as declared on their profile (Profile(..., cores=2, memory=4096)) and are queued until enough is free. Set to 0 for no limit (default)
+#MAXCORES = 0
+#MAXMEMORY = 0
+
+#Number of sub-jobs to run in parallel for profiles with fanout=True (Profile(..., fanout=True)), defaults to the number of CPU cores
+#FANOUT_WIDTH = 4
+
 #The amount of diskspace a user may use (in MB), this is a soft quota which can be exceeded, but creation of new projects is blocked until usage drops below the quota again
 #USERQUOTA = 100
 
+#The disk usage of projects is kept up to date as files are added and removed, and determined anew after every run. Every so many seconds it is determined anew for all projects to correct any drift (e.g. after files were changed outside of CLAM), set to 0 to disable
+#DISKUSAGE_RECONCILE = 86400
+
+#Maximum number of projects, input files and output files listed in a response, clients request the others page by page (?offset=&limit=). Set this for services whose projects hold many thousands of files. 0 for no maximum (default)
+#LISTLIMIT = 1000
+
+#Number of seconds browsers may cache the data and style sheet of the web interface (data.js, style.css) without asking again; both are rendered once at startup and served with entity tags (default: 3600)
+#STATIC_MAXAGE = 3600
+
 #The secret key is used internally for cryptographically signing session data, in production environments, you'll want to set this to a persistent value. If not set it will be randomly generated.
 #SECRET_KEY = 'mysecret'
 
@@ -226,8 +245,39 @@ PARAMETERS =  [
 ACTIONS = [
     #Action(id='multiply',name='Multiply',parameters=[IntegerParameter(id='x',name='Value'),IntegerParameter(id='y',name='Multiplier'), command=sys.path[0] + "/actions/multiply.sh $PARAMETERS" ])
     #Action(id='multiply',name='Multiply',parameters=[IntegerParameter(id='x',name='Value'),IntegerParameter(id='y',name='Multiplier'), function=lambda x,y: x*y ])
+    #Slow commands can run in the background, the request returns a job URL (HTTP 202) from which the result can be obtained later:
+    #Action(id='tag',name='Tag',parameters=[StringParameter(id='text',name='Text')], command=sys.path[0] + "/actions/tag.sh $PARAMETERS", background=True)
+    #Functions that process many inputs at once (e.g. a model) can receive concurrent requests in batches of up to batchsize calls, collected for at most batchwait seconds. The function takes a list of argument tuples and returns a list of results:
+    #Action(id='multiply',name='Multiply',parameters=[IntegerParameter(id='x',name='Value'),IntegerParameter(id='y',name='Multiplier'), batchfunction=lambda calls: [ x*y for x,y in calls ], batchsize=32, batchwait=0.01 ])
+    #CPU-heavy functions can be called in a pool of worker processes rather than in the thread handling the request, optionally with a timeout in seconds (HTTP 504 when exceeded). The function is looked up in this configuration by each worker, its arguments and result must be picklable:
+    #Action(id='multiply',name='Multiply',parameters=[IntegerParameter(id='x',name='Value'),IntegerParameter(id='y',name='Multiplier'), function=lambda x,y: x*y, pool=True, timeout=30 ])
+    #Commands with large output can stream it to the client while they run, rather than when they finish:
+    #Action(id='query',name='Query',parameters=[StringParameter(id='query',name='Query')], command=sys.path[0] + "/actions/query.sh $PARAMETERS", stream=True)
+    #Results of actions that depend only on their parameters can be cached, at most cachesize results for cachettl seconds each:
+    #Action(id='lemma',name='Lemmatise',parameters=[StringParameter(id='word',name='Word')], command=sys.path[0] + "/actions/lemma.sh $PARAMETERS", cache=True, cachesize=10000, cachettl=86400)
 ]
 
+#Results of background actions are kept for this many seconds after the job finished
+#ACTIONJOB_TTL = 3600
+#Maximum number of seconds a request for the result of a background action may wait for it (?wait=)
+#ACTIONJOB_MAXWAIT = 60
+#Number of worker processes for actions with pool=True (defaults to the number of CPU cores)
+#ACTIONPOOL_WORKERS = 4
+#Number of calls that may wait for a free worker, further calls are refused with HTTP 503
+#ACTIONPOOL_MAXQUEUE = 16
+#Seconds clients are told to wait (Retry-After) before retrying a call refused because the pool was full
+#ACTIONPOOL_RETRYAFTER = 5
+#Directory in which cached action results are also stored, so that all processes of the webservice share them (by default they are cached in the memory of each process only)
+#ACTIONCACHEDIR = ROOT + "actioncache/"
+#Action commands are run by the webservice itself rather than through the dispatcher when no DISPATCHER_MAX* limits are set and REMOTEHOST is not used; set to False to always use the dispatcher
+#ACTION_DIRECT = True
+#Number of items of a batch request (POST /actions/<id>/batch) that are performed at the same time (defaults to the number of CPU cores)
+#ACTIONBATCH_PARALLEL = 4
+#Maximum number of items in a batch request
+#ACTIONBATCH_MAXITEMS = 10000
+#Number of temporary directories for actions that each process keeps ready
+#ACTION_TMPDIRPOOL = 8
+
 
 # ======== DISPATCHING (ADVANCED! YOU CAN SAFELY SKIP THIS!) ========
 
@@ -237,8 +287,52 @@ ACTIONS = [
 #DISPATCHER_POLLINTERVAL = 30   #interval at which the dispatcher polls for resource consumption (default: 30 secs)
 #DISPATCHER_MAXRESMEM = 0    #maximum consumption of resident memory (in megabytes), processes that exceed this will be automatically aborted. (0 = unlimited, default)
 #DISPATCHER_MAXTIME = 0      #maximum number of seconds a process may run, it will be aborted if this duration is exceeded.   (0=unlimited, default)
+#DISPATCHER_MAXCPUTIME = 0   #maximum number of CPU seconds a process may consume, enforced by the kernel, exceeding it gives exit code 3 (0=unlimited, default)
+#DISPATCHER_MAXVIRTMEM = 0   #maximum virtual memory (address space) per process in megabytes, enforced by the kernel; allocations beyond it fail (0=unlimited, default)
+#DISPATCHER_CGROUP = None    #cgroup (v2) directory delegated to CLAM, each process gets a sub-group there in which DISPATCHER_MAXRESMEM is enforced by the kernel for the entire process tree (None = autodetect, False = disable)
 #DISPATCHER_PYTHONPATH = []        #list of extra directories to add to the python path prior to launch of dispatcher
 
+#Cache the results of runs, so a project with exactly the same input files, metadata and parameters as an earlier run
+#gets its output straight from the cache instead of running the system again. Only enable this if your system is
+#deterministic, and increase SYSTEM_VERSION whenever its behaviour changes.
+#RUNCACHE = False
+#RUNCACHEDIR = ROOT + 'runcache/'
+#RUNCACHE_MAXSIZE = 1024 #maximum size in MB, least recently used results are removed first
+
+#Resources used by runs (time, CPU, memory, I/O, processes) are logged here and summarised on the administrative interface (None to disable)
+#RESOURCELOG = ROOT + 'resources.log'
+#RESOURCELOG_WINDOW = 1000 #number of most recent runs that are summarised
+
+#Incremental runs: when the output of a project is reset after a successful run, it is set aside and the next run keeps
+#the output files whose input files and parameters are unchanged; only the rest is listed in the program passed to
+#the wrapper. Requires a wrapper that iterates over the program rather than over all input files.
+#INCREMENTAL = False
+
+#Projects are started by a resident launcher process that the service starts at boot, it runs the dispatcher in a forked
+#process rather than by starting a shell and a new interpreter for every project. Disable it if you run the dispatcher yourself.
+#LAUNCHER = True
+#LAUNCHER_SOCKET = ROOT + 'launcher.sock'
+
+#Instead of running COMMAND, projects can be run by a Python function in a pool of long-lived worker processes.
+#The function is called with the CLAMData instance, the status file and the output directory. The optional preload hook
+#is called once before the workers are forked, use it to load models and other expensive resources in memory.
+#COMMAND is still used as a fallback if the worker pool can not be reached.
+#WORKER_ENTRYPOINT = mywrapper.run     #function(clamdata, statusfile, outputdir)
+#WORKER_PRELOAD = mywrapper.loadmodel  #function()
+#WORKERS = 1                           #number of worker processes
+#WORKER_SOCKET = ROOT + 'workers.sock' #socket the worker pool listens on
+
+#Keep the state of all projects in an indexed SQLite database rather than deriving it from flag files in every project
+#directory, this makes status requests and project listings considerably cheaper. The database must be on a local file
+#system; the state store is not used with REMOTEHOST. Existing projects are imported when the database is created
+#(or run: clamstatedb yourservice.settings)
+#STATEDB = ROOT + 'state.sqlite3'
+
+#Number of most recent messages from the status file of a project that are reported in its status (0 for all)
+#STATUSLOG_MAXENTRIES = 1000
+#Maximum number of seconds a request for the status of a project may be held waiting for the status to change (?since=)
+#STATUS_MAXWAIT = 30
+
 #Run background process on a remote host? Then set the following (leave the lambda in):
 #REMOTEHOST = lambda: return 'some.remote.host'
 #REMOTEUSER = 'username'
@@ -11,7 +11,7 @@
  ***********************************************************/
 
 /*eslint-env browser,jquery */
-/*global stage,progress:true,user,accesstoken,oauth_access_token, preselectinputtemplate,baseurl,project, inputtemplates,parametersxsl:true, tableinputfiles:true */
+/*global stage,progress:true,user,accesstoken,oauth_access_token, preselectinputtemplate,baseurl,project, inputtemplates,parametersxsl:true, tableinputfiles:true, tableprojects:true */
 //global but not used: systemid
 /*eslint-disable quotes, no-alert,complexity,curly,eqeqeq */
 
@@ -120,15 +120,6 @@ function renderfileparameters(id, target, enableconverters, parametersxmloverrid
 
 
 function deleteinputfile(filename) {   //eslint-disable-line no-unused-vars
-    var found = -1;
-    var data = tableinputfiles.fnGetData();
-    for (var i = 0; i < data.length; i++) {
-        if (data[i][0].match('>' + filename + '<') !== null) {
-            found = i;
-            break;
-        }
-    }
-    if (found >= 0) tableinputfiles.fnDeleteRow(found);
     $.ajax({
         type: "DELETE",
         beforeSend: oauthheader,
@@ -137,10 +128,95 @@ function deleteinputfile(filename) {   //eslint-disable-line no-unused-vars
           withCredentials: true
         },
         url: baseurl + '/' + project + "/input/" + filename,
-        dataType: "xml"
+        dataType: "text",
+        complete: function() {
+            tableinputfiles.fnDraw(); /* fetches the page anew */
+        }
     });
 }
 
+function withtoken(url) {
+    if (oauth_access_token !== "") {
+        return url + '?oauth_access_token=' + oauth_access_token;
+    }
+    return url;
+}
+
+function escapehtml(s) {
+    return String(s).replace(/&/g,'&amp;').replace(/</g,'&lt;').replace(/>/g,'&gt;').replace(/"/g,'&quot;').replace(/'/g,'&#39;');
+}
+
+function serverlisting(url, list, sortkeys, renderrow) {
+    /* DataTables server-side processing: the service sends only the page that is shown (filtered on a name prefix and sorted), rather than all rows at once */
+    return function(source, aoData, callback) {
+        var request = {};
+        for (var i = 0; i < aoData.length; i++) {
+            request[aoData[i].name] = aoData[i].value;
+        }
+        $.ajax({
+            type: 'GET',
+            url: url,
+            beforeSend: oauthheader,
+            crossDomain: true,
+            xhrFields: {
+              withCredentials: true
+            },
+            dataType: 'json',
+            data: {
+                list: list,
+                offset: request.iDisplayStart,
+                limit: (request.iDisplayLength > 0) ? request.iDisplayLength : 0,
+                filter: request.sSearch || "",
+                sort: sortkeys[request.iSortCol_0] || sortkeys[0],
+                order: request.sSortDir_0 || 'asc'
+            },
+            success: function(response) {
+                var rows = [];
+                for (var j = 0; j < response.items.length; j++) {
+                    rows.push(renderrow(response.items[j]));
+                }
+                callback({sEcho: request.sEcho, iTotalRecords: response.total, iTotalDisplayRecords: response.filtered, aaData: rows});
+            },
+            error: function(response) {
+                alert("Unable to obtain the listing (" + response.status + ")");
+            }
+        });
+    };
+}
+
+function renderinputfile(file) {
+    return [ '<a href="' + escapehtml(withtoken(file.url)) + '">' + escapehtml(file.name) + '</a>', escapehtml(file.label), escapehtml(file.format),
+             '<img src="' + baseurl + '/static/delete.png" title="Delete this file" onclick="deleteinputfile(\'' + escapehtml(file.name) + '\');" />' ];
+}
+
+function renderoutputfile(file) {
+    var links = "";
+    for (var i = 0; i < file.viewers.length; i++) {
+        links += '<a href="' + escapehtml(withtoken(file.viewers[i].url)) + '">' + escapehtml(file.viewers[i].name) + '</a> | ';
+    }
+    links += '<a href="' + escapehtml(withtoken(file.url)) + '">Download</a>';
+    if (file.template) {
+        links += ' | <a href="' + escapehtml(withtoken(file.url + '/metadata')) + '">Metadata</a>';
+    }
+    var href = (file.viewers.length > 0) ? file.viewers[0].url : file.url;
+    return [ '<a href="' + escapehtml(withtoken(href)) + '">' + escapehtml(file.name) + '</a>', escapehtml(file.label), escapehtml(file.format), links ];
+}
+
+var quickdeletevisible = false;
+
+function renderproject(p) {
+    var status = "";
+    if (p.status === 0) {
+        status = '<span class="staging">staging</span>';
+    } else if (p.status === 1) {
+        status = '<span class="running">running</span>';
+    } else if (p.status === 2) {
+        status = '<span class="done">done</span>';
+    }
+    return [ '<a href="' + escapehtml(withtoken(p.url + '/')) + '">' + escapehtml(p.name) + '</a> <button class="quickdelete" onclick="quickdelete(\'' + escapehtml(p.name) + '\');"' + (quickdeletevisible ? ' style="display: inline"' : '') + '>Delete</button>',
+             status, p.size + ' MB', escapehtml(p.date) ];
+}
+
 function setinputsource(tempelement) { //eslint-disable-line no-unused-vars
     var src = tempelement.value;
     $('#usecorpus').val(src);
@@ -162,7 +238,59 @@ function setlocalinputsource(selector, target) {//eslint-disable-line no-unused-
     }
 }
 
+var statusversion = ""; /* version of the status last received */
+
+function renderstatus(response) {
+    if (response.statuscode !== 1) {
+        if (oauth_access_token !== "") {
+          window.location.href = baseurl + '/' + project + '/?oauth_access_token=' + oauth_access_token; /* refresh */
+        } else {
+          window.location.href = baseurl + '/' + project + '/'; /* refresh */
+        }
+        return false;
+    }
+    if (response.completion > 0) {
+        progress = response.completion;
+        $('#progressbar').progressbar( "option", "value", progress );
+    }
+    var statuslogcontent = "";
+    for (var i = 0; i < response.statuslog.length - 1; i++) {
+        var msg = response.statuslog[i][0];
+        var t = response.statuslog[i][1];
+        statuslogcontent += '<tr><td class="time">' + t + '</td><td class="message">' + msg + '</td></tr>';
+    }
+    $('#statuslogtable').html(statuslogcontent);
+    return true;
+}
+
+function watchstatus() {
+    /* the service pushes every change of the status (server-sent events), fall back to long-polling if that is not possible */
+    if (typeof(EventSource) === "undefined") {
+        pollstatus();
+        return;
+    }
+    var source = new EventSource(baseurl + '/' + project + '/status/events?accesstoken=' + encodeURIComponent(accesstoken) + '&user=' + encodeURIComponent(user), { withCredentials: true });
+    var received = false;
+    source.addEventListener('status', function(e) {
+        var response = JSON.parse(e.data);
+        received = true;
+        statusversion = response.version;
+        if (!renderstatus(response)) {
+            source.close();
+        }
+    });
+    source.onerror = function() {
+        if (!received) {
+            /* events do not get through (e.g. buffered by a proxy) */
+            source.close();
+            pollstatus();
+        }
+        /* otherwise the browser reconnects by itself */
+    };
+}
+
 function pollstatus() {
+    /* long-polling: the service holds the request until the status differs from the version we have */
     $.ajax({
         type: 'GET',
         url: baseurl + '/' + project + "/status/",
@@ -172,28 +300,12 @@ function pollstatus() {
           withCredentials: true
         },
         dataType: 'json',
-        data: {accesstoken: accesstoken, user: user},
+        data: {accesstoken: accesstoken, user: user, since: statusversion},
         success: function(response){
-                if (response.statuscode !== 1) {
-                    if (oauth_access_token !== "") {
-                      window.location.href = baseurl + '/' + project + '/?oauth_access_token=' + oauth_access_token; /* refresh */
-                    } else {
-                      window.location.href = baseurl + '/' + project + '/'; /* refresh */
-                    }
-                } else {
-                    if (response.completion > 0) {
-                        progress = response.completion;
-                        $('#progressbar').progressbar( "option", "value", progress );
-                    }
-                    var statuslogcontent = "";
-                    for (var i = 0; i < response.statuslog.length - 1; i++) {
-                        var msg = response.statuslog[i][0];
-                        var t = response.statuslog[i][1];
-                        statuslogcontent += '<tr><td class="time">' + t + '</td><td class="message">' + msg + '</td></tr>';
-                    }
-                    $('#statuslogtable').html(statuslogcontent);
+                if (renderstatus(response)) {
+                    setTimeout(pollstatus, (response.version && response.version !== statusversion) ? 0 : 2000);
+                    statusversion = response.version || "";
                 }
-                setTimeout(pollstatus,2000);
         },
         error: function(response,errortype){ //eslint-disable-line no-unused-vars
             alert("Error obtaining status");
@@ -208,6 +320,8 @@ function processuploadresponse(response, paramdiv) {
       //Clear all previous errors
       $(paramdiv).find('div.error').each(function(){ $(this).html(''); });
 
+      var added = false;
+
       $(response).find('upload').each(function(){       //for each uploaded file
         //var children = $(this).children();
         var inputtemplate = $(this).attr('inputtemplate');
@@ -257,20 +371,7 @@ function processuploadresponse(response, paramdiv) {
         if (!errors) {
 
 
-            //Check if file already exists in input table
-            var found = false;
-            var data = tableinputfiles.fnGetData();
-            for (var i = 0; i < data.length; i++) {
-                if (data[i][0].match('>' + $(this).attr('name') + '<') !== null) {
-                    found = true;
-                    break;
-                }
-            }
-
-            //Add this file to the input table if it doesn't exist yet
-            if (!found) {
-                tableinputfiles.fnAddData( [  '<a href="' + baseurl + '/' + project + '/input/' + $(this).attr('filename') + '">' + $(this).attr('filename') + '</a>', $(this).attr('templatelabel'), $(this).attr('format') ,'<img src="' + baseurl + '/static/delete.png" title="Delete this file" onclick="deleteinputfile(\'' + $(this).attr('filename') + '\');" />' ] );
-            }
+            added = true;
 
         }
 
@@ -286,10 +387,16 @@ function processuploadresponse(response, paramdiv) {
             alert("The file you uploaded did not validate, it's probably not of the type you specified");
         }*/
     });
+
+    //Show the added files in the input table (fetches the page anew)
+    if ((added) && (typeof(tableinputfiles) !== 'undefined')) {
+        tableinputfiles.fnDraw();
+    }
 }
 
 
 function showquickdelete() {//eslint-disable-line no-unused-vars
+    quickdeletevisible = true;
     $('.quickdelete').show();
 }
 
@@ -304,8 +411,7 @@ function quickdelete(projectname) {//eslint-disable-line no-unused-vars
             withCredentials: true
         },
         success: function(){
-            $('#projectrow_' + projectname).hide();
-            $('#projects_info').html("Deleted project " + projectname);
+            tableprojects.fnDraw(); /* fetches the page anew */
             $('.diskusage span').html("(Reload page to see total disk use)");
         }});
 }
@@ -453,7 +559,7 @@ function initclam() { //eslint-disable-line no-unused-vars, complexity
        });
       if (stage === 1) {
             $('#progressbar').progressbar({value: progress});
-            setTimeout(pollstatus,2000);
+            watchstatus();
        }
     }
 
@@ -611,20 +717,36 @@ function initclam() { //eslint-disable-line no-unused-vars, complexity
     });
    }
 
-   //Tables for input files and output files
-   tableinputfiles = $('#inputfiles').dataTable( {
+   //Tables for input files, output files and projects, the rows are requested page by page
+   if ($('#inputfiles').length) {
+       tableinputfiles = $('#inputfiles').dataTable( {
                                 "bJQueryUI": false,
-                                "sPaginationType": "full_numbers"
+                                "sPaginationType": "full_numbers",
+                                "bServerSide": true,
+                                "sAjaxSource": baseurl + '/' + project + '/',
+                                "fnServerData": serverlisting(baseurl + '/' + project + '/', 'input', ['name','template'], renderinputfile),
+                                "aoColumns": [ null, null, { "bSortable": false }, { "bSortable": false } ]
                          });
-
-   $('#outputfiles').dataTable( {
+   }
+   if ($('#outputfiles').length) {
+       $('#outputfiles').dataTable( {
                 "bJQueryUI": false,
-                "sPaginationType": "full_numbers"
+                "sPaginationType": "full_numbers",
+                "bServerSide": true,
+                "sAjaxSource": baseurl + '/' + project + '/',
+                "fnServerData": serverlisting(baseurl + '/' + project + '/', 'output', ['name','template'], renderoutputfile),
+                "aoColumns": [ null, null, { "bSortable": false }, { "bSortable": false } ]
             });
-   $('#projects').dataTable( {
+   }
+   if ($('#projects').length) {
+       tableprojects = $('#projects').dataTable( {
                 "bJQueryUI": false,
-                "sPaginationType": "full_numbers"
+                "sPaginationType": "full_numbers",
+                "bServerSide": true,
+                "sAjaxSource": baseurl + '/',
+                "fnServerData": serverlisting(baseurl + '/', 'projects', ['name','status','size','date'], renderproject)
             });
+   }
 
 
 
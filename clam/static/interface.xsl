@@ -413,7 +413,7 @@
                 </tr>
             </thead>
             <tbody>
-                <xsl:apply-templates select="file" />
+                <!-- rows are requested page by page (clam.js) -->
             </tbody>
         </table>
         </div>
@@ -442,56 +442,12 @@
                 </tr>
             </thead>
             <tbody>
-                <xsl:apply-templates select="file" />
+                <!-- rows are requested page by page (clam.js) -->
             </tbody>
         </table>
     </div>
 </xsl:template>
 
-<xsl:template match="/clam/input/file">
-    <tr>
-      <td class="file"><a><xsl:attribute name="href"><xsl:value-of select="@xlink:href"/><xsl:if test="/clam/@oauth_access_token != ''">?oauth_access_token=<xsl:value-of select="/clam/@oauth_access_token"/></xsl:if></xsl:attribute><xsl:value-of select="./name"/></a></td>
-        <xsl:variable name="template" select="@template" />
-        <td><xsl:value-of select="/clam/profiles/profile/input/InputTemplate[@id = $template]/@label"/></td>
-        <td><xsl:value-of select="/clam/profiles/profile/input/InputTemplate[@id = $template]/@format"/></td>
-        <td class="actions"><img src="{/clam/@baseurl}/static/delete.png" title="Delete this file">
-            <xsl:attribute name="onclick">deleteinputfile('<xsl:value-of select="./name"/>');</xsl:attribute>
-        </img></td>
-    </tr>
-</xsl:template>
-
-
-<xsl:template match="/clam/output/file">
-    <tr>
-
-        <td class="file">
-        <xsl:choose>
-        <xsl:when test="./viewers/viewer[1]">
-            <a><xsl:attribute name="href"><xsl:value-of select="./viewers/viewer[1]/@xlink:href" /><xsl:if test="/clam/@oauth_access_token != ''">?oauth_access_token=<xsl:value-of select="/clam/@oauth_access_token"/></xsl:if></xsl:attribute><xsl:value-of select="./name"/></a>
-        </xsl:when>
-        <xsl:otherwise>
-            <a><xsl:attribute name="href"><xsl:value-of select="@xlink:href" /><xsl:if test="/clam/@oauth_access_token != ''">?oauth_access_token=<xsl:value-of select="/clam/@oauth_access_token"/></xsl:if></xsl:attribute><xsl:value-of select="./name"/></a>
-        </xsl:otherwise>
-        </xsl:choose>
-        </td>
-
-        <xsl:variable name="template" select="@template" />
-        <td><xsl:value-of select="//OutputTemplate[@id = $template]/@label"/></td>
-        <td><xsl:value-of select="//OutputTemplate[@id = $template]/@format"/></td>
-
-        <td>
-            <xsl:for-each select="./viewers/viewer">
-                <a><xsl:attribute name="href"><xsl:value-of select="@xlink:href" /><xsl:if test="/clam/@oauth_access_token != ''">?oauth_access_token=<xsl:value-of select="/clam/@oauth_access_token"/></xsl:if></xsl:attribute><xsl:value-of select="." /></a><xsl:text> | </xsl:text>
-            </xsl:for-each>
-            <a><xsl:attribute name="href"><xsl:value-of select="@xlink:href" /><xsl:if test="/clam/@oauth_access_token != ''">?oauth_access_token=<xsl:value-of select="/clam/@oauth_access_token"/></xsl:if></xsl:attribute>Download</a>
-            <xsl:if test="@template">
-                <xsl:text> | </xsl:text>
-                <a><xsl:attribute name="href"><xsl:value-of select="@xlink:href" />/metadata<xsl:if test="/clam/@oauth_access_token != ''">?oauth_access_token=<xsl:value-of select="/clam/@oauth_access_token"/></xsl:if></xsl:attribute>Metadata</a>
-            </xsl:if>
-        </td>
-    </tr>
-</xsl:template>
-
 <xsl:template match="/clam/parameters">
     <form method="POST" enctype="multipart/form-data" action="">
     <div id="parameters" class="box parameters">
@@ -623,35 +579,7 @@
               <tr><th style="width: 50%;">Project ID</th><th>Status</th><th>Size</th><th>Last changed</th></tr>
           </thead>
           <tbody>
-           <xsl:for-each select="projects/project">
-               <tr>
-                   <xsl:attribute name="id">projectrow_<xsl:value-of select='.' /></xsl:attribute>
-                   <td><a><xsl:attribute name="href"><xsl:value-of select="@xlink:href" />/<xsl:if test="/clam/@oauth_access_token != ''">?oauth_access_token=<xsl:value-of select="/clam/@oauth_access_token"/></xsl:if></xsl:attribute><xsl:value-of select="." /></a>
-                       <button class="quickdelete">
-                           <xsl:attribute name="onclick">quickdelete('<xsl:value-of select='.' />');</xsl:attribute>
-                           Delete</button>
-                   </td>
-                   <td>
-                       <xsl:choose>
-                           <xsl:when test="@status = 0">
-                               <span class="staging">staging</span>
-                           </xsl:when>
-                       </xsl:choose>
-                       <xsl:choose>
-                           <xsl:when test="@status = 1">
-                               <span class="running">running</span>
-                           </xsl:when>
-                       </xsl:choose>
-                       <xsl:choose>
-                           <xsl:when test="@status = 2">
-                               <span class="done">done</span>
-                           </xsl:when>
-                       </xsl:choose>
-                    </td>
-                   <td><xsl:value-of select="@size" /> MB</td>
-                   <td><xsl:value-of select="@time" /></td>
-               </tr>
-           </xsl:for-each>
+              <!-- rows are requested page by page (clam.js) -->
           </tbody>
         </table>
         <div class="diskusage">
@@ -0,0 +1,74 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Resource accounting tests --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import time
+import shutil
+import tempfile
+import subprocess
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.accounting
+import clam.clamdispatcher
+
+class AccountingTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='clamaccountingtest') + '/'
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test1_log(self):
+        """Accounting - Logging and aggregating runs"""
+        logfile = self.dir + 'resources.log'
+        for i in range(1,101):
+            clam.common.accounting.log(logfile, {'walltime': i, 'usertime': 1.0, 'systemtime': 0.5, 'maxrss': 1024 * i, 'readbytes': 0, 'writebytes': 100, 'processes': 1, 'exitcode': 1 if i == 100 else 0})
+        records = clam.common.accounting.readlog(logfile)
+        self.assertEqual(len(records), 100)
+        summary = clam.common.accounting.aggregate(records)
+        self.assertEqual((summary['runs'], summary['failed']), (100, 1))
+        self.assertEqual(summary['walltime'], {'mean': 50.5, 'p95': 95, 'max': 100})
+        self.assertEqual(summary['maxrss']['max'], 102400)
+        #only the most recent runs
+        summary = clam.common.accounting.aggregate(clam.common.accounting.readlog(logfile, 10))
+        self.assertEqual((summary['runs'], summary['walltime']['mean']), (10, 95.5))
+
+    def test2_measure(self):
+        """Accounting - Measuring the resources of a process tree"""
+        watcher = clam.clamdispatcher.ChildWatcher()
+        #a shell that spends some CPU time in a child process
+        process = subprocess.Popen(['/bin/sh','-c','python -c "sum(range(3000000))" ; sleep 0.5; true'], preexec_fn=os.setsid)
+        watcher.watch(process.pid)
+        accounting = clam.clamdispatcher.Accounting()
+        begintime = time.time()
+        while True:
+            accounting.sample(process.pid)
+            exited, status = watcher.poll()
+            if exited:
+                break
+            time.sleep(0.05)
+        watcher.close()
+        self.assertEqual(status, 0)
+        resources = accounting.resources(time.time() - begintime, watcher)
+        self.assertEqual(sorted(resources.keys()), sorted(clam.common.accounting.KEYS))
+        self.assertTrue(resources['usertime'] + resources['systemtime'] > 0)
+        self.assertTrue(resources['maxrss'] > 0)
+        self.assertTrue(resources['processes'] >= 2)
+        self.assertTrue(resources['walltime'] >= 0.5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Action cache tests --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import time
+import shutil
+import tempfile
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.actioncache
+
+class ActionCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='clamactioncachetest')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test1_key(self):
+        """Action cache - Keys depend on the action and the parameter values, not their order"""
+        key = clam.common.actioncache.cachekey('lemma', [('word','houses'),('lang','en')])
+        self.assertEqual(key, clam.common.actioncache.cachekey('lemma', [('lang','en'),('word','houses')]))
+        self.assertNotEqual(key, clam.common.actioncache.cachekey('lemma', [('word','house'),('lang','en')]))
+        self.assertNotEqual(key, clam.common.actioncache.cachekey('pos', [('word','houses'),('lang','en')]))
+
+    def test2_memory(self):
+        """Action cache - Storing and retrieving results in memory"""
+        cache = clam.common.actioncache.ActionCache('lemma', maxentries=2)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 200, 'text/plain', b"house")
+        self.assertEqual(cache.get('a'), (200, 'text/plain', b"house"))
+        cache.put('b', 200, 'text/plain', b"b")
+        cache.get('a') #a is now the most recently used
+        cache.put('c', 200, 'text/plain', b"c")
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['stores'], stats['entries']), (3,2,3,2))
+
+    def test3_ttl(self):
+        """Action cache - Results expire"""
+        cache = clam.common.actioncache.ActionCache('lemma', ttl=0.1, directory=os.path.join(self.root,'lemma'))
+        cache.put('a', 200, 'text/plain', b"house")
+        self.assertIsNotNone(cache.get('a'))
+        time.sleep(0.2)
+        self.assertIsNone(cache.get('a'))
+        self.assertFalse(os.path.exists(os.path.join(self.root,'lemma','a')))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test4_disk(self):
+        """Action cache - Results on disk are shared between caches"""
+        directory = os.path.join(self.root,'lemma')
+        cache = clam.common.actioncache.ActionCache('lemma', maxentries=2, directory=directory)
+        for key in ('a','b','c'):
+            cache.put(key, 200, 'text/plain; charset=UTF-8', key.encode('ascii') * 3)
+        other = clam.common.actioncache.ActionCache('lemma', maxentries=2, directory=directory)
+        self.assertEqual(other.get('c'), (200, 'text/plain; charset=UTF-8', b"ccc"))
+        self.assertEqual(other.get('c'), (200, 'text/plain; charset=UTF-8', b"ccc"))
+        self.assertEqual(len([ key for key in ('a','b','c') if os.path.exists(os.path.join(directory, key)) ]), 2)
+        cache.flush() #counters are written at most once per second
+        stats = other.stats()
+        self.assertEqual((stats['stores'], stats['diskhits'], stats['hits'], stats['evictions']), (3,1,1,1))
+
+if __name__ == '__main__':
+    unittest.main()
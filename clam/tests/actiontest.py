@@ -53,5 +53,51 @@ class ActionServiceTest(unittest.TestCase):
         result = self.client.action('multiply',x=2,y=3)
         self.assertEqual(result.strip(), "6")
 
+    def test4_background(self):
+        """Action Test (Command) - Background"""
+        result = self.client.action('slowuppercase',text="test", method="POST")
+        self.assertEqual(result.strip(), "TEST")
+
+    def test5_background(self):
+        """Action Test (Command) - Background job handle"""
+        joburl = self.client.startaction('slowuppercase',text="test", method="POST")
+        self.assertTrue('/actions/slowuppercase/jobs/' in joburl)
+        self.assertEqual(self.client.actionresult(joburl), None) #still running
+        self.assertEqual(self.client.actionresult(joburl, wait=10).strip(), "TEST")
+        self.assertEqual(self.client.actionresult(joburl).strip(), "TEST") #results are kept
+        self.client.deleteactionjob(joburl)
+
+    def test5b_background(self):
+        """Action Test (Command) - Deleting a background job in progress"""
+        joburl = self.client.startaction('slowuppercase',text="test", method="POST")
+        self.assertEqual(self.client.deleteactionjob(joburl).strip(), "Deleted") #only once it is aborted
+        self.assertRaises(Exception, self.client.actionresult, joburl) #404
+
+    def test6_pool(self):
+        """Action Test (Function) - Process pool"""
+        result = self.client.action('poolmultiply',x=2,y=3, method="POST")
+        self.assertEqual(result.strip(), "6")
+
+    def test7_pool(self):
+        """Action Test (Function) - Process pool timeout"""
+        self.assertRaises(TimeOut, self.client.action, 'slowpoolmultiply',x=2,y=3, method="POST")
+
+    def test8_stream(self):
+        """Action Test (Command) - Streaming"""
+        result = self.client.action('count',n=10000)
+        self.assertEqual(result.split(), [ str(i) for i in range(1,10001) ])
+
+    def test9_stream(self):
+        """Action Test (Command) - Streaming, status from the return code when there is no output"""
+        self.assertRaises(PermissionDenied, self.client.action, 'failcount')
+
+    def test10_batch(self):
+        """Action Test - Batch"""
+        results = self.client.actionbatch('multiply', [ {'x': i, 'y': 2} for i in range(0,100) ] + [ {'x': 'nan', 'y': 2} ])
+        self.assertEqual(len(results), 101)
+        self.assertEqual([ (status, result.strip()) for status, result in results[:100] ], [ (200, str(i * 2)) for i in range(0,100) ])
+        self.assertEqual(results[100][0], 403)
+        self.assertEqual(results[100][1].count("Error setting parameter"), 1)
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
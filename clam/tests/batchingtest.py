@@ -0,0 +1,84 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Micro-batching tests --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import time
+import threading
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.batching
+import clam.common.data
+import clam.common.parameters
+
+class BatchingTest(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+
+    def multiply(self, calls):
+        self.batches.append(len(calls))
+        time.sleep(0.05) #calls arriving in the meantime end up in the next batch
+        return [ x * y for x, y in calls ]
+
+    def callconcurrently(self, function, n):
+        results = [None] * n
+        def call(i):
+            try:
+                results[i] = function(i, 2)
+            except Exception as e: #pylint: disable=broad-except
+                results[i] = e
+        threads = [ threading.Thread(target=call, args=(i,)) for i in range(0,n) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test1_batches(self):
+        """Batching - Concurrent calls are processed in batches"""
+        batcher = clam.common.batching.Batcher(self.multiply, maxsize=10, maxwait=0.5)
+        results = self.callconcurrently(batcher, 25)
+        self.assertEqual(results, [ i * 2 for i in range(0,25) ])
+        self.assertEqual(sum(self.batches), 25)
+        self.assertTrue(max(self.batches) <= 10)
+        self.assertTrue(len(self.batches) < 25)
+        self.assertEqual((batcher.batches, batcher.calls), (len(self.batches), 25))
+
+    def test2_single(self):
+        """Batching - A single call does not wait longer than the maximum waiting time"""
+        batcher = clam.common.batching.Batcher(self.multiply, maxsize=10, maxwait=0.01)
+        begintime = time.time()
+        self.assertEqual(batcher(3, 4), 12)
+        self.assertTrue(time.time() - begintime < 0.5)
+
+    def test3_error(self):
+        """Batching - Errors are raised for every call in the batch"""
+        def fail(calls):
+            raise ValueError("failed")
+        batcher = clam.common.batching.Batcher(fail, maxsize=10, maxwait=0.1)
+        results = self.callconcurrently(batcher, 3)
+        self.assertTrue(all( isinstance(result, ValueError) for result in results ))
+        batcher = clam.common.batching.Batcher(lambda calls: [], maxsize=10, maxwait=0.01) #wrong number of results
+        self.assertRaises(ValueError, batcher, 1, 2)
+
+    def test4_action(self):
+        """Batching - Action with a batch function"""
+        action = clam.common.data.Action(id="multiply", batchfunction=self.multiply, batchsize=4, batchwait=0.01, parameters=[clam.common.parameters.IntegerParameter(id="x", name="x"), clam.common.parameters.IntegerParameter(id="y", name="y")])
+        self.assertEqual(action.function(6, 7), 42)
+        self.assertEqual(action.command, None)
+
+if __name__ == '__main__':
+    unittest.main()
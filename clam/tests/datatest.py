@@ -221,7 +221,40 @@ class ParametersInFilename(unittest.TestCase):
         self.assertEqual(filename,'test.utf-8.fr.txt')
 
 
-
+class ProgramTest(unittest.TestCase):
+    def setUp(self):
+        self.program = clam.common.data.Program('/tmp/project/')
+        for i in range(1,4):
+            self.program.add('doc' + str(i) + '.stats', 'statsbydoc', 'doc' + str(i) + '.txt', 'textinput')
+            self.program.add('doc' + str(i) + '.freqlist', 'freqlistbydoc', 'doc' + str(i) + '.txt', 'textinput')
+        self.program.add('overall.stats', 'overallstats')
+
+    def test1_partition(self):
+        """Program - Partitioning by input file"""
+        parts, remainder = self.program.partition(set(['statsbydoc','freqlistbydoc']))
+        self.assertEqual(len(parts), 3)
+        self.assertEqual(sorted(parts[0].keys()), ['doc1.freqlist','doc1.stats'])
+        self.assertEqual(parts[0].inputfilenames(), set(['doc1.txt']))
+        self.assertEqual(list(remainder.keys()), ['overall.stats'])
+
+    def test2_partition_shared(self):
+        """Program - Partitioning merges outputs that share input files"""
+        self.program.add('doc1-2.diff', 'diff', 'doc1.txt', 'textinput')
+        self.program.add('doc1-2.diff', 'diff', 'doc2.txt', 'textinput')
+        parts, _ = self.program.partition(set(['statsbydoc','freqlistbydoc','diff']))
+        self.assertEqual(len(parts), 2)
+        self.assertEqual(parts[0].inputfilenames(), set(['doc1.txt','doc2.txt']))
+
+    def test3_profilexml(self):
+        """Profile - Fan-out options survive serialisation"""
+        profile = clam.common.data.Profile(
+            clam.common.data.InputTemplate('textinput', clam.common.formats.PlainTextFormat,"test", extension='.txt', multi=True),
+            clam.common.data.OutputTemplate('statsbydoc', clam.common.formats.PlainTextFormat,"test", extension='.stats', multi=True),
+            fanout=4, reduce=False
+        )
+        profile = clam.common.data.Profile.fromxml(profile.xml())
+        self.assertEqual(profile.fanout, 4)
+        self.assertFalse(profile.reduce)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,64 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Direct execution tests --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.directexec
+
+class DirectExecTest(unittest.TestCase):
+    def test1_tokenize(self):
+        """Direct execution - Commands are split unless they need a shell"""
+        self.assertEqual(clam.common.directexec.tokenize('/path/to/lemma.sh -l "$lang$" $PARAMETERS'), ['/path/to/lemma.sh','-l','$lang$','$PARAMETERS'])
+        self.assertIsNone(clam.common.directexec.tokenize("echo $text$ | tr '[:lower:]' '[:upper:]'"))
+        self.assertIsNone(clam.common.directexec.tokenize("lemma.sh $HOME"))
+        self.assertIsNone(clam.common.directexec.tokenize("LANG=C lemma.sh $PARAMETERS"))
+        self.assertIsNone(clam.common.directexec.tokenize("exit 3")) #a shell builtin
+
+    def test2_buildargv(self):
+        """Direct execution - Placeholders are filled in without quoting"""
+        argv = clam.common.directexec.tokenize('lemma.sh -l $lang$ --tmp=$TMPDIRECTORY $PARAMETERS')
+        parameters = [ (None, 'en', 'lang'), ('-w', 'it\'s "quoted"; echo $HOME', 'word'), (None, '', 'empty') ]
+        self.assertEqual(clam.common.directexec.buildargv(argv, parameters, {'$TMPDIRECTORY': '/tmp/x'}), ['lemma.sh','-l','en','--tmp=/tmp/x','-w','it\'s "quoted"; echo $HOME'])
+
+    def test3_tmpdirpool(self):
+        """Direct execution - Temporary directories are emptied and reused"""
+        root = tempfile.mkdtemp(prefix='clamdirectexectest')
+        try:
+            pool = clam.common.directexec.TmpDirPool(root, 1)
+            self.assertEqual(os.listdir(root), []) #created when needed
+            tmpdir = pool.acquire()
+            os.mkdir(os.path.join(tmpdir, 'sub'))
+            with open(os.path.join(tmpdir, 'sub', 'file'),'w') as f:
+                f.write("test")
+            other = pool.acquire() #pool exhausted, a new one is created
+            self.assertNotEqual(tmpdir, other)
+            pool.release(tmpdir)
+            pool.release(other) #pool full, removed
+            self.assertFalse(os.path.exists(other))
+            self.assertEqual(pool.acquire(), tmpdir)
+            self.assertEqual(os.listdir(tmpdir), [])
+            pool.release(tmpdir)
+            pool.clear() #as at exit
+            self.assertEqual(os.listdir(root), [])
+        finally:
+            shutil.rmtree(root)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Disk usage accounting tests --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import multiprocessing
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.diskusage
+from clam.common.diskusage import MB
+from clam.common.util import computediskusage
+
+def addbytes(projectdir):
+    for _ in range(0,50):
+        clam.common.diskusage.adjust(projectdir, 1024)
+
+class DiskUsageTest(unittest.TestCase):
+    def setUp(self):
+        self.projectdir = tempfile.mkdtemp(prefix='clamdiskusagetest') + '/'
+        os.mkdir(self.projectdir + 'input')
+
+    def tearDown(self):
+        shutil.rmtree(self.projectdir)
+
+    def write(self, filename, size):
+        with open(self.projectdir + filename,'wb') as f:
+            f.write(b"x" * size)
+
+    def test1_unknown(self):
+        """Disk usage - Adjusting an unknown size leaves it unknown"""
+        self.assertIsNone(clam.common.diskusage.get(self.projectdir))
+        self.assertIsNone(clam.common.diskusage.adjust(self.projectdir, 1000))
+        self.assertFalse(os.path.exists(self.projectdir + clam.common.diskusage.FILENAME))
+
+    def test2_adjust(self):
+        """Disk usage - Added and removed files adjust the size and match a full walk"""
+        clam.common.diskusage.set(self.projectdir, 0.0)
+        self.write('input/a.txt', 300000)
+        self.write('input/.a.txt.METADATA', 1000)
+        os.symlink(self.projectdir + 'input/a.txt', self.projectdir + 'input/.a.txt.INPUTTEMPLATE.text.1')
+        added = clam.common.diskusage.filesizes(self.projectdir + 'input', 'a.txt')
+        self.assertEqual(added, 601000)
+        self.assertAlmostEqual(clam.common.diskusage.adjust(self.projectdir, added), 601000 / MB)
+        self.assertAlmostEqual(clam.common.diskusage.get(self.projectdir), computediskusage(self.projectdir), places=4)
+        self.assertAlmostEqual(clam.common.diskusage.adjust(self.projectdir, -2 * added), 0.0) #never negative
+
+    def test3_reconcile(self):
+        """Disk usage - Reconciliation corrects drift"""
+        clam.common.diskusage.set(self.projectdir, 5.0)
+        self.write('input/b.txt', MB)
+        old, new = clam.common.diskusage.reconcile(self.projectdir)
+        self.assertEqual(old, 5.0)
+        self.assertAlmostEqual(new, 1.0, places=2)
+        self.assertEqual(clam.common.diskusage.get(self.projectdir), new)
+
+    def test4_concurrent(self):
+        """Disk usage - Concurrent adjustments from several processes are not lost"""
+        clam.common.diskusage.set(self.projectdir, 0.0)
+        processes = [ multiprocessing.Process(target=addbytes, args=(self.projectdir,)) for _ in range(0,4) ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertAlmostEqual(clam.common.diskusage.get(self.projectdir), 200 * 1024 / MB)
+
+    def test5_due(self):
+        """Disk usage - Periodic reconciliation is due once per interval"""
+        stampfile = self.projectdir + '.reconciled'
+        self.assertTrue(clam.common.diskusage.due(stampfile, 3600))
+        self.assertFalse(clam.common.diskusage.due(stampfile, 3600))
+        self.assertTrue(clam.common.diskusage.due(stampfile, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Pre-rendered fragment tests --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+from copy import copy
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+from clam.common.parameters import StringParameter, ChoiceParameter
+from clam.common.fragments import Fragments
+
+class Rendered(object):
+    """Anything with an XML representation, counting how often it is rendered"""
+    def __init__(self, xml):
+        self._xml = xml
+        self.rendered = 0
+
+    def xml(self):
+        self.rendered += 1
+        return self._xml
+
+class InputSource(object):
+    def __init__(self, id, label): #pylint: disable=redefined-builtin
+        self.id = id
+        self.label = label
+
+PARAMETERS = [ ('Main', [ StringParameter('name','Name'), ChoiceParameter('colour','Colour','Pick one',choices=[('red','Red'),('blue','Blue')]) ]) ]
+
+class FragmentsTest(unittest.TestCase):
+    def test1_once(self):
+        """Fragments - Profiles and actions are rendered once"""
+        profile = Rendered("<profile>\n<input />\n</profile>")
+        action = Rendered("<action id=\"a\" />")
+        fragments = Fragments([profile], PARAMETERS, [InputSource('corpus','Corpus & co')], [action])
+        self.assertEqual(fragments.profiles, "<profile>\n        <input />\n        </profile>")
+        self.assertEqual(fragments.actions, "<action id=\"a\" />")
+        self.assertEqual(fragments.inputsources, '<inputsource id="corpus">Corpus &amp; co</inputsource>')
+        self.assertEqual((profile.rendered, action.rendered), (1, 1))
+
+    def test2_parameters(self):
+        """Fragments - Parameters are rendered anew only if their value or error differs"""
+        fragments = Fragments([], PARAMETERS, [], [])
+        name, colour = PARAMETERS[0][1]
+        self.assertEqual(fragments.parameter(name), name.xml())
+        self.assertEqual(fragments.parameter(copy(colour)), colour.xml())
+        submitted = copy(colour)
+        submitted.set('blue')
+        self.assertEqual(fragments.parameter(submitted), submitted.xml())
+        self.assertNotEqual(fragments.parameter(submitted), colour.xml())
+        erroneous = copy(name)
+        erroneous.error = "This parameter is mandatory and must be set!"
+        self.assertIn('error=', fragments.parameter(erroneous))
+
+    def test3_static(self):
+        """Fragments - Static data has an entity tag derived from its content"""
+        fragments = Fragments([], [], [], [])
+        fragments.addstatic('data.js', "systemid = 'test';", 'text/javascript')
+        fragments.addstatic('other.js', "systemid = 'other';", 'text/javascript')
+        self.assertEqual(fragments.static['data.js'].content, b"systemid = 'test';")
+        self.assertEqual(len(fragments.static['data.js'].etag), 32)
+        self.assertNotEqual(fragments.static['data.js'].etag, fragments.static['other.js'].etag)
+
+if __name__ == '__main__':
+    unittest.main()
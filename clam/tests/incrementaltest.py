@@ -0,0 +1,94 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Incremental run tests --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import io
+import shutil
+import tempfile
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.data
+import clam.common.incremental
+
+class IncrementalTest(unittest.TestCase):
+    def setUp(self):
+        self.projectdir = tempfile.mkdtemp(prefix='clamincrementaltest') + '/'
+        os.makedirs(self.projectdir + 'input')
+        os.makedirs(self.projectdir + 'output')
+        for i in range(1,4):
+            self.addinput('doc' + str(i) + '.txt', "Document " + str(i))
+        self.config = clam.common.incremental.configkey([('x','1')], [0], 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.projectdir)
+
+    def addinput(self, filename, text):
+        with io.open(self.projectdir + 'input/' + filename,'w',encoding='utf-8') as f:
+            f.write(text)
+        with io.open(self.projectdir + 'input/.' + filename + '.METADATA','w',encoding='utf-8') as f:
+            f.write("<CLAMMetaData format=\"PlainTextFormat\" />")
+
+    def program(self):
+        program = clam.common.data.Program(self.projectdir, [0])
+        for filename in sorted(os.listdir(self.projectdir + 'input')):
+            if filename[0] != '.':
+                program.add(filename.replace('.txt','.stats'), 'stats', filename, 'textinput')
+        program.add('overall.stats', 'overallstats')
+        return program
+
+    def simulaterun(self, program):
+        for outputfilename in program:
+            with io.open(self.projectdir + 'output/' + outputfilename,'w',encoding='utf-8') as f:
+                f.write("result")
+
+    def test1_unchanged(self):
+        """Incremental - Only output of unchanged input is kept"""
+        program = self.program()
+        previous = {'inputs': clam.common.incremental.inputmanifest(self.projectdir), 'config': self.config, 'program': dict( (outputfilename, sorted(inputfiles)) for outputfilename, (_, inputfiles) in program.items() ) }
+        self.addinput('doc2.txt', "Document 2, revised")
+        self.addinput('doc4.txt', "Document 4")
+        program = self.program()
+        inputs = clam.common.incremental.inputmanifest(self.projectdir)
+        self.assertEqual(sorted(clam.common.incremental.unchanged(previous, inputs, self.config, program)), ['doc1.stats','doc3.stats'])
+        #changed metadata counts as a change
+        with io.open(self.projectdir + 'input/.doc1.txt.METADATA','w',encoding='utf-8') as f:
+            f.write("<CLAMMetaData format=\"PlainTextFormat\" encoding=\"latin1\" />")
+        inputs = clam.common.incremental.inputmanifest(self.projectdir)
+        self.assertEqual(clam.common.incremental.unchanged(previous, inputs, self.config, program), ['doc3.stats'])
+        #other parameters mean everything has to be produced again
+        self.assertEqual(clam.common.incremental.unchanged(previous, inputs, clam.common.incremental.configkey([('x','2')], [0], 1), program), [])
+
+    def test2_restore(self):
+        """Incremental - Output set aside on reset is restored"""
+        program = self.program()
+        self.simulaterun(program)
+        clam.common.incremental.write(self.projectdir + clam.common.incremental.MANIFEST, clam.common.incremental.inputmanifest(self.projectdir), self.config, program)
+        clam.common.incremental.setaside(self.projectdir)
+        self.assertEqual(os.listdir(self.projectdir + 'output'), [])
+        self.addinput('doc3.txt', "Document 3, revised")
+        program = self.program()
+        previous = clam.common.incremental.load(self.projectdir + clam.common.incremental.MANIFEST)
+        kept = clam.common.incremental.restore(self.projectdir, clam.common.incremental.unchanged(previous, clam.common.incremental.inputmanifest(self.projectdir), self.config, program))
+        clam.common.incremental.discard(self.projectdir)
+        self.assertEqual(sorted(kept), ['doc1.stats','doc2.stats'])
+        self.assertEqual(sorted(os.listdir(self.projectdir + 'output')), ['doc1.stats','doc2.stats'])
+        self.assertFalse(os.path.exists(self.projectdir + clam.common.incremental.PREVIOUSDIR))
+        remaining = program.restrict([ outputfilename for outputfilename in program if outputfilename not in kept ])
+        self.assertEqual(sorted(remaining.keys()), ['doc3.stats','overall.stats'])
+
+if __name__ == '__main__':
+    unittest.main()
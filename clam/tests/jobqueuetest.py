@@ -0,0 +1,182 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Job queue tests --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import time
+import shutil
+import tempfile
+import subprocess
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.jobqueue
+import clam.common.statestore
+import clam.clamdispatcher
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='clamjobqueuetest')
+        self.queue = clam.common.jobqueue.JobQueue(os.path.join(self.root, 'queue'))
+        self.projects = []
+        for i in range(0,4):
+            projectdir = os.path.join(self.root, 'projects', 'p' + str(i)) + '/'
+            os.makedirs(projectdir)
+            self.projects.append(projectdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def submit(self, projectdir, cores=1, memory=0):
+        #the job just marks its project as done
+        return self.queue.submit(projectdir, "sleep 0.2; echo 0 > " + projectdir + ".done", self.root, cores=cores, memory=memory)
+
+    def test1_order(self):
+        """Job queue - Jobs are queued in order of submission"""
+        for i, projectdir in enumerate(self.projects):
+            self.assertEqual(self.submit(projectdir), i+1)
+        self.assertEqual(self.queue.position(self.projects[2]), (3,4))
+        self.assertTrue(os.path.exists(self.projects[2] + '.queued'))
+        self.assertEqual([ job['projectdir'] for job in self.queue.pending() ], self.projects)
+
+    def test2_persistence(self):
+        """Job queue - Queue persists across instances"""
+        for projectdir in self.projects:
+            self.submit(projectdir)
+        queue = clam.common.jobqueue.JobQueue(os.path.join(self.root, 'queue'))
+        self.assertEqual(len(queue.pending()), 4)
+        self.assertEqual(queue.position(self.projects[3]), (4,4))
+
+    def test3_remove(self):
+        """Job queue - Removing a queued job"""
+        for projectdir in self.projects:
+            self.submit(projectdir)
+        self.assertTrue(self.queue.remove(self.projects[1]))
+        self.assertFalse(os.path.exists(self.projects[1] + '.queued'))
+        self.assertEqual(self.queue.position(self.projects[1]), (0,3))
+        self.assertEqual(self.queue.position(self.projects[2]), (2,3))
+        self.assertFalse(self.queue.remove(self.projects[1]))
+
+    def test4_maxjobs(self):
+        """Job queue - Scheduling respects the maximum number of jobs"""
+        for projectdir in self.projects:
+            self.submit(projectdir)
+        launched = self.queue.schedule(maxjobs=2)
+        self.assertEqual([ job['projectdir'] for job in launched ], self.projects[:2])
+        self.assertTrue(os.path.exists(self.projects[0] + '.pid'))
+        self.assertFalse(os.path.exists(self.projects[0] + '.queued'))
+        self.assertEqual(self.queue.position(self.projects[2]), (1,2))
+        self.assertEqual(self.queue.schedule(maxjobs=2), [])
+        time.sleep(1)
+        launched = self.queue.schedule(maxjobs=2)
+        self.assertEqual([ job['projectdir'] for job in launched ], self.projects[2:])
+
+    def test5_packing(self):
+        """Job queue - Scheduling packs jobs by cores and memory"""
+        self.submit(self.projects[0], cores=3)
+        self.submit(self.projects[1], cores=2)
+        self.submit(self.projects[2], cores=1, memory=100)
+        self.submit(self.projects[3], cores=1, memory=1000)
+        launched = self.queue.schedule(maxcores=4, maxmemory=500)
+        self.assertEqual([ job['projectdir'] for job in launched ], [self.projects[0], self.projects[2]])
+        self.assertEqual(self.queue.position(self.projects[1]), (1,2))
+
+    def test6_resourcecheck(self):
+        """Job queue - Scheduling holds back jobs if resources are insufficient"""
+        self.submit(self.projects[0])
+        self.assertEqual(self.queue.schedule(resourcecheck=lambda: (False, "test")), [])
+        self.assertEqual(self.queue.position(self.projects[0]), (1,1))
+
+    def test7_shortjob(self):
+        """Job queue - A job that is done before the queue gets back stays done"""
+        store = clam.common.statestore.StateStore(os.path.join(self.root, 'state.db'))
+        class SlowJobQueue(clam.common.jobqueue.JobQueue):
+            def _write(self, filename, job):
+                #the queue gets back from launching only after the job is done
+                for _ in range(0,100 if filename.startswith(self.runningdir) else 0):
+                    if store.get('user', 'short')['state'] == clam.common.statestore.DONE:
+                        break
+                    time.sleep(0.05)
+                super(SlowJobQueue, self)._write(filename, job)
+        queue = SlowJobQueue(os.path.join(self.root, 'queue'), statestore=store)
+        projectdir = os.path.join(self.root, 'projects', 'user', 'short') + '/'
+        os.makedirs(projectdir)
+        #the job marks itself done the way the dispatcher does and exits immediately
+        store.set('user', 'short', state=clam.common.statestore.QUEUED)
+        queue.submit(projectdir, sys.executable + " -c \"import clam.common.statestore as s; s.StateStore('state.db').set('user', 'short', state=s.DONE, exitcode=0, pid=0)\"", self.root)
+        self.assertEqual(len(queue.schedule()), 1)
+        state = store.get('user', 'short')
+        self.assertEqual((state['state'], state['exitcode'], state['pid']), (clam.common.statestore.DONE, 0, 0))
+
+class LauncherTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='clamlaunchertest')
+        with open(os.path.join(self.root, 'launchertestsettings.py'),'w') as f:
+            f.write("ROOT = " + repr(self.root + '/') + "\n")
+        self.socketpath = os.path.join(self.root, 'launcher.sock')
+        self.launcher = subprocess.Popen([sys.executable, '-m', 'clam.clamlauncher', self.root, 'launchertestsettings'], cwd=sys.path[0] + '/../../')
+        for _ in range(0,100):
+            if os.path.exists(self.socketpath):
+                break
+            time.sleep(0.05)
+        self.projectdir = os.path.join(self.root, 'project') + '/'
+        os.makedirs(self.projectdir + 'output')
+
+    def tearDown(self):
+        self.launcher.terminate()
+        self.launcher.wait()
+        shutil.rmtree(self.root)
+
+    def waitdone(self):
+        for _ in range(0,100):
+            if os.path.exists(self.projectdir + '.done'):
+                break
+            time.sleep(0.05)
+        with open(self.projectdir + '.done') as f:
+            return int(f.read())
+
+    def test1_launch(self):
+        """Launcher - Launching a job"""
+        pid = clam.common.jobqueue.launch(self.socketpath, {'projectdir': self.projectdir, 'args': ['touch', 'ran'], 'errorlog': self.projectdir + 'output/error.log', 'cwd': self.root})
+        self.assertTrue(pid > 0)
+        self.assertEqual(self.waitdone(), 0)
+        self.assertTrue(os.path.exists(self.projectdir + 'ran'))
+        self.assertFalse(os.path.exists(self.projectdir + '.pid'))
+        with open(self.projectdir + 'output/error.log') as f:
+            self.assertTrue('Started by CLAM Launcher' in f.read())
+
+    def test2_queue(self):
+        """Launcher - Job queue launches through the launcher"""
+        queue = clam.common.jobqueue.JobQueue(os.path.join(self.root, 'queue'), self.socketpath)
+        queue.submit(self.projectdir, "false", self.root, spec={'projectdir': self.projectdir, 'args': ['sh','-c','exit 3'], 'errorlog': self.projectdir + 'output/error.log'})
+        self.assertEqual(len(queue.schedule()), 1)
+        self.assertEqual(self.waitdone(), 3 << 8)
+
+    def test3_fallback(self):
+        """Launcher - Job queue falls back to the dispatcher command without launcher"""
+        queue = clam.common.jobqueue.JobQueue(os.path.join(self.root, 'queue'), os.path.join(self.root, 'nonexistant.sock'))
+        queue.submit(self.projectdir, "echo 0 > " + self.projectdir + ".done", self.root, spec={'projectdir': self.projectdir, 'args': ['true'], 'errorlog': self.projectdir + 'output/error.log'})
+        self.assertEqual(len(queue.schedule()), 1)
+        self.assertEqual(self.waitdone(), 0)
+
+    def test4_needsshell(self):
+        """Launcher - Commands are only run through a shell if needed"""
+        self.assertFalse(clam.clamdispatcher.needsshell('/path/to/wrapper.py "/path/to/clam.xml" "/path/to/.status"'))
+        self.assertTrue(clam.clamdispatcher.needsshell('wrapper.py > log'))
+        self.assertTrue(clam.clamdispatcher.needsshell('wrapper.py $HOME'))
+        self.assertTrue(clam.clamdispatcher.needsshell('LANG=C wrapper.py'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Listing tests --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import io
+import shutil
+import tempfile
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.listing
+import clam.common.status
+from clam.common.listing import Listing
+
+PROJECTS = [ {'name': 'c', 'date': '2020-01-03 00:00:00', 'size': 3.0, 'status': clam.common.status.DONE},
+             {'name': 'a', 'date': '2020-01-01 00:00:00', 'size': 1.0, 'status': clam.common.status.READY},
+             {'name': 'ab', 'date': '2020-01-02 00:00:00', 'size': 2.0, 'status': clam.common.status.DONE},
+             {'name': 'b', 'date': '2020-01-04 00:00:00', 'size': None, 'status': clam.common.status.RUNNING} ]
+
+class ListingTest(unittest.TestCase):
+    def test1_request(self):
+        """Listing - Parameters of the request"""
+        self.assertIsNone(Listing.fromrequest({}, ('name',), ('filter',)))
+        listing = Listing.fromrequest({}, ('name',), ('filter',), 100)
+        self.assertEqual(listing.limit, 100)
+        listing = Listing.fromrequest({'offset': '10', 'limit': '1000', 'sort': 'size', 'order': 'desc', 'status': 'done'}, ('name','size'), ('filter','status'), 100)
+        self.assertEqual((listing.offset, listing.limit, listing.sort, listing.order, listing.status), (10, 100, 'size', 'desc', clam.common.status.DONE))
+        self.assertRaises(ValueError, Listing.fromrequest, {'sort': 'nosuchcolumn'}, ('name',), ('filter',))
+        self.assertRaises(ValueError, Listing.fromrequest, {'limit': '-1'}, ('name',), ('filter',))
+        self.assertRaises(ValueError, Listing.fromrequest, {'limit': 'x'}, ('name',), ('filter',))
+        self.assertRaises(ValueError, Listing.fromrequest, {'status': 'nosuchstatus'}, ('name',), ('filter','status'))
+        self.assertRaises(ValueError, Listing.fromrequest, {'status': 'done'}, ('name',), ('filter','template'))
+        self.assertRaises(ValueError, Listing.fromrequest, {'template': 'textinput'}, ('name',), ('filter','status'))
+
+    def test2_page(self):
+        """Listing - Paging"""
+        listing = Listing(offset=1, limit=2)
+        self.assertEqual([ row['name'] for row in listing.apply(PROJECTS) ], ['ab','b'])
+        self.assertEqual(listing.attributes(), {'total': 4, 'filtered': 4, 'offset': 1, 'limit': 2})
+
+    def test3_filter(self):
+        """Listing - Filtering on a prefix and status"""
+        listing = Listing(prefix='a')
+        self.assertEqual([ row['name'] for row in listing.apply(PROJECTS) ], ['a','ab'])
+        self.assertEqual(listing.filtered, 2)
+        listing = Listing(status=clam.common.status.DONE)
+        self.assertEqual([ row['name'] for row in listing.apply(PROJECTS) ], ['ab','c'])
+
+    def test4_sort(self):
+        """Listing - Sorting, rows without a value last"""
+        self.assertEqual([ row['name'] for row in Listing(sort='size').apply(PROJECTS) ], ['a','ab','c','b'])
+        self.assertEqual([ row['name'] for row in Listing(sort='date', order='desc').apply(PROJECTS) ], ['b','c','ab','a'])
+        self.assertEqual([ row['name'] for row in Listing(sort='size', order='desc').apply(PROJECTS) ], ['c','ab','a','b'])
+        self.assertEqual([ row['name'] for row in Listing(sort='name', order='desc').apply(PROJECTS) ], ['c','b','ab','a'])
+
+    def test5_files(self):
+        """Listing - Files and their templates"""
+        directory = tempfile.mkdtemp(prefix='clamlistingtest')
+        try:
+            os.mkdir(os.path.join(directory, 'sub'))
+            for filename in ('a.txt', 'sub/b.txt', '.hidden'):
+                with io.open(os.path.join(directory, filename),'w',encoding='utf-8') as f:
+                    f.write("test")
+            with io.open(os.path.join(directory, 'sub', '.b.txt.METADATA'),'w',encoding='utf-8') as f:
+                f.write('<CLAMMetaData format="PlainTextFormat" inputtemplate="textinput">\n</CLAMMetaData>')
+            self.assertEqual(sorted(clam.common.listing.files(directory)), ['a.txt', 'sub/b.txt'])
+            self.assertEqual(clam.common.listing.template(directory, 'sub/b.txt'), 'textinput')
+            self.assertIsNone(clam.common.listing.template(directory, 'a.txt'))
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Project index tests --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import multiprocessing
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.projectindex
+import clam.common.status
+
+def addprojects(userdir, offset):
+    index = clam.common.projectindex.ProjectIndex(userdir)
+    for i in range(offset, offset + 25):
+        index.update('p' + str(i), size=1.0, status=clam.common.status.READY)
+
+class ProjectIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.userdir = tempfile.mkdtemp(prefix='clamprojectindextest')
+        self.index = clam.common.projectindex.ProjectIndex(self.userdir)
+        self.scans = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.userdir)
+
+    def scan(self):
+        self.scans += 1
+        return [ ['b', '2020-01-01 00:00:00', 2.0, clam.common.status.DONE], ['a', '2020-01-01 00:00:00', 1.5, clam.common.status.READY] ]
+
+    def test1_build(self):
+        """Project index - Built by scanning only once"""
+        self.assertIsNone(self.index.load())
+        self.index.update('c', status=clam.common.status.READY) #no index yet, nothing to update
+        self.assertIsNone(self.index.load())
+        data = self.index.build(self.scan)
+        self.assertEqual([ row[0] for row in data['projects'] ], ['a','b'])
+        self.assertEqual(data['totalsize'], 3.5)
+        self.index.build(self.scan)
+        self.assertEqual(self.scans, 1)
+
+    def test2_update(self):
+        """Project index - Rows are updated, added and removed one at a time"""
+        self.index.build(self.scan)
+        self.index.update('a', size=None, status=clam.common.status.RUNNING)
+        self.index.update('c', size=0.123)
+        self.index.remove('b')
+        data = self.index.load()
+        self.assertEqual([ (row[0], row[2], row[3]) for row in data['projects'] ], [('a', None, clam.common.status.RUNNING), ('c', 0.12, clam.common.status.READY)])
+        self.assertEqual(data['totalsize'], 0.12)
+        self.assertRaises(ValueError, self.index.update, 'a', nosuchcolumn=1)
+
+    def test3_concurrent(self):
+        """Project index - Concurrent updates from several processes are not lost"""
+        self.index.build(lambda: [])
+        processes = [ multiprocessing.Process(target=addprojects, args=(self.userdir, i * 25)) for i in range(0,4) ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        data = self.index.load()
+        self.assertEqual(len(data['projects']), 100)
+        self.assertEqual(data['totalsize'], 100.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Run cache tests --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import io
+import shutil
+import tempfile
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.runcache
+
+class RunCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='clamruncachetest')
+        self.cache = clam.common.runcache.RunCache(os.path.join(self.root, 'runcache'))
+        self.projectdir = self.makeproject('p1', "Hello world")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def makeproject(self, name, text):
+        projectdir = os.path.join(self.root, name) + '/'
+        os.makedirs(projectdir + 'input')
+        os.makedirs(projectdir + 'output')
+        with io.open(projectdir + 'input/test.txt','w',encoding='utf-8') as f:
+            f.write(text)
+        with io.open(projectdir + 'input/.test.txt.METADATA','w',encoding='utf-8') as f:
+            f.write("<CLAMMetaData format=\"PlainTextFormat\" />")
+        return projectdir
+
+    def simulaterun(self, projectdir):
+        with io.open(projectdir + 'output/result.txt','w',encoding='utf-8') as f:
+            f.write("result")
+        with io.open(projectdir + 'output/.result.txt.METADATA','w',encoding='utf-8') as f:
+            f.write("<CLAMMetaData format=\"PlainTextFormat\" />")
+
+    def key(self, projectdir, parameters=None, profiles=None, version=1):
+        return clam.common.runcache.runkey(projectdir, parameters or [('x','1')], profiles or [0], version)
+
+    def test1_key(self):
+        """Run cache - Keys depend on input, metadata, parameters, profiles and version"""
+        key = self.key(self.projectdir)
+        self.assertEqual(key, self.key(self.makeproject('p2', "Hello world")))
+        self.assertNotEqual(key, self.key(self.makeproject('p3', "Hello there")))
+        self.assertNotEqual(key, self.key(self.projectdir, parameters=[('x','2')]))
+        self.assertNotEqual(key, self.key(self.projectdir, profiles=[1]))
+        self.assertNotEqual(key, self.key(self.projectdir, version=2))
+        with io.open(self.projectdir + 'input/.test.txt.METADATA','w',encoding='utf-8') as f:
+            f.write("<CLAMMetaData format=\"PlainTextFormat\" encoding=\"latin1\" />")
+        self.assertNotEqual(key, self.key(self.projectdir))
+
+    def test2_storeretrieve(self):
+        """Run cache - Storing and retrieving a run"""
+        key = self.key(self.projectdir)
+        self.assertFalse(self.cache.retrieve(key, self.projectdir))
+        self.simulaterun(self.projectdir)
+        self.assertTrue(self.cache.store(key, self.projectdir))
+        projectdir = self.makeproject('p2', "Hello world")
+        self.assertTrue(self.cache.retrieve(key, projectdir))
+        self.assertTrue(os.path.exists(projectdir + 'output/result.txt'))
+        self.assertTrue(os.path.exists(projectdir + 'output/.result.txt.METADATA'))
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['stores'], stats['entries']), (1,1,1,1))
+
+    def test3_eviction(self):
+        """Run cache - Least recently used runs are evicted"""
+        cache = clam.common.runcache.RunCache(os.path.join(self.root, 'runcache'), maxsize=1)
+        keys = []
+        for i in range(0,3):
+            projectdir = self.makeproject('e' + str(i), "Input " + str(i))
+            with open(projectdir + 'output/big','wb') as f:
+                f.write(b"x" * 400 * 1024)
+            keys.append(self.key(projectdir))
+            if i == 2:
+                os.utime(cache.path(keys[0]), (0,0)) #the first entry is the least recently used one
+            self.assertTrue(cache.store(keys[-1], projectdir))
+        self.assertFalse(os.path.isdir(cache.path(keys[0])))
+        self.assertTrue(os.path.isdir(cache.path(keys[1])))
+        self.assertTrue(os.path.isdir(cache.path(keys[2])))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
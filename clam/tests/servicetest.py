@@ -92,6 +92,23 @@ class BasicServiceTest(unittest.TestCase):
                 found = True
         self.assertTrue(found)
 
+    def test2_5b_etag(self):
+        """Basic Service Test - An unchanged project is not sent again (conditional GET)"""
+        data = self.client.get('basicservicetest')
+        self.assertTrue(('basicservicetest',None,()) in self.client.etags)
+        self.assertTrue(self.client.get('basicservicetest') is data) #304, the previous response is reused
+        r = self.client.request('basicservicetest/', raw=True, headers={'If-None-Match': self.client.etags[('basicservicetest',None,())][0]})
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(r.headers['ETag'], self.client.etags[('basicservicetest',None,())][0])
+
+    def test2_5c_staticdata(self):
+        """Basic Service Test - Data for the web interface is served with an entity tag and may be cached"""
+        r = self.client.request('data.js', raw=True)
+        self.assertTrue('inputtemplates' in r.text)
+        self.assertTrue('max-age=' in r.headers['Cache-Control'])
+        r2 = self.client.request('data.js', raw=True, headers={'If-None-Match': r.headers['ETag']})
+        self.assertEqual(r2.status_code, 304)
+
     def test2_6_deletion(self):
         """Basic Service Test - File Deletion"""
         data = self.client.get('basicservicetest')
@@ -123,6 +140,32 @@ class BasicServiceTest(unittest.TestCase):
                 found = True
         self.assertTrue(found)
 
+    def test2_8b_listing(self):
+        """Basic Service Test - Part of the input files is listed"""
+        data = self.client.get('basicservicetest', limit=1, filter='servicetest')
+        self.assertEqual([ f.filename for f in data.input ], ['servicetest.txt'])
+        self.assertEqual(data.listings['input']['limit'], 1)
+        self.assertEqual(data.listings['input']['filtered'], 1)
+        data = self.client.get('basicservicetest', filter='nosuchfile')
+        self.assertEqual(data.input, [])
+        self.assertEqual(data.listings['input']['filtered'], 0)
+        r = self.client.request('basicservicetest/?list=input&sort=template', raw=True)
+        self.assertEqual([ item['name'] for item in r.json()['items'] ], ['servicetest.txt'])
+
+    def test2_8c_include(self):
+        """Basic Service Test - Only the sections asked for are included"""
+        data = self.client.get('basicservicetest', include=('status',))
+        self.assertEqual(data.status, clam.common.status.READY)
+        self.assertTrue(data.statusversion)
+        self.assertEqual(data.profiles, [])
+        self.assertEqual(data.parameters, [])
+        self.assertEqual(data.input, [])
+        data = self.client.get('basicservicetest', include=('input',))
+        self.assertTrue(any( f.filename == 'servicetest.txt' for f in data.input ))
+        self.assertEqual(data.profiles, [])
+        self.assertIsNone(data.statusversion)
+        self.assertRaises(BadRequest, self.client.get, 'basicservicetest', include=('nosuchsection',))
+
     def test2_9_deletion(self):
         """Basic Service Test - File Deletion"""
         data = self.client.get('basicservicetest')
@@ -201,6 +244,20 @@ class ExtensiveServiceTest(unittest.TestCase):
                 #print outputfile.metadata.provenance.outputtemplate_id
                 self.assertTrue(outputfile.metadata.provenance.outputtemplate_id == 'statsbydoc')
 
+    def test1c_waitstatus(self):
+        """Extensive Service Test - Waiting for status changes (long-polling)"""
+        data = self.client.get(self.project)
+        success = self.client.addinputfile(self.project, data.inputtemplate('textinput'),'/tmp/servicetest.txt', language='fr')
+        self.assertTrue(success)
+        data = self.client.start(self.project)
+        self.assertFalse(data.errors)
+        self.assertTrue(data.statusversion)
+        while data.status != clam.common.status.DONE:
+            statusversion = data.statusversion
+            data = self.client.get(self.project, since=statusversion, wait=10) #held until the status changes
+            self.assertTrue(data.status == clam.common.status.RUNNING or data.statusversion != statusversion)
+        self.assertTrue('servicetest.txt.freqlist' in [ x.filename for x in data.output ])
+
     def test1b_downloadarchive(self):
         """Extensive Service Test - Download Archive (ZIP)"""
         data = self.client.get(self.project)
@@ -0,0 +1,103 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- State store tests --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import threading
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.statestore
+import clam.common.jobqueue
+
+class StateStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='clamstatestoretest')
+        self.store = clam.common.statestore.StateStore(os.path.join(self.root, 'state.sqlite3'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def makeproject(self, user, project):
+        projectdir = os.path.join(self.root, 'projects', user, project) + '/'
+        os.makedirs(projectdir)
+        return projectdir
+
+    def test1_setget(self):
+        """State store - Setting and getting the state of projects"""
+        self.assertIsNone(self.store.get('anonymous','p1'))
+        self.store.set('anonymous','p1', state=clam.common.statestore.READY)
+        self.store.set('anonymous','p1', state=clam.common.statestore.RUNNING, pid=123)
+        self.store.set('anonymous','p0', state=clam.common.statestore.DONE, exitcode=0)
+        self.store.set('other','p2')
+        state = self.store.get('anonymous','p1')
+        self.assertEqual((state['state'], state['pid'], state['aborted']), (clam.common.statestore.RUNNING, 123, 0))
+        self.assertEqual([ state['project'] for state in self.store.projects('anonymous') ], ['p0','p1'])
+        self.assertEqual(self.store.users(), ['anonymous','other'])
+        self.store.remove('anonymous','p1')
+        self.assertIsNone(self.store.get('anonymous','p1'))
+        self.assertRaises(ValueError, self.store.set, 'anonymous', 'p1', nosuchfield=1)
+
+    def test2_threads(self):
+        """State store - Concurrent updates from several threads"""
+        def update(i):
+            for j in range(0,20):
+                self.store.set('anonymous','p' + str(i), pid=j)
+        threads = [ threading.Thread(target=update, args=(i,)) for i in range(0,4) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([ state['pid'] for state in self.store.projects('anonymous') ], [19] * 4)
+
+    def test3_import(self):
+        """State store - Importing projects from their flag files"""
+        projectdir = self.makeproject('anonymous','done')
+        with open(projectdir + '.done','w') as f:
+            f.write("3")
+        with open(projectdir + '.aborted','w') as f:
+            pass
+        with open(projectdir + '.du','w') as f:
+            f.write("1.5")
+        projectdir = self.makeproject('anonymous','running')
+        with open(projectdir + '.pid','w') as f:
+            f.write("1234")
+        self.makeproject('anonymous','ready')
+        self.store.set('anonymous','deleted')
+        self.assertEqual(self.store.importall(os.path.join(self.root, 'projects')), 3)
+        state = self.store.get('anonymous','done')
+        self.assertEqual((state['state'], state['exitcode'], state['aborted'], state['size']), (clam.common.statestore.DONE, 3, 1, 1.5))
+        state = self.store.get('anonymous','running')
+        self.assertEqual((state['state'], state['pid']), (clam.common.statestore.RUNNING, 1234))
+        self.assertEqual(self.store.get('anonymous','ready')['state'], clam.common.statestore.READY)
+        self.assertIsNone(self.store.get('anonymous','deleted'))
+
+    def test4_jobqueue(self):
+        """State store - The job queue keeps the state of queued and launched projects up to date"""
+        self.assertEqual(clam.common.statestore.locate(self.root + '/projects/anonymous/p1/'), ('anonymous','p1'))
+        self.assertIsNone(clam.common.statestore.locate(self.root + '/actionjobs/anonymous/abc/'))
+        queue = clam.common.jobqueue.JobQueue(os.path.join(self.root, 'queue'), statestore=self.store)
+        projectdir = self.makeproject('anonymous','p1')
+        queue.submit(projectdir, "sleep 0.2", self.root)
+        self.assertEqual(self.store.get('anonymous','p1')['state'], clam.common.statestore.QUEUED)
+        queue.schedule()
+        state = self.store.get('anonymous','p1')
+        self.assertEqual(state['state'], clam.common.statestore.RUNNING)
+        self.assertTrue(state['pid'] > 0)
+
+if __name__ == '__main__':
+    unittest.main()
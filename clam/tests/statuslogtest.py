@@ -0,0 +1,88 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Status log tests --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import io
+import shutil
+import tempfile
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.statuslog
+
+class StatusLogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='clamstatuslogtest')
+        self.statusfile = os.path.join(self.tmpdir, '.status')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def append(self, text):
+        with io.open(self.statusfile,'a',encoding='utf-8') as f:
+            f.write(text)
+
+    def test1_parseline(self):
+        """Status log - Parsing a line"""
+        self.assertEqual(clam.common.statuslog.parseline("50%\tHalfway there\n"), ("Halfway there", "", 50))
+        message, timestamp, completion = clam.common.statuslog.parseline("1234567890\tStarted")
+        self.assertEqual((message, completion), ("Started", 0))
+        self.assertTrue(timestamp)
+
+    def test2_incremental(self):
+        """Status log - Only appended lines are parsed, the most recent message comes first"""
+        log = clam.common.statuslog.StatusLog(self.statusfile)
+        self.assertEqual(log.read(), ([], 0))
+        self.append("10%\tStarting\n")
+        self.append("10%\tStarting\n")
+        self.append("20%\tDocument 1\n")
+        self.assertEqual(log.read(), ([("Document 1","",20),("Starting","",10)], 20))
+        offset = log.offset
+        self.append("Document 2")
+        self.assertEqual(log.read()[0][0], ("Document 2","",0))
+        self.assertEqual(log.offset, offset) #the incomplete line is not remembered
+        self.append(" done\n30%\tDocument 3\n")
+        self.assertEqual(log.read(), ([("Document 3","",30),("Document 2 done","",0),("Document 1","",20),("Starting","",10)], 30))
+
+    def test3_maxentries(self):
+        """Status log - Only the most recent messages are kept"""
+        log = clam.common.statuslog.StatusLog(self.statusfile, maxentries=3)
+        self.append("".join( str(i) + "%\tDocument " + str(i) + "\n" for i in range(1,11) ))
+        statuslog, completion = log.read()
+        self.assertEqual([ message for message, _, _ in statuslog ], ["Document 10","Document 9","Document 8"])
+        self.assertEqual(completion, 10)
+
+    def test4_replaced(self):
+        """Status log - A replaced status file is parsed from scratch"""
+        log = clam.common.statuslog.StatusLog(self.statusfile)
+        self.append("Old message\n")
+        log.read()
+        os.unlink(self.statusfile)
+        self.assertEqual(log.read(), ([], 0))
+        self.append("New\n")
+        self.assertEqual(log.read(), ([("New","",0)], 0))
+
+    def test5_sameinode(self):
+        """Status log - A status file recreated with the same inode is parsed from scratch"""
+        log = clam.common.statuslog.StatusLog(self.statusfile)
+        self.append("1000000000\tOld run\n")
+        log.read()
+        with io.open(self.statusfile,'w',encoding='utf-8') as f: #same inode, longer than before
+            f.write("2000000000\tNew run\n10%\tDocument 1\n")
+        self.assertEqual([ message for message, _, _ in log.read()[0] ], ["Document 1","New run"])
+
+if __name__ == '__main__':
+    unittest.main()
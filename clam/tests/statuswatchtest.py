@@ -0,0 +1,78 @@
+#-*- coding:utf-8 -*-
+
+###############################################################
+# CLAM: Computational Linguistics Application Mediator
+# -- Status change notification tests --
+#       by Maarten van Gompel (proycon)
+#       https://proycon.github.io/clam
+#
+#       Licensed under GPLv3
+#
+###############################################################
+
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+#We may need to do some path magic in order to find the clam.* imports
+sys.path.append(sys.path[0] + '/../../')
+os.environ['PYTHONPATH'] = sys.path[0] + '/../../'
+
+import clam.common.statuswatch
+
+class StatusWatchTest(unittest.TestCase):
+    def setUp(self):
+        self.projectdir = tempfile.mkdtemp(prefix='clamstatuswatchtest')
+
+    def tearDown(self):
+        shutil.rmtree(self.projectdir)
+
+    def later(self, filename):
+        def write():
+            with open(os.path.join(self.projectdir, filename),'a') as f:
+                f.write("10%\tBusy\n")
+        timer = threading.Timer(0.2, write)
+        timer.start()
+        return timer
+
+    def check(self, watcher):
+        with watcher.watch(self.projectdir) as watch:
+            token = watch.token()
+            self.assertFalse(watch.wait(token, 0.1))
+            timer = self.later('.status')
+            begintime = time.time()
+            self.assertTrue(watch.wait(token, 5))
+            self.assertTrue(time.time() - begintime < 4)
+            timer.join()
+        self.assertEqual(watcher.watches, {})
+
+    def test1_inotify(self):
+        """Status watch - Changes are notified through inotify"""
+        if not clam.common.statuswatch.AVAILABLE:
+            self.skipTest("inotify not available")
+        watcher = clam.common.statuswatch.Watcher()
+        with watcher.watch(self.projectdir) as watch:
+            self.assertTrue(watch.watched)
+        self.check(watcher)
+
+    def test2_polling(self):
+        """Status watch - Changes are noticed by polling if inotify is not used"""
+        watcher = clam.common.statuswatch.Watcher(inotify=False)
+        with watcher.watch(self.projectdir) as watch:
+            self.assertFalse(watch.watched)
+        self.check(watcher)
+
+    def test3_otherfiles(self):
+        """Status watch - Changes to other files are not a change of the status"""
+        watcher = clam.common.statuswatch.Watcher(inotify=False)
+        with watcher.watch(self.projectdir) as watch:
+            token = watch.token()
+            self.later('unrelated').join()
+            self.assertFalse(watch.wait(token, 0.6))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -60,6 +60,104 @@ if [ $? -ne 0 ]; then
    GOOD=0
 fi
 
+echo "Running job queue tests:" >&2
+python jobqueuetest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Job queue test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running run cache tests:" >&2
+python runcachetest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Run cache test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running incremental run tests:" >&2
+python incrementaltest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Incremental run test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running resource accounting tests:" >&2
+python accountingtest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Resource accounting test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running batching tests:" >&2
+python batchingtest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Batching test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running action cache tests:" >&2
+python actioncachetest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Action cache test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running direct execution tests:" >&2
+python directexectest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Direct execution test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running state store tests:" >&2
+python statestoretest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: State store test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running status log tests:" >&2
+python statuslogtest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Status log test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running status change notification tests:" >&2
+python statuswatchtest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Status change notification test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running project index tests:" >&2
+python projectindextest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Project index test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running disk usage tests:" >&2
+python diskusagetest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Disk usage test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running listing tests:" >&2
+python listingtest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Listing test failed!!" >&2
+   GOOD=0
+fi
+
+echo "Running fragments tests:" >&2
+python fragmentstest.py
+if [ $? -ne 0 ]; then
+   echo "ERROR: Fragments test failed!!" >&2
+   GOOD=0
+fi
+
 echo "Stopping all running clam services" >&2
 kill $(ps aux | grep 'clamservice' | awk '{print $2}') 2>/dev/null
 sleep 2
@@ -41,6 +41,10 @@ setup(
             'startclamservice = clam.clamservice:main', #alias
             'clamnewproject = clam.clamnewproject:main', #alias
             'clamdispatcher = clam.clamdispatcher:main',
+            'clamworkerpool = clam.clamworkerpool:main',
+            'clamlauncher = clam.clamlauncher:main',
+            'clamfanout = clam.clamfanout:main',
+            'clamstatedb = clam.clamstatedb:main',
             'clamclient = clam.clamclient:main'
         ]
     },